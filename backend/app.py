@@ -1,33 +1,56 @@
 import os
-import tempfile
 import logging
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, g
 from flask_cors import CORS
 from youtube_transcript_api import YouTubeTranscriptApi
-from groq import Groq
 from services.ai_service import AIService
 from services.auth_service import AuthService
+from services.chunking import generate_in_chunks, generate_in_sections, merge_flashcards
+from services.generation_cache import GenerationCache
+from services.rate_governor import RateGovernor, RateLimitExceeded, llm_caller
+from services.cancellation import CancelToken, cancellation, current_token
+from services.llm_resilience import LLMUnavailableError
+from services.model_router import ModelRouter
+from services.single_flight import SingleFlight
+from services.token_budget import ContextOverflowError, estimate_tokens, generation_chunk_tokens
+from services.structured_output import card_list_prompt
+from services.job_queue import JobQueue, QueueFullError
+from services.translation_memory import TranslationMemory, is_translated_card
+from services.text_extraction import (
+    EXTRACTOR_VERSION, SECTIONED_EXTENSIONS, SUPPORTED_EXTENSIONS, SpooledUpload, extract_sections, extract_text
+)
+from services.section_store import SectionStore, fingerprint_section
+from services.pdf_export import render_pdf, RENDERER_VERSION as PDF_RENDERER_VERSION
+from services.anki_export import render_anki, RENDERER_VERSION as ANKI_RENDERER_VERSION
+from services.bundle_export import (
+    render_csv, render_json, stream_bundle, CSV_RENDERER_VERSION, JSON_RENDERER_VERSION
+)
+from services.render_cache import RenderCache
+from services.extraction_cache import ExtractionCache
+from config import Config
 from functools import wraps
-from fpdf import FPDF
-import genanki
 import json
 import dotenv
-from docx import Document
-from pptx import Presentation
-import csv
+import contextvars
 import io
-import PyPDF2
+import math
 
 # Load environment variables
 dotenv.load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
 
 app = Flask(__name__)
+app.config['MAX_CONTENT_LENGTH'] = Config.MAX_CONTENT_LENGTH
+CORS_ORIGINS = ["http://localhost:3000"]
+# Conditional export requests send If-None-Match; clients read ETag, Retry-After (429s) and Location (jobs)
+CORS_ALLOW_HEADERS = ["Content-Type", "Authorization", "Accept", "If-None-Match"]
+CORS_EXPOSE_HEADERS = ["Content-Type", "ETag", "Retry-After", "Location"]
+
 CORS(app, resources={
     r"/api/*": {
-        "origins": ["http://localhost:3000"],
+        "origins": CORS_ORIGINS,
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization", "Accept"],
-        "expose_headers": ["Content-Type"],
+        "allow_headers": CORS_ALLOW_HEADERS,
+        "expose_headers": CORS_EXPOSE_HEADERS,
         "max_age": 3600,
         "supports_credentials": True
     }
@@ -38,9 +61,52 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialize services
-ai_service = AIService()
-auth_service = AuthService()
-groq_client = Groq(api_key=os.getenv('GROQ_API_KEY'))
+extraction_cache = ExtractionCache(Config.EXTRACTION_CACHE_PATH, max_bytes=Config.EXTRACTION_CACHE_MAX_BYTES)
+section_store = SectionStore(Config.SECTION_STORE_PATH)
+translation_memory = TranslationMemory(Config.TRANSLATION_MEMORY_PATH)
+render_cache = RenderCache(max_bytes=Config.RENDER_CACHE_MAX_BYTES, max_entries=Config.RENDER_CACHE_MAX_ENTRIES)
+rate_governor = RateGovernor(
+    Config.RATE_GOVERNOR_PATH,
+    requests_per_minute=Config.LLM_RPM_LIMIT,
+    tokens_per_minute=Config.LLM_TPM_LIMIT,
+    burst_seconds=Config.LLM_BURST_SECONDS,
+    interactive_reserve=Config.LLM_INTERACTIVE_RESERVE,
+    user_quota=Config.LLM_USER_TOKEN_QUOTA,
+    quota_window=Config.LLM_USER_QUOTA_WINDOW,
+    user_quotas=Config.LLM_USER_QUOTAS,
+    user_weights=Config.LLM_USER_WEIGHTS
+)
+model_router = ModelRouter(
+    Config.LLM_MODEL_ROUTES,
+    breaker_failures=Config.LLM_BREAKER_FAILURES,
+    breaker_reset=Config.LLM_BREAKER_RESET,
+    health_window=Config.LLM_ROUTE_HEALTH_WINDOW,
+    min_samples=Config.LLM_ROUTE_MIN_SAMPLES,
+    max_parse_failure_rate=Config.LLM_ROUTE_MAX_PARSE_FAILURES
+)
+# Identical generations and translations in flight at the same time share one LLM call
+single_flight = SingleFlight()
+ai_service = AIService(
+    translation_memory=translation_memory, governor=rate_governor, router=model_router, single_flight=single_flight
+)
+auth_service = AuthService(Config.AUTH_DB_PATH, token_cache_size=Config.AUTH_TOKEN_CACHE_SIZE)
+generation_cache = GenerationCache(
+    Config.GENERATION_CACHE_PATH,
+    max_memory_entries=Config.GENERATION_CACHE_MEMORY_ENTRIES,
+    max_disk_entries=Config.GENERATION_CACHE_DISK_ENTRIES,
+    ttl=Config.GENERATION_CACHE_TTL
+)
+job_queue = JobQueue(
+    Config.JOB_STORE_PATH,
+    max_workers=Config.JOB_WORKERS,
+    max_pending=Config.JOB_MAX_PENDING,
+    result_ttl=Config.JOB_RESULT_TTL
+)
+
+# Cached decks are keyed by the model generation normally routes to, so changing it starts a fresh cache
+GENERATION_MODEL = model_router.primary('generate')
+# Bump whenever the generation prompt changes so stale cached decks are not served
+GENERATION_PROMPT_VERSION = 2
 
 def token_required(f):
     @wraps(f)
@@ -59,48 +125,93 @@ def token_required(f):
         except Exception as e:
             return jsonify({'error': 'Invalid token'}), 401
 
-        return f(*args, **kwargs)
+        g.user_email = email
+        # LLM calls are charged to the user and run on the batch lane unless the view is interactive.
+        # The token lets a streamed response cancel the request's work when the client leaves (see
+        # caller_stream); WSGI gives a plain JSON view no way to notice that, so it runs to completion.
+        with llm_caller(email), cancellation(CancelToken()):
+            return f(*args, **kwargs)
     return decorated
 
-def extract_text_from_file(file):
-    filename = file.filename.lower()
-    content = file.read()
-    
+def interactive(f):
+    """Schedule the view's LLM calls on the interactive lane, ahead of batch work. Use below token_required."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        with llm_caller(g.user_email, 'interactive'):
+            return f(*args, **kwargs)
+    return decorated
+
+def caller_stream(events):
+    """Run a streamed response body as the current LLM caller, cancelling its work if the client leaves.
+
+    Flask iterates the body after the view (and token_required) have
+    returned, so the generator is stepped inside a copy of the view's context.
+    The server closes the body when a write to a disconnected client fails;
+    anything still queued or streaming for it is then cancelled.
+
+    Only SSE responses, jobs (POST /api/jobs/<id>/cancel) and the routes
+    backend/asgi.py serves natively can be cancelled this way. A synchronous
+    /api/upload or /api/youtube under Flask keeps generating after its client
+    has gone; clients that may leave early should use ?async=1 or a stream.
+    """
+    context = contextvars.copy_context()
+    token = context.run(current_token)
+
+    def stream():
+        finished = False
+        try:
+            while True:
+                try:
+                    yield context.run(next, events)
+                except StopIteration:
+                    finished = True
+                    return
+        finally:
+            if not finished and token:
+                token.cancel('client disconnected')
+            context.run(events.close)
+    return stream()
+
+def spool_upload(file):
+    if not file.filename.lower().endswith(SUPPORTED_EXTENSIONS):
+        raise ValueError('Error processing file: Unsupported file format')
+    return SpooledUpload(file, spool_dir=Config.UPLOAD_SPOOL_DIR, max_bytes=Config.MAX_CONTENT_LENGTH)
+
+def extract_text_from_upload(upload):
+    # Re-uploads of the same bytes skip parsing entirely
+    cache_key = ExtractionCache.make_key(upload.sha256, upload.filename, EXTRACTOR_VERSION, Config.MAX_EXTRACTED_CHARS)
+    text = extraction_cache.get(cache_key)
+    if text is not None:
+        return text
+
     try:
-        if filename.endswith('.txt') or filename.endswith('.md'):
-            return content.decode('utf-8')
-            
-        elif filename.endswith('.pdf'):
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
-            text = ''
-            for page in pdf_reader.pages:
-                text += page.extract_text() + '\n'
-            return text
-            
-        elif filename.endswith('.docx'):
-            doc = Document(io.BytesIO(content))
-            return '\n'.join([paragraph.text for paragraph in doc.paragraphs])
-            
-        elif filename.endswith('.pptx'):
-            prs = Presentation(io.BytesIO(content))
-            text = []
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        text.append(shape.text)
-            return '\n'.join(text)
-            
-        elif filename.endswith('.csv'):
-            csv_content = content.decode('utf-8').splitlines()
-            reader = csv.reader(csv_content)
-            return '\n'.join([' '.join(row) for row in reader])
-            
-        else:
-            raise ValueError('Unsupported file format')
-            
+        text, _ = extract_text(upload.path, upload.filename, Config.MAX_EXTRACTED_CHARS)
+    except Exception as e:
+        raise ValueError(f'Error processing file: {str(e)}')
+
+    extraction_cache.set(cache_key, text)
+    return text
+
+def extract_sections_from_upload(upload):
+    cache_key = ExtractionCache.make_key(
+        upload.sha256, upload.filename, EXTRACTOR_VERSION, Config.MAX_EXTRACTED_CHARS, kind='sections'
+    )
+    cached = extraction_cache.get(cache_key)
+    if cached is not None:
+        return [tuple(section) for section in json.loads(cached)]
+
+    try:
+        sections = extract_sections(upload.path, upload.filename, Config.MAX_EXTRACTED_CHARS)
     except Exception as e:
         raise ValueError(f'Error processing file: {str(e)}')
 
+    extraction_cache.set(cache_key, json.dumps(sections, ensure_ascii=False))
+    return sections
+
+def extract_text_from_file(file):
+    with spool_upload(file) as upload:
+        return extract_text_from_upload(upload)
+
 def extract_video_id(url):
     if 'youtu.be' in url:
         return url.split('/')[-1]
@@ -108,36 +219,163 @@ def extract_video_id(url):
         return url.split('v=')[1].split('&')[0]
     return None
 
+def generate_flashcards_from_youtube(video_id, num_cards=5):
+    try:
+        transcript = YouTubeTranscriptApi.get_transcript(video_id)
+    except Exception as e:
+        raise ValueError(f'Failed to get transcript: {str(e)}')
+    text = ' '.join([entry['text'] for entry in transcript])
+    return generate_flashcards_from_text(text, num_cards)
+
+def generate_flashcards_from_file(file, num_cards=5, owner=None):
+    return generate_flashcards_from_upload(spool_upload(file), num_cards, owner)
+
+def generate_flashcards_from_upload(upload, num_cards=5, owner=None):
+    with upload:
+        sectioned = upload.filename.lower().endswith(SECTIONED_EXTENSIONS)
+        if sectioned:
+            sections = extract_sections_from_upload(upload)
+        else:
+            text = extract_text_from_upload(upload)
+
+    if sectioned:
+        return generate_flashcards_from_sections(sections, num_cards, owner, upload.filename)
+    return generate_flashcards_from_text(text, num_cards)
+
+def generate_flashcards_from_sections(sections, num_cards, owner, filename):
+    text = '\n'.join(section_text for _, section_text in sections)
+    cache_key = GenerationCache.make_key(text, num_cards, GENERATION_MODEL, GENERATION_PROMPT_VERSION)
+    flashcards = generation_cache.get(cache_key)
+    if flashcards is not None:
+        return flashcards
+
+    # Only sections whose fingerprint changed since this user's last upload of the file hit the LLM
+    doc_key = SectionStore.make_key(owner, filename)
+    fingerprints = [fingerprint_section(title, section_text) for title, section_text in sections]
+    results = generate_in_sections(
+        [section_text for _, section_text in sections],
+        fingerprints,
+        num_cards,
+        _generate_flashcards_for_chunk,
+        max_tokens=generation_chunk_size(text, num_cards),
+        previous=section_store.get(doc_key)
+    )
+    tagged = [[dict(card, section=title) for card in cards] for (title, _), cards in zip(sections, results)]
+    section_store.set(doc_key, dict(zip(fingerprints, tagged)))
+
+    flashcards = merge_flashcards(tagged, num_cards=num_cards)
+    if flashcards:
+        generation_cache.set(cache_key, flashcards)
+    return flashcards
+
+def wants_async():
+    value = request.args.get('async') or request.form.get('async')
+    if value is None and request.is_json:
+        value = (request.get_json(silent=True) or {}).get('async')
+    return str(value).lower() in ('1', 'true', 'yes')
+
+def submit_job(kind, fn, *args, cleanup=None):
+    try:
+        job_id = job_queue.submit(kind, fn, *args, owner=g.user_email, cleanup=cleanup)
+    except QueueFullError as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = str(Config.JOB_RETRY_AFTER)
+        return response, 429
+
+    response = jsonify({'job_id': job_id, 'status': 'queued'})
+    response.headers['Location'] = f'/api/jobs/{job_id}'
+    return response, 202
+
+def llm_error_response(e):
+    response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+    response.headers['Retry-After'] = str(math.ceil(e.retry_after))
+    # Throttled by our own limits is a 429; a failing provider is a 503
+    return response, 429 if isinstance(e, RateLimitExceeded) else 503
+
+def sse_error(e):
+    payload = {'error': str(e)}
+    if isinstance(e, (RateLimitExceeded, LLMUnavailableError)):
+        payload['retry_after'] = e.retry_after
+    return sse_event('error', payload)
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_flashcards_response(text, num_cards):
+    cache_key = GenerationCache.make_key(text, num_cards, GENERATION_MODEL, GENERATION_PROMPT_VERSION)
+    cached = generation_cache.get(cache_key)
+
+    def events():
+        flashcards = []
+        try:
+            cards = cached if cached is not None else ai_service.stream_flashcards(text, num_cards)
+            for card in cards:
+                flashcards.append(card)
+                yield sse_event('card', card)
+        except Exception as e:
+            logger.error(f"Error streaming flashcards: {str(e)}")
+            yield sse_error(e)
+            return
+
+        if cached is None and flashcards:
+            generation_cache.set(cache_key, flashcards)
+        yield sse_event('done', {'count': len(flashcards)})
+
+    return Response(
+        caller_stream(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 def generate_flashcards_from_text(text, num_cards=5):
+    cache_key = GenerationCache.make_key(text, num_cards, GENERATION_MODEL, GENERATION_PROMPT_VERSION)
+    flashcards = generation_cache.get(cache_key)
+    if flashcards is not None:
+        return flashcards
+    # A class uploading the same handout at once waits on one generation instead of starting one each
+    return single_flight.do(
+        SingleFlight.make_key('generate', cache_key), _generate_and_cache, text, num_cards, cache_key
+    )
+
+def _generate_and_cache(text, num_cards, cache_key):
+    flashcards = generate_in_chunks(
+        text,
+        num_cards,
+        _generate_flashcards_for_chunk,
+        max_tokens=generation_chunk_size(text, num_cards)
+    )
+    # Empty results are parse failures, not answers worth caching
+    if flashcards:
+        generation_cache.set(cache_key, flashcards)
+    return flashcards
+
+def generation_chunk_size(text, num_cards):
+    # Chunks small enough that each one's cards fit a single reply on every model generation may route to
+    return generation_chunk_tokens(estimate_tokens(text), num_cards, model_router.models('generate'))
+
+def flashcard_list_messages(text, num_cards, exclude=()):
     prompt = f"""Given the following text, generate {num_cards} flashcards in a question-answer format. 
     Make the questions clear and concise, and ensure the answers are accurate based on the content.
-    Format the output as a list of dictionaries with 'question' and 'answer' keys.
+    {card_list_prompt(exclude)}
     Text: {text}"""
 
-    chat_completion = groq_client.chat.completions.create(
-        messages=[
-            {
-                "role": "system",
-                "content": "You are a helpful assistant that creates educational flashcards."
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ],
-        model="mixtral-8x7b-32768",
-        temperature=0.7,
-        max_tokens=2048,
+    return [
+        {
+            "role": "system",
+            "content": "You are a helpful assistant that creates educational flashcards."
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+def _generate_flashcards_for_chunk(text, num_cards, exclude=()):
+    # Unparseable replies fall back to the next routed model; truncated ones are topped up
+    key = SingleFlight.make_key(
+        'generate_chunk', text, num_cards, GENERATION_MODEL, GENERATION_PROMPT_VERSION, exclude=list(exclude)
     )
-
-    try:
-        response_text = chat_completion.choices[0].message.content
-        import ast
-        flashcards = ast.literal_eval(response_text)
-        return flashcards
-    except Exception as e:
-        logger.error(f"Error parsing flashcards: {e}")
-        return []
+    return single_flight.do(key, ai_service.generate_cards, flashcard_list_messages, text, num_cards, exclude)
 
 @app.route('/api/auth/register', methods=['POST'])
 def register():
@@ -187,15 +425,17 @@ def process_youtube():
         if not video_id:
             return jsonify({'error': 'Invalid YouTube URL'}), 400
 
+        if wants_async():
+            return submit_job('youtube', generate_flashcards_from_youtube, video_id, num_cards)
+
         try:
-            transcript = YouTubeTranscriptApi.get_transcript(video_id)
-            text = ' '.join([entry['text'] for entry in transcript])
-            flashcards = generate_flashcards_from_text(text, num_cards)
-            
+            flashcards = generate_flashcards_from_youtube(video_id, num_cards)
             return jsonify({'flashcards': flashcards})
-        except Exception as e:
-            return jsonify({'error': f'Failed to get transcript: {str(e)}'}), 400
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
+    except (RateLimitExceeded, LLMUnavailableError) as e:
+        return llm_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -213,17 +453,135 @@ def process_file():
             return jsonify({'error': 'No file selected'}), 400
 
         try:
-            text = extract_text_from_file(file)
-            flashcards = generate_flashcards_from_text(text, num_cards)
+            if wants_async():
+                # The request stream is gone once we return, so the job takes over the spooled copy
+                upload = spool_upload(file)
+                try:
+                    # Closed by the job even if it is cancelled before it starts
+                    response, status = submit_job(
+                        'upload', generate_flashcards_from_upload, upload, num_cards, g.user_email,
+                        cleanup=upload.close
+                    )
+                except Exception:
+                    upload.close()
+                    raise
+                if status != 202:
+                    upload.close()
+                return response, status
+
+            flashcards = generate_flashcards_from_file(file, num_cards, owner=g.user_email)
             return jsonify({'flashcards': flashcards})
         except ValueError as e:
             return jsonify({'error': str(e)}), 400
 
+    except (RateLimitExceeded, LLMUnavailableError) as e:
+        return llm_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/youtube/stream', methods=['POST'])
+@token_required
+def stream_youtube():
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'Invalid JSON data'}), 400
+
+        url = data.get('url')
+        num_cards = int(data.get('num_cards', 5))
+
+        if not url:
+            return jsonify({'error': 'No URL provided'}), 400
+
+        video_id = extract_video_id(url)
+        if not video_id:
+            return jsonify({'error': 'Invalid YouTube URL'}), 400
+
+        try:
+            transcript = YouTubeTranscriptApi.get_transcript(video_id)
+        except Exception as e:
+            return jsonify({'error': f'Failed to get transcript: {str(e)}'}), 400
+
+        text = ' '.join([entry['text'] for entry in transcript])
+        return stream_flashcards_response(text, num_cards)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/upload/stream', methods=['POST'])
+@token_required
+def stream_file():
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file provided'}), 400
+
+        file = request.files['file']
+        num_cards = int(request.form.get('num_cards', 5))
+
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+
+        try:
+            text = extract_text_from_file(file)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        return stream_flashcards_response(text, num_cards)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if not job or job['owner'] != g.user_email:
+        return jsonify({'error': 'Job not found'}), 404
+
+    return jsonify({
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at']
+    })
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+@token_required
+def get_job_result(job_id):
+    job = job_queue.get(job_id)
+    if not job or job['owner'] != g.user_email:
+        return jsonify({'error': 'Job not found'}), 404
+
+    if job['status'] == 'completed':
+        return jsonify({'flashcards': job['result']})
+    if job['status'] == 'failed':
+        return jsonify({'error': job['error']}), 400 if job['client_error'] else 500
+    if job['status'] == 'cancelled':
+        return jsonify({'error': 'Job was cancelled'}), 410
+    return jsonify({'job_id': job['id'], 'status': job['status']}), 202
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@token_required
+def cancel_job(job_id):
+    try:
+        job = job_queue.get(job_id)
+        if not job or job['owner'] != g.user_email:
+            return jsonify({'error': 'Job not found'}), 404
+
+        # Queued LLM calls give up their place at once; a running extraction or stream stops at its next check
+        if not job_queue.cancel(job_id):
+            status = (job_queue.get(job_id) or job)['status']
+            return jsonify({'error': f"Job already {status}", 'status': status}), 409
+        return jsonify({'job_id': job_id, 'status': 'cancelled'})
+    except Exception as e:
+        logger.error(f"Error in cancel_job: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/improve', methods=['POST'])
 @token_required
+@interactive
 def improve_flashcard():
     try:
         data = request.get_json()
@@ -232,12 +590,41 @@ def improve_flashcard():
             
         improved_flashcard = ai_service.improve_flashcard(data['flashcard'])
         return jsonify({'flashcard': improved_flashcard})
+    except (RateLimitExceeded, LLMUnavailableError) as e:
+        return llm_error_response(e)
+    except ContextOverflowError as e:
+        return jsonify({'error': str(e)}), 413
     except Exception as e:
         logger.error(f"Error in improve_flashcard: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/improve/batch', methods=['POST'])
+@token_required
+def improve_flashcards_batch():
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('flashcards'), list):
+            return jsonify({'error': 'No flashcards provided'}), 400
+
+        flashcards = data['flashcards']
+        if not all(isinstance(card, dict) and 'question' in card and 'answer' in card for card in flashcards):
+            return jsonify({'error': 'Each flashcard needs a question and an answer'}), 400
+
+        improved = ai_service.improve_flashcards(flashcards)
+        # Cards that could not be improved are returned unchanged and listed in 'failed'
+        return jsonify({
+            'flashcards': [new or old for new, old in zip(improved, flashcards)],
+            'failed': [index for index, card in enumerate(improved) if card is None]
+        })
+    except (RateLimitExceeded, LLMUnavailableError) as e:
+        return llm_error_response(e)
+    except Exception as e:
+        logger.error(f"Error in improve_flashcards_batch: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/translate', methods=['POST'])
 @token_required
+@interactive
 def translate_flashcard():
     try:
         data = request.get_json()
@@ -249,10 +636,137 @@ def translate_flashcard():
             data['target_language']
         )
         return jsonify({'flashcard': translated_flashcard})
+    except (RateLimitExceeded, LLMUnavailableError) as e:
+        return llm_error_response(e)
+    except ContextOverflowError as e:
+        return jsonify({'error': str(e)}), 413
     except Exception as e:
         logger.error(f"Error in translate_flashcard: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/cache/stats', methods=['GET'])
+@token_required
+def cache_stats():
+    try:
+        return jsonify({
+            'generation': generation_cache.stats(),
+            'extraction': extraction_cache.stats(),
+            'translation': translation_memory.stats(),
+            'render': render_cache.stats(),
+            'auth': auth_service.stats()
+        })
+    except Exception as e:
+        logger.error(f"Error in cache_stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/llm/stats', methods=['GET'])
+@token_required
+def llm_stats():
+    try:
+        return jsonify({
+            'rate_governor': rate_governor.stats(),
+            'calls': ai_service.stats(),
+            'usage': rate_governor.usage(g.user_email)
+        })
+    except Exception as e:
+        logger.error(f"Error in llm_stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/translate/deck', methods=['POST'])
+@token_required
+def translate_deck():
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('flashcards'), list) or not data.get('target_languages'):
+            return jsonify({'error': 'Missing flashcards or target languages'}), 400
+
+        flashcards = data['flashcards']
+        if not all(isinstance(card, dict) and 'question' in card and 'answer' in card for card in flashcards):
+            return jsonify({'error': 'Each flashcard needs a question and an answer'}), 400
+
+        # Preserve the requested order but translate each language only once
+        target_languages = list(dict.fromkeys(data['target_languages']))
+
+        def events():
+            try:
+                for event, payload in ai_service.translate_deck(flashcards, target_languages):
+                    yield sse_event(event, payload)
+            except Exception as e:
+                logger.error(f"Error translating deck: {str(e)}")
+                yield sse_error(e)
+                return
+            yield sse_event('done', {'languages': target_languages})
+
+        return Response(
+            caller_stream(events()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    except Exception as e:
+        logger.error(f"Error in translate_deck: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/translate/memory/import', methods=['POST'])
+@token_required
+def import_translation_memory():
+    # Every user's translations are served from the memory, so only trusted accounts may write to it
+    if g.user_email not in Config.TRANSLATION_MEMORY_IMPORTERS:
+        return jsonify({'error': 'Not allowed to import translations'}), 403
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('flashcards'), list) or 'target_language' not in data:
+            return jsonify({'error': 'Missing flashcards or target language'}), 400
+        if not isinstance(data['target_language'], str) or not data['target_language'].strip():
+            return jsonify({'error': 'Invalid target language'}), 400
+        if not all(is_translated_card(card) for card in data['flashcards']):
+            return jsonify({
+                'error': 'Each flashcard needs question, answer, original_question and original_answer strings'
+            }), 400
+
+        imported = translation_memory.import_deck(data['flashcards'], data['target_language'], ai_service.model)
+        return jsonify({'imported': imported})
+    except Exception as e:
+        logger.error(f"Error in import_translation_memory: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# format -> (renderer, renderer version, mimetype, download name)
+EXPORT_FORMATS = {
+    'pdf': (render_pdf, PDF_RENDERER_VERSION, 'application/pdf', 'flashcards.pdf'),
+    'anki': (render_anki, ANKI_RENDERER_VERSION, 'application/apkg', 'flashcards.apkg'),
+    'csv': (render_csv, CSV_RENDERER_VERSION, 'text/csv', 'flashcards.csv'),
+    'json': (render_json, JSON_RENDERER_VERSION, 'application/json', 'flashcards.json'),
+}
+
+def export_render(export_format, data):
+    """Return the cache key and a cached render callable for one format of the deck in data."""
+    render, version, _, _ = EXPORT_FORMATS[export_format]
+    flashcards = data['flashcards']
+    customization = data.get('customization', {})
+    options = {}
+    if export_format == 'anki':
+        options['deck_name'] = data.get('deckName', 'My Flashcards')
+    cache_key = RenderCache.make_key(flashcards, customization, export_format, version, options)
+    return cache_key, lambda: render_cache.get_or_render(cache_key, lambda: render(flashcards, customization, **options))
+
+def send_export(export_format, data):
+    """Serve a rendered export, answering 304 when the client already holds this exact file."""
+    _, _, mimetype, download_name = EXPORT_FORMATS[export_format]
+    cache_key, render = export_render(export_format, data)
+    # The key hashes every input of the render, so it is a strong validator
+    if cache_key in request.if_none_match:
+        render_cache.record_not_modified()
+        response = Response(status=304)
+    else:
+        response = send_file(
+            io.BytesIO(render()),
+            mimetype=mimetype,
+            as_attachment=True,
+            download_name=download_name
+        )
+    response.set_etag(cache_key)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @app.route('/api/export/pdf', methods=['POST'])
 @token_required
 def export_pdf():
@@ -261,93 +775,7 @@ def export_pdf():
         if not data or 'flashcards' not in data:
             return jsonify({'error': 'No flashcards provided'}), 400
 
-        customization = data.get('customization', {})
-        style = customization.get('style', 'Classic')
-        
-        # Create PDF with customization
-        pdf = FPDF()
-        pdf.add_page()
-        
-        # Set font based on customization
-        font_family = customization.get('font', 'Arial')
-        font_size = int(customization.get('fontSize', 12))
-        
-        # Add title with custom styling
-        pdf.set_font(font_family if font_family in ['Arial', 'Times'] else 'Arial', 
-                    style='B', 
-                    size=font_size + 6)
-        pdf.set_text_color(33, 150, 243)  # Primary blue color
-        pdf.cell(0, 20, txt="My Flashcards", ln=1, align='C')
-        pdf.ln(10)
-
-        # Style-specific settings
-        if style == 'Modern':
-            bg_color = (245, 245, 245)
-            border_color = (33, 150, 243)
-            question_color = (33, 150, 243)
-            answer_color = (85, 85, 85)
-        elif style == 'Minimalist':
-            bg_color = (255, 255, 255)
-            border_color = (200, 200, 200)
-            question_color = (0, 0, 0)
-            answer_color = (85, 85, 85)
-        elif style == 'Colorful':
-            bg_color = (240, 248, 255)
-            border_color = (33, 150, 243)
-            question_color = (156, 39, 176)
-            answer_color = (0, 150, 136)
-        else:  # Classic
-            bg_color = (250, 250, 250)
-            border_color = (180, 180, 180)
-            question_color = (33, 33, 33)
-            answer_color = (85, 85, 85)
-
-        # Add flashcards with custom styling
-        for i, card in enumerate(data['flashcards'], 1):
-            # Card container
-            pdf.set_fill_color(*bg_color)
-            pdf.set_draw_color(*border_color)
-            pdf.rect(10, pdf.get_y(), 190, 0, 'S')
-            pdf.ln(5)
-
-            # Card number
-            pdf.set_font(font_family if font_family in ['Arial', 'Times'] else 'Arial', 
-                        style='B', 
-                        size=font_size)
-            pdf.set_text_color(*question_color)
-            pdf.cell(0, 10, txt=f"Card {i}", ln=1, align='L')
-            
-            # Question
-            pdf.set_font(font_family if font_family in ['Arial', 'Times'] else 'Arial', 
-                        style='B', 
-                        size=font_size)
-            pdf.set_text_color(*question_color)
-            pdf.multi_cell(0, 10, txt="Question:", fill=True)
-            pdf.set_font(font_family if font_family in ['Arial', 'Times'] else 'Arial', 
-                        size=font_size)
-            pdf.multi_cell(0, 10, txt=card['question'])
-            pdf.ln(5)
-            
-            # Answer
-            pdf.set_font(font_family if font_family in ['Arial', 'Times'] else 'Arial', 
-                        style='B', 
-                        size=font_size)
-            pdf.set_text_color(*answer_color)
-            pdf.multi_cell(0, 10, txt="Answer:", fill=True)
-            pdf.set_font(font_family if font_family in ['Arial', 'Times'] else 'Arial', 
-                        size=font_size)
-            pdf.multi_cell(0, 10, txt=card['answer'])
-            pdf.ln(10)
-
-        # Save PDF to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-            pdf.output(tmp.name)
-            return send_file(
-                tmp.name,
-                mimetype='application/pdf',
-                as_attachment=True,
-                download_name='flashcards.pdf'
-            )
+        return send_export('pdf', data)
 
     except Exception as e:
         logger.error(f"Error in export_pdf: {str(e)}")
@@ -361,60 +789,46 @@ def export_anki():
         if not data or 'flashcards' not in data:
             return jsonify({'error': 'No flashcards provided'}), 400
 
-        # Create a new deck
-        deck_name = data.get('deckName', 'My Flashcards')
-        deck_id = hash(deck_name + str(os.urandom(32)))  # Generate a random deck ID
-        deck = genanki.Deck(deck_id, deck_name)
-
-        # Define the note model (template for cards)
-        model = genanki.Model(
-            1607392319,  # Random model ID
-            'Simple Model',
-            fields=[
-                {'name': 'Question'},
-                {'name': 'Answer'},
-            ],
-            templates=[
-                {
-                    'name': 'Card 1',
-                    'qfmt': '{{Question}}',
-                    'afmt': '{{FrontSide}}<hr id="answer">{{Answer}}',
-                },
-            ],
-            css="""
-            .card {
-                font-family: arial;
-                font-size: 20px;
-                text-align: center;
-                color: black;
-                background-color: white;
-            }
-            """
-        )
+        return send_export('anki', data)
+
+    except Exception as e:
+        logger.error(f"Error in export_anki: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
-        # Add notes (cards) to the deck
-        for card in data['flashcards']:
-            note = genanki.Note(
-                model=model,
-                fields=[card['question'], card['answer']]
-            )
-            deck.add_note(note)
+@app.route('/api/export/bundle', methods=['POST'])
+@token_required
+def export_bundle():
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('flashcards'), list):
+            return jsonify({'error': 'No flashcards provided'}), 400
 
-        # Create a package containing the deck
-        package = genanki.Package(deck)
-        
-        # Save to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.apkg') as tmp:
-            package.write_to_file(tmp.name)
-            return send_file(
-                tmp.name,
-                mimetype='application/apkg',
-                as_attachment=True,
-                download_name='flashcards.apkg'
-            )
+        flashcards = data['flashcards']
+        if not all(isinstance(card, dict) and 'question' in card and 'answer' in card for card in flashcards):
+            return jsonify({'error': 'Each flashcard needs a question and an answer'}), 400
+
+        formats = list(dict.fromkeys(data.get('formats') or EXPORT_FORMATS))
+        unknown = [export_format for export_format in formats if export_format not in EXPORT_FORMATS]
+        if unknown:
+            return jsonify({'error': f"Unsupported export formats: {', '.join(map(str, unknown))}"}), 400
+
+        renders = {}
+        for export_format in formats:
+            _, render = export_render(export_format, data)
+            renders[EXPORT_FORMATS[export_format][3]] = render
+
+        return Response(
+            stream_bundle(renders),
+            mimetype='application/zip',
+            headers={
+                'Content-Disposition': 'attachment; filename=flashcards.zip',
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            }
+        )
 
     except Exception as e:
-        logger.error(f"Error in export_anki: {str(e)}")
+        logger.error(f"Error in export_bundle: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
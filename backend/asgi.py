@@ -0,0 +1,283 @@
+"""ASGI entry point for the API.
+
+The LLM-bound JSON endpoints (/api/improve, /api/translate and /api/youtube)
+are served natively on the event loop by AsyncAIService, so one process can
+hold hundreds of in-flight generations. Registration and login are served
+natively too, with their deliberately slow password hashing on worker
+threads. Every other route is the existing Flask app, run through
+hypercorn's WSGI middleware.
+
+Run from the backend directory with the repository root on the path:
+    PYTHONPATH=.. hypercorn asgi:app --bind 0.0.0.0:5000
+"""
+import json
+import math
+import asyncio
+import logging
+from urllib.parse import parse_qs
+
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from youtube_transcript_api import YouTubeTranscriptApi
+
+from app import (
+    app as flask_app, CORS_EXPOSE_HEADERS, CORS_ORIGINS, GENERATION_MODEL, GENERATION_PROMPT_VERSION, ai_service,
+    auth_service, extract_video_id, flashcard_list_messages, generate_flashcards_from_youtube, generation_cache,
+    generation_chunk_size, job_queue, model_router, rate_governor, single_flight, translation_memory
+)
+from config import Config
+from services.async_ai_service import AsyncAIService
+from services.chunking import generate_in_chunks_async
+from services.token_budget import ContextOverflowError
+from services.generation_cache import GenerationCache
+from services.job_queue import QueueFullError
+from services.single_flight import SingleFlight
+from services.rate_governor import RateLimitExceeded, llm_caller
+from services.cancellation import CancelToken, Cancelled, cancellation
+from services.llm_resilience import LLMUnavailableError
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class FlashcardASGI:
+    """Routes the LLM-bound endpoints to async handlers and everything else to Flask."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi = AsyncioWSGIMiddleware(wsgi_app, max_body_size=Config.MAX_CONTENT_LENGTH)
+        # (method, path) -> (handler, scheduling lane of its LLM calls, or None for routes without a login)
+        self.routes = {
+            ('POST', '/api/improve'): (self.improve_flashcard, 'interactive'),
+            ('POST', '/api/translate'): (self.translate_flashcard, 'interactive'),
+            ('POST', '/api/youtube'): (self.process_youtube, 'batch'),
+            ('POST', '/api/auth/register'): (self.register, None),
+            ('POST', '/api/auth/login'): (self.login, None),
+        }
+        self.ai_service = None
+        # Bounds the default pool's threads a burst of logins can keep busy hashing
+        self.hash_slots = asyncio.Semaphore(Config.AUTH_HASH_WORKERS)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+
+        route = self.routes.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+        if route is None:
+            await self.wsgi(scope, receive, send)
+            return
+
+        handler, lane = route
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        try:
+            email = self.authenticate(headers) if lane else None
+            data = await self.read_json(receive)
+            query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+            if lane is None:
+                result = await handler(data, email, query)
+            else:
+                token = CancelToken()
+                with llm_caller(email, lane), cancellation(token):
+                    result = await self.until_disconnect(handler(data, email, query), receive, token)
+            # Handlers return a body, or (status, body, headers) when they need more than a 200
+            status, body, extra_headers = result if isinstance(result, tuple) else (200, result, {})
+        except Cancelled:
+            logger.info(f"Client left {scope['path']}; its work was cancelled")
+            return
+        except HTTPError as e:
+            status, body, extra_headers = e.status, {'error': str(e)}, e.headers
+        except (RateLimitExceeded, LLMUnavailableError) as e:
+            status = 429 if isinstance(e, RateLimitExceeded) else 503
+            body = {'error': str(e), 'retry_after': e.retry_after}
+            extra_headers = {'Retry-After': str(math.ceil(e.retry_after))}
+        except ContextOverflowError as e:
+            status, body, extra_headers = 413, {'error': str(e)}, {}
+        except Exception as e:
+            logger.error(f"Error in {scope['path']}: {str(e)}")
+            status, body, extra_headers = 500, {'error': str(e)}, {}
+        await self.send_json(send, status, body, {**self.cors_headers(headers), **extra_headers})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # The pooled client belongs to this worker's event loop
+                self.ai_service = AsyncAIService(
+                    translation_memory=translation_memory,
+                    governor=rate_governor,
+                    router=model_router,
+                    max_connections=Config.LLM_MAX_CONNECTIONS,
+                    single_flight=single_flight,
+                    # Counted with the sync service, so /api/llm/stats covers both
+                    call_stats=ai_service.call_stats,
+                    token_usage=ai_service.token_usage
+                )
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.ai_service:
+                    await self.ai_service.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def authenticate(self, headers):
+        token = headers.get('authorization', '').replace('Bearer ', '')
+        if not token:
+            raise HTTPError(401, 'Token is missing')
+        try:
+            email = auth_service.verify_token(token)
+        except Exception:
+            email = None
+        if not email:
+            raise HTTPError(401, 'Invalid token')
+        return email
+
+    async def until_disconnect(self, work, receive, token):
+        """Await work, cancelling it and everything it started if the client disconnects first."""
+        task = asyncio.ensure_future(work)
+        disconnect = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        try:
+            await asyncio.wait({task, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            disconnect.cancel()
+        if task.done():
+            return task.result()
+
+        # The token reaches work on other threads (and coalesced calls); the task cancel stops the awaits
+        token.cancel('client disconnected')
+        task.cancel()
+        # Let the handler unwind, giving back queue places and closing streams, before the request ends
+        await asyncio.gather(task, return_exceptions=True)
+        raise Cancelled('client disconnected')
+
+    async def wait_for_disconnect(self, receive):
+        # The body has been read, so the next message is the disconnect
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def read_json(self, receive):
+        body = bytearray()
+        while True:
+            message = await receive()
+            body.extend(message.get('body', b''))
+            if len(body) > Config.MAX_CONTENT_LENGTH:
+                raise HTTPError(413, 'Request body too large')
+            if not message.get('more_body'):
+                break
+        try:
+            return json.loads(body) if body else None
+        except ValueError:
+            return None
+
+    def cors_headers(self, headers):
+        origin = headers.get('origin')
+        if origin not in CORS_ORIGINS:
+            return {}
+        return {
+            'Access-Control-Allow-Origin': origin,
+            'Access-Control-Allow-Credentials': 'true',
+            'Access-Control-Expose-Headers': ', '.join(CORS_EXPOSE_HEADERS),
+            'Vary': 'Origin'
+        }
+
+    async def send_json(self, send, status, body, headers):
+        payload = json.dumps(body).encode('utf-8')
+        response_headers = [(b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())]
+        response_headers += [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()]
+        await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+        await send({'type': 'http.response.body', 'body': payload})
+
+    async def register(self, data, email, query):
+        return await self.password_route(auth_service.register_user, data, 'Registration failed')
+
+    async def login(self, data, email, query):
+        return await self.password_route(auth_service.login_user, data, 'Login failed')
+
+    async def password_route(self, call, data, failure):
+        """Run a register or login call on a worker thread, so hashing the password never blocks the loop."""
+        if not data or 'email' not in data or 'password' not in data:
+            raise HTTPError(400, 'Email and password are required')
+        async with self.hash_slots:
+            try:
+                return await asyncio.to_thread(call, data['email'], data['password'])
+            except ValueError as e:
+                raise HTTPError(400, str(e))
+            except Exception as e:
+                logger.error(f"Error in {call.__name__}: {str(e)}")
+                raise HTTPError(500, failure)
+
+    async def improve_flashcard(self, data, email, query):
+        if not data or 'flashcard' not in data:
+            raise HTTPError(400, 'No flashcard provided')
+        return {'flashcard': await self.ai_service.improve_flashcard(data['flashcard'])}
+
+    async def translate_flashcard(self, data, email, query):
+        if not data or 'flashcard' not in data or 'target_language' not in data:
+            raise HTTPError(400, 'Missing flashcard or target language')
+        return {'flashcard': await self.ai_service.translate_flashcard(data['flashcard'], data['target_language'])}
+
+    async def process_youtube(self, data, email, query):
+        if not data:
+            raise HTTPError(400, 'Invalid JSON data')
+
+        url = data.get('url')
+        num_cards = int(data.get('num_cards', 5))
+        if not url:
+            raise HTTPError(400, 'No URL provided')
+
+        video_id = extract_video_id(url)
+        if not video_id:
+            raise HTTPError(400, 'Invalid YouTube URL')
+
+        wants_async = query.get('async', [data.get('async')])[0]
+        if str(wants_async).lower() in ('1', 'true', 'yes'):
+            try:
+                job_id = job_queue.submit('youtube', generate_flashcards_from_youtube, video_id, num_cards, owner=email)
+            except QueueFullError as e:
+                raise HTTPError(429, str(e), {'Retry-After': str(Config.JOB_RETRY_AFTER)})
+            return 202, {'job_id': job_id, 'status': 'queued'}, {'Location': f'/api/jobs/{job_id}'}
+
+        try:
+            try:
+                transcript = await asyncio.to_thread(YouTubeTranscriptApi.get_transcript, video_id)
+            except Exception as e:
+                raise ValueError(f'Failed to get transcript: {str(e)}')
+            text = ' '.join([entry['text'] for entry in transcript])
+            return {'flashcards': await self.generate_flashcards_from_text(text, num_cards)}
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+
+    async def generate_flashcards_from_text(self, text, num_cards):
+        # Same prompt, parser and cache key as the sync path, so both share cached decks
+        cache_key = GenerationCache.make_key(text, num_cards, GENERATION_MODEL, GENERATION_PROMPT_VERSION)
+        flashcards = await asyncio.to_thread(generation_cache.get, cache_key)
+        if flashcards is not None:
+            return flashcards
+        # Shares in-flight generations with the Flask threads, which use the same keys
+        return await single_flight.do_async(
+            SingleFlight.make_key('generate', cache_key), lambda: self._generate_and_cache(text, num_cards, cache_key)
+        )
+
+    async def _generate_and_cache(self, text, num_cards, cache_key):
+        flashcards = await generate_in_chunks_async(
+            text, num_cards, self._generate_flashcards_for_chunk, max_tokens=generation_chunk_size(text, num_cards)
+        )
+        if flashcards:
+            await asyncio.to_thread(generation_cache.set, cache_key, flashcards)
+        return flashcards
+
+    async def _generate_flashcards_for_chunk(self, text, num_cards):
+        key = SingleFlight.make_key('generate_chunk', text, num_cards, GENERATION_MODEL, GENERATION_PROMPT_VERSION)
+        return await single_flight.do_async(
+            key, lambda: self.ai_service.generate_cards(flashcard_list_messages, text, num_cards)
+        )
+
+
+app = FlashcardASGI(flask_app)
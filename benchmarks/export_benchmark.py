@@ -0,0 +1,68 @@
+"""Measure export latency, peak memory and output size for decks of different sizes.
+
+Usage (from the repository root):
+    python benchmarks/export_benchmark.py
+    python benchmarks/export_benchmark.py --sizes 10 1000 --repeat 5
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.pdf_export import render_pdf
+from services.anki_export import render_anki
+from services.bundle_export import render_csv, render_json
+
+RENDERERS = {
+    'pdf': lambda flashcards: render_pdf(flashcards, {'style': 'Modern', 'font': 'Arial', 'fontSize': 12}),
+    'anki': lambda flashcards: render_anki(flashcards, {'style': 'Modern', 'font': 'Arial', 'fontSize': 16}),
+    'csv': lambda flashcards: render_csv(flashcards, {}),
+    'json': lambda flashcards: render_json(flashcards, {}),
+}
+
+
+def make_deck(size):
+    return [
+        {
+            'question': f'What is concept number {i} and why does it matter?',
+            'answer': f'Concept {i} is an example answer that spans a sentence or two of text. ' * 2
+        }
+        for i in range(size)
+    ]
+
+
+def run(name, render, size, repeat):
+    flashcards = make_deck(size)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = render(flashcards)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    render(flashcards)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(timings)
+    print(f'{name:<6} {size:>7} cards  best {best * 1000:9.1f} ms  '
+          f'{size / best:9.0f} cards/s  peak {peak / 1024 / 1024:7.1f} MB  output {len(output) / 1024:9.1f} KB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--formats', nargs='+', choices=sorted(RENDERERS), default=sorted(RENDERERS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for name in args.formats:
+        for size in args.sizes:
+            run(name, RENDERERS[name], size, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
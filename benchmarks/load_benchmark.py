@@ -0,0 +1,180 @@
+"""Compare the sync Flask app (gunicorn) with the ASGI entry point (hypercorn) under concurrent LLM-bound load.
+
+Both servers talk to a local fake Groq endpoint that answers every
+completion after a fixed delay, so the comparison measures how many calls a
+server can keep in flight, not the provider's speed.
+
+Usage (from the repository root):
+    python benchmarks/load_benchmark.py
+    python benchmarks/load_benchmark.py --concurrency 50 200 --requests 400 --upstream-latency 1.0
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+import jwt
+from aiohttp import ClientSession, ClientTimeout, TCPConnector, web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, 'backend')
+JWT_SECRET = 'load-benchmark'
+
+COMPLETION = json.dumps({
+    'question': 'What does the benchmark measure?',
+    'answer': 'How many LLM calls a server keeps in flight.'
+})
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def start_fake_groq(port, latency):
+    async def completions(request):
+        await request.read()
+        await asyncio.sleep(latency)
+        return web.json_response({
+            'id': 'chatcmpl-benchmark',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': 'mixtral-8x7b-32768',
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': COMPLETION},
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': 60, 'completion_tokens': 25, 'total_tokens': 85}
+        })
+
+    app = web.Application()
+    app.router.add_post('/openai/v1/chat/completions', completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port, backlog=4096).start()
+    return runner
+
+
+def server_command(kind, port, workers, threads):
+    bind = f'127.0.0.1:{port}'
+    if kind == 'flask':
+        return [sys.executable, '-m', 'gunicorn', '-w', str(workers), '--threads', str(threads),
+                '-b', bind, '--log-level', 'warning', 'app:app']
+    return [sys.executable, '-m', 'hypercorn', '-w', '1', '-b', bind, '--backlog', '4096',
+            '--log-level', 'warning', 'asgi:app']
+
+
+async def wait_until_up(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f'Server on port {port} did not start')
+
+
+async def run_load(port, token, concurrency, total):
+    url = f'http://127.0.0.1:{port}/api/improve'
+    body = {'flashcard': {'question': 'What is load?', 'answer': 'Work.'}}
+    headers = {'Authorization': f'Bearer {token}'}
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async with ClientSession(connector=TCPConnector(limit=concurrency), timeout=ClientTimeout(total=300)) as session:
+        async def client():
+            nonlocal errors
+            while not queue.empty():
+                queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    async with session.post(url, json=body, headers=headers) as response:
+                        await response.read()
+                        if response.status != 200:
+                            errors += 1
+                            continue
+                except Exception:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else float('nan')
+    return {
+        'throughput': len(latencies) / elapsed,
+        'p50': pick(0.50),
+        'p95': pick(0.95),
+        'errors': errors
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', nargs='+', choices=['flask', 'asgi'], default=['flask', 'asgi'])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 100, 300])
+    parser.add_argument('--requests', type=int, default=600, help='requests per concurrency level')
+    parser.add_argument('--upstream-latency', type=float, default=0.5, help='seconds per fake completion')
+    parser.add_argument('--flask-workers', type=int, default=4)
+    parser.add_argument('--flask-threads', type=int, default=1)
+    args = parser.parse_args()
+
+    upstream_port = free_port()
+    upstream = await start_fake_groq(upstream_port, args.upstream_latency)
+    token = jwt.encode({'email': 'bench@example.com', 'exp': datetime.utcnow() + timedelta(hours=1)},
+                       JWT_SECRET, algorithm='HS256')
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(
+            os.environ,
+            PYTHONPATH=ROOT,
+            GROQ_API_KEY='benchmark',
+            GROQ_BASE_URL=f'http://127.0.0.1:{upstream_port}',
+            JWT_SECRET_KEY=JWT_SECRET,
+            DATA_DIR=data_dir,
+            # Measure the servers, not the governor
+            LLM_RPM_LIMIT=str(10 ** 7),
+            LLM_TPM_LIMIT=str(10 ** 9),
+        )
+        try:
+            for kind in args.servers:
+                port = free_port()
+                # The app logs every upstream request at INFO, which would drown the results
+                process = subprocess.Popen(
+                    server_command(kind, port, args.flask_workers, args.flask_threads), cwd=BACKEND, env=env,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                )
+                try:
+                    await wait_until_up(port)
+                    for concurrency in args.concurrency:
+                        result = await run_load(port, token, concurrency, args.requests)
+                        print(
+                            f"{kind:6} concurrency {concurrency:4}  {result['throughput']:8.1f} req/s  "
+                            f"p50 {result['p50'] * 1000:7.0f} ms  p95 {result['p95'] * 1000:7.0f} ms  "
+                            f"errors {result['errors']}"
+                        )
+                finally:
+                    process.terminate()
+                    process.wait(timeout=30)
+        finally:
+            await upstream.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,11 +1,132 @@
 from typing import Optional
 import os
+import json
 
 class Config:
     GROQ_API_KEY: Optional[str] = None
     ALLOWED_EXTENSIONS = {'docx', 'pptx', 'csv', 'txt'}
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB max file size
 
+    # Uploads are spooled here (defaults to the system temp dir) and extracted page by page
+    UPLOAD_SPOOL_DIR = os.getenv('UPLOAD_SPOOL_DIR') or None
+    MAX_EXTRACTED_CHARS = int(os.getenv('MAX_EXTRACTED_CHARS', 2_000_000))
+
+    # PDFs with at least this many pages are extracted across a process pool
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', 50))
+    PDF_PROCESS_WORKERS = int(os.getenv('PDF_PROCESS_WORKERS', os.cpu_count() or 1))
+
+    # Large documents are split into chunks of at most this many tokens and generated concurrently
+    CHUNK_TOKEN_BUDGET = int(os.getenv('CHUNK_TOKEN_BUDGET', 6000))
+    MIN_CHUNK_TOKENS = int(os.getenv('MIN_CHUNK_TOKENS', 500))
+    CHUNK_MAX_WORKERS = int(os.getenv('CHUNK_MAX_WORKERS', 4))
+
+    # Batched improve/translate prompts pack up to this many input tokens or cards
+    BATCH_TOKEN_BUDGET = int(os.getenv('BATCH_TOKEN_BUDGET', 1500))
+    BATCH_MAX_CARDS = int(os.getenv('BATCH_MAX_CARDS', 20))
+
+    # Local state shared by all workers on this host (caches, stores)
+    DATA_DIR = os.getenv('DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+
+    GENERATION_CACHE_PATH = os.getenv('GENERATION_CACHE_PATH', os.path.join(DATA_DIR, 'generation_cache.db'))
+    GENERATION_CACHE_MEMORY_ENTRIES = int(os.getenv('GENERATION_CACHE_MEMORY_ENTRIES', 256))
+    GENERATION_CACHE_DISK_ENTRIES = int(os.getenv('GENERATION_CACHE_DISK_ENTRIES', 10000))
+    GENERATION_CACHE_TTL = int(os.getenv('GENERATION_CACHE_TTL', 7 * 24 * 3600))
+
+    EXTRACTION_CACHE_PATH = os.getenv('EXTRACTION_CACHE_PATH', os.path.join(DATA_DIR, 'extraction_cache.db'))
+    EXTRACTION_CACHE_MAX_BYTES = int(os.getenv('EXTRACTION_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+    SECTION_STORE_PATH = os.getenv('SECTION_STORE_PATH', os.path.join(DATA_DIR, 'sections.db'))
+
+    TRANSLATION_MEMORY_PATH = os.getenv('TRANSLATION_MEMORY_PATH', os.path.join(DATA_DIR, 'translation_memory.db'))
+    # Imported translations are served to every user, so only these emails (a JSON list) may import decks
+    TRANSLATION_MEMORY_IMPORTERS = json.loads(os.getenv('TRANSLATION_MEMORY_IMPORTERS', 'null')) or []
+
+    # Users; verified tokens cached per worker until they expire; password hashes run concurrently per
+    # ASGI worker, off its event loop
+    AUTH_DB_PATH = os.getenv('AUTH_DB_PATH', os.path.join(DATA_DIR, 'auth.db'))
+    AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000))
+    AUTH_HASH_WORKERS = int(os.getenv('AUTH_HASH_WORKERS', 2))
+
+    # Rendered PDF/Anki exports kept in memory per worker
+    RENDER_CACHE_MAX_BYTES = int(os.getenv('RENDER_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+    RENDER_CACHE_MAX_ENTRIES = int(os.getenv('RENDER_CACHE_MAX_ENTRIES', 1024))
+    # Formats of one /api/export/bundle request render concurrently on this many threads
+    EXPORT_MAX_WORKERS = int(os.getenv('EXPORT_MAX_WORKERS', 4))
+
+    # Shared LLM scheduler: provider limits, burst size and how long a call may queue
+    RATE_GOVERNOR_PATH = os.getenv('RATE_GOVERNOR_PATH', os.path.join(DATA_DIR, 'rate_governor.db'))
+    LLM_RPM_LIMIT = int(os.getenv('LLM_RPM_LIMIT', 30))
+    LLM_TPM_LIMIT = int(os.getenv('LLM_TPM_LIMIT', 20000))
+    LLM_BURST_SECONDS = float(os.getenv('LLM_BURST_SECONDS', 10))
+    LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', 30))
+    # Fair scheduling: share of each bucket batch calls leave for interactive (single-card) ones, tokens a
+    # user may spend per window (0 = unlimited) with per-email overrides, and per-email weights (default 1)
+    LLM_INTERACTIVE_RESERVE = float(os.getenv('LLM_INTERACTIVE_RESERVE', 0.2))
+    LLM_USER_TOKEN_QUOTA = int(os.getenv('LLM_USER_TOKEN_QUOTA', 0))
+    LLM_USER_QUOTA_WINDOW = float(os.getenv('LLM_USER_QUOTA_WINDOW', 3600))
+    LLM_USER_QUOTAS = json.loads(os.getenv('LLM_USER_QUOTAS', 'null')) or {}
+    LLM_USER_WEIGHTS = json.loads(os.getenv('LLM_USER_WEIGHTS', 'null')) or {}
+    # Per-call deadline (queueing, retries, hedges and model fallbacks included), retry budget and
+    # per-model circuit breaker
+    LLM_CALL_TIMEOUT = float(os.getenv('LLM_CALL_TIMEOUT', 60))
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
+    LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', 5))
+    LLM_BREAKER_RESET = float(os.getenv('LLM_BREAKER_RESET', 30))
+    # A duplicate request is sent once a call outlives the recent p95 latency (clamped to this range)
+    LLM_HEDGE_ENABLED = os.getenv('LLM_HEDGE_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    LLM_HEDGE_MIN_DELAY = float(os.getenv('LLM_HEDGE_MIN_DELAY', 1))
+    LLM_HEDGE_MAX_DELAY = float(os.getenv('LLM_HEDGE_MAX_DELAY', 15))
+    LLM_HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', 20))
+    LLM_HEDGE_WORKERS = int(os.getenv('LLM_HEDGE_WORKERS', 32))
+    # Model routing: operation -> per-model timeout, the p95 (seconds) above which a model counts as slow,
+    # and [max input tokens (None = any), [models in preference order]] rows. Override with JSON in the env.
+    LLM_MODEL_ROUTES = json.loads(os.getenv('LLM_MODEL_ROUTES', 'null')) or {
+        'generate': {
+            'timeout': 45, 'slow_after': 20,
+            'routes': [[None, ['mixtral-8x7b-32768', 'llama-3.3-70b-versatile']]]
+        },
+        'improve': {
+            'timeout': 15, 'slow_after': 4,
+            'routes': [
+                [1500, ['llama-3.1-8b-instant', 'mixtral-8x7b-32768']],
+                [None, ['mixtral-8x7b-32768', 'llama-3.3-70b-versatile']]
+            ]
+        },
+        'translate': {
+            'timeout': 15, 'slow_after': 4,
+            'routes': [
+                [1500, ['llama-3.1-8b-instant', 'mixtral-8x7b-32768']],
+                [None, ['mixtral-8x7b-32768', 'llama-3.3-70b-versatile']]
+            ]
+        },
+    }
+    # Context window and completion cap per model; unknown models get LLM_DEFAULT_CONTEXT
+    LLM_MODEL_LIMITS = json.loads(os.getenv('LLM_MODEL_LIMITS', 'null')) or {
+        'mixtral-8x7b-32768': {'context': 32768, 'max_output': 32768},
+        'llama-3.3-70b-versatile': {'context': 131072, 'max_output': 32768},
+        'llama-3.1-8b-instant': {'context': 131072, 'max_output': 8192},
+    }
+    LLM_DEFAULT_CONTEXT = int(os.getenv('LLM_DEFAULT_CONTEXT', 8192))
+    # Prompts are planned against the context minus this share, to absorb token estimation error
+    TOKEN_ESTIMATE_MARGIN = float(os.getenv('TOKEN_ESTIMATE_MARGIN', 0.1))
+    # Completion budget: a fixed overhead plus this much per requested card; below the floor a model is skipped
+    TOKENS_PER_CARD = int(os.getenv('TOKENS_PER_CARD', 150))
+    COMPLETION_OVERHEAD_TOKENS = int(os.getenv('COMPLETION_OVERHEAD_TOKENS', 100))
+    MIN_COMPLETION_TOKENS = int(os.getenv('MIN_COMPLETION_TOKENS', 256))
+    # Model health is judged on this many recent seconds, once a model has enough samples
+    LLM_ROUTE_HEALTH_WINDOW = float(os.getenv('LLM_ROUTE_HEALTH_WINDOW', 300))
+    LLM_ROUTE_MIN_SAMPLES = int(os.getenv('LLM_ROUTE_MIN_SAMPLES', 5))
+    LLM_ROUTE_MAX_PARSE_FAILURES = float(os.getenv('LLM_ROUTE_MAX_PARSE_FAILURES', 0.5))
+    # Pooled connections per process for the async client behind backend/asgi.py
+    LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', 200))
+
+    # Background generation jobs (?async=1 on /api/upload and /api/youtube)
+    JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', os.path.join(DATA_DIR, 'jobs.db'))
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+    JOB_MAX_PENDING = int(os.getenv('JOB_MAX_PENDING', 32))
+    JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', 3600))
+    JOB_RETRY_AFTER = int(os.getenv('JOB_RETRY_AFTER', 5))
+
     @staticmethod
     def init_app(app):
         # Load environment variables
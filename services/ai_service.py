@@ -1,125 +1,468 @@
 import os
-from groq import Groq
-from typing import Dict, List, Optional
+import time
+import contextvars
+from groq import APIConnectionError, Groq, InternalServerError, RateLimitError
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import json
+from config import Config
+from services.translation_memory import TranslationMemory
+from services.rate_governor import RateGovernor, RateLimitExceeded, Reservation
+from services.llm_resilience import CallStats, LLMUnavailableError, hedge_delay, retry_delay
+from services.model_router import ModelFallback, ModelRouter
+from services.cancellation import POLL_INTERVAL, Cancelled, cancellable_sleep, check_cancelled
+from services.single_flight import SingleFlight
+from services.chunking import (
+    allocate_cards, generate_in_chunks, map_chunks, merge_flashcards, pack_by_tokens, split_text, submit_task
+)
+from services.token_budget import (
+    ContextOverflowError, TokenUsage, completion_budget, estimate_tokens, generation_chunk_tokens, rewrite_budget
+)
+from services.structured_output import (
+    CARD_JSON, INDEXED_CARD_LIST_JSON, JSONObjectScanner, ParsedCards, card_list_prompt, clean_card, parse_card,
+    parse_cards, parse_indexed_cards, parse_stats
+)
+
+def generation_prompt(text: str, num_cards: Optional[int] = None, exclude: Iterable[str] = ()) -> str:
+    count = f"{num_cards} " if num_cards else ""
+    return f"""Create {count}educational flashcards from this text:
+        {text}
+        
+        Generate clear, concise questions and comprehensive answers.
+        Focus on key concepts and important details.
+        {card_list_prompt(exclude)}"""
+
+
+def generation_messages(text: str, num_cards: Optional[int] = None,
+                        exclude: Iterable[str] = ()) -> List[Dict[str, str]]:
+    return [{"role": "user", "content": generation_prompt(text, num_cards, exclude)}]
+
+
+def improve_prompt(flashcard: Dict) -> str:
+    return f"""Improve this flashcard while maintaining its core concept:
+            {json.dumps({'question': flashcard['question'], 'answer': flashcard['answer']}, ensure_ascii=False)}
+            
+            Make the question more clear and concise, and make the answer more comprehensive 
+            and easier to understand. Respond with only a JSON object exactly like this:
+            {CARD_JSON}"""
+
+
+def translate_prompt(flashcard: Dict, target_language: str) -> str:
+    return f"""Translate this flashcard to {target_language}:
+            {json.dumps({'question': flashcard['question'], 'answer': flashcard['answer']}, ensure_ascii=False)}
+            
+            Provide a natural and accurate translation. Respond with only a JSON object exactly like this:
+            {CARD_JSON}"""
+
+
+def numbered_cards_json(numbered: List[Tuple[int, Dict]]) -> str:
+    return json.dumps(
+        [{'index': number, 'question': card['question'], 'answer': card['answer']} for number, card in numbered],
+        ensure_ascii=False
+    )
+
+
+# Back-off used when a 429 carries no usable Retry-After header
+DEFAULT_RETRY_AFTER = 2.0
+
+# Provider failures worth another attempt (timeouts, dropped connections, 5xx)
+RETRYABLE_ERRORS = (APIConnectionError, InternalServerError)
+
+
+def retry_after_seconds(error: RateLimitError) -> float:
+    """Read the provider's Retry-After hint from a 429 response."""
+    try:
+        return max(0.0, float(error.response.headers.get('retry-after')))
+    except (AttributeError, TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
 
 class AIService:
-    def __init__(self):
+    def __init__(self, translation_memory: Optional[TranslationMemory] = None,
+                 governor: Optional[RateGovernor] = None,
+                 router: Optional[ModelRouter] = None,
+                 single_flight: Optional[SingleFlight] = None,
+                 call_stats: Optional[CallStats] = None):
         self.api_key = os.getenv('GROQ_API_KEY')
         if not self.api_key:
             raise ValueError("GROQ_API_KEY is required")
-        # Initialize Groq client with minimal configuration
-        self.client = Groq(api_key=self.api_key)
-        self.model = "mixtral-8x7b-32768"
+        # 429s are retried by the governor, which shares the back-off with every worker
+        self.client = Groq(api_key=self.api_key, max_retries=0) if governor else Groq(api_key=self.api_key)
+        self.router = router or ModelRouter(
+            Config.LLM_MODEL_ROUTES, Config.LLM_BREAKER_FAILURES, Config.LLM_BREAKER_RESET
+        )
+        # Translation memory entries are filed under the model translations normally run on
+        self.model = self.router.primary('translate')
+        self.translation_memory = translation_memory
+        self.governor = governor
+        self.token_usage = TokenUsage()
+        self.single_flight = single_flight or SingleFlight()
+        # Shared with AsyncAIService, so its calls show up in the same counters
+        self.call_stats = call_stats or CallStats()
+        self._hedge_executor = ThreadPoolExecutor(max_workers=Config.LLM_HEDGE_WORKERS, thread_name_prefix='llm-call')
 
-    def generate_flashcards(self, text: str) -> List[Dict[str, str]]:
+    def generate_flashcards(self, text: str, num_cards: Optional[int] = None) -> List[Dict[str, str]]:
         """Generate flashcards from input text."""
         try:
-            prompt = f"""Create educational flashcards from this text:
-            {text}
-            
-            Generate clear, concise questions and comprehensive answers.
-            Format each flashcard exactly like this:
-            Q: [question]
-            A: [answer]
-            
-            Focus on key concepts and important details."""
-
-            completion = self._get_completion(prompt)
-            if not completion:
-                raise ValueError("Failed to generate flashcards")
-
-            flashcards = []
-            lines = [line.strip() for line in completion.split('\n') if line.strip()]
-            current_card = {}
-
-            for line in lines:
-                if line.startswith('Q:'):
-                    if current_card.get('question'):  # Save previous card
-                        flashcards.append(current_card)
-                        current_card = {}
-                    current_card['question'] = line[2:].strip()
-                elif line.startswith('A:'):
-                    current_card['answer'] = line[2:].strip()
+            if num_cards:
+                return generate_in_chunks(
+                    text,
+                    num_cards,
+                    self._generate_chunk,
+                    max_tokens=self._chunk_tokens(text, num_cards)
+                )
 
-            if current_card.get('question') and current_card.get('answer'):
-                flashcards.append(current_card)
+            chunks = split_text(text, Config.CHUNK_TOKEN_BUDGET)
+            if len(chunks) <= 1:
+                return self._generate_chunk(text)
 
-            return flashcards
+            results = map_chunks(chunks, self._generate_chunk, [()] * len(chunks))
+            return merge_flashcards(results)
         except Exception as e:
             print(f"Error generating flashcards: {str(e)}")
             raise
 
+    def _generate_chunk(self, text: str, num_cards: Optional[int] = None) -> List[Dict[str, str]]:
+        """Generate flashcards from a single chunk of text."""
+        return self.generate_cards(generation_messages, text, num_cards)
+
+    def generate_cards(self, build_messages: Callable[..., List[Dict[str, str]]], text: str,
+                       num_cards: Optional[int] = None, exclude: Iterable[str] = ()) -> ParsedCards:
+        """Generate cards for one chunk from a prompt that asks for a JSON list.
+
+        build_messages(text, num_cards, exclude) builds the prompt; questions in
+        exclude are not asked again. When a reply is cut short, the cards it
+        completed are kept and only the missing ones are asked for, once,
+        excluding the questions already generated.
+        """
+        exclude = list(exclude)
+        max_tokens = completion_budget(num_cards) if num_cards else 2000
+        cards = self.complete(
+            build_messages(text, num_cards, exclude), max_tokens=max_tokens, operation='generate', parse=parse_cards
+        )
+        missing = (num_cards or 0) - len(cards)
+        if cards.status == 'salvaged' and missing > 0:
+            more = self.complete(
+                build_messages(text, missing, exclude + [card['question'] for card in cards]),
+                max_tokens=completion_budget(missing), operation='generate', parse=parse_cards
+            )
+            parse_stats.count('generate', 'reprompts')
+            parse_stats.count('generate', 'reprompt_cards', len(more))
+            cards = ParsedCards(cards + more, cards.status)
+        return cards
+
+    def stream_flashcards(self, text: str, num_cards: int) -> Iterator[Dict[str, str]]:
+        """Yield flashcards one at a time as the model produces them."""
+        chunks = split_text(text, self._chunk_tokens(text, num_cards))
+        seen = set()
+        remaining = num_cards
+
+        # Chunks are streamed in document order so the first card arrives as early as possible
+        for chunk, allocation in zip(chunks, allocate_cards(chunks, num_cards)):
+            if allocation <= 0:
+                continue
+            for card in self._stream_chunk(chunk, allocation):
+                key = ' '.join(card['question'].lower().split())
+                if key in seen:
+                    continue
+                seen.add(key)
+                yield card
+                remaining -= 1
+                if remaining <= 0:
+                    return
+
+    def _stream_chunk(self, text: str, num_cards: int) -> Iterator[Dict[str, str]]:
+        """Stream a completion for one chunk and yield each card as soon as its JSON object is complete."""
+        prompt = generation_prompt(text, num_cards)
+        model, stream, reservation = self._open_stream(
+            'generate', [{"role": "user", "content": prompt}], completion_budget(num_cards)
+        )
+        scanner = JSONObjectScanner()
+        generated = 0
+        cards = []
+        finished = False
+        try:
+            for chunk in stream:
+                # Closing the stream below stops the provider generating for a client that went away
+                check_cancelled()
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    generated += len(delta)
+                    for card in filter(None, map(clean_card, scanner.feed(delta))):
+                        cards.append(card)
+                        yield card
+            finished = True
+        finally:
+            # Consumers stop early once they have enough cards; only a finished empty stream is a parse failure
+            if cards or finished:
+                self.router.record_parse(model, bool(cards))
+                parse_stats.record('generate', ParsedCards(cards, 'ok' if cards else 'failed'))
+            stream.close()
+            if reservation:
+                reservation.settle(estimate_tokens(prompt) + (generated + 3) // 4)
+
+    def _open_stream(self, operation: str, messages: List[Dict[str, str]],
+                     max_tokens: int) -> Tuple[str, object, Optional[Reservation]]:
+        """Open a streaming completion on the first routed model that accepts it."""
+        fallback = self._fallback(operation, messages, max_tokens)
+        for model, budget, deadline in fallback:
+            try:
+                stream, reservation = self._create(model, messages, budget, deadline=deadline, stream=True)
+                return model, stream, reservation
+            except LLMUnavailableError as e:
+                fallback.failed(e)
+        raise fallback.failure()
+
     def improve_flashcard(self, flashcard: Dict) -> Dict:
         """Improve a flashcard's content using AI."""
         try:
-            prompt = f"""Improve this flashcard while maintaining its core concept:
-            Question: {flashcard['question']}
-            Answer: {flashcard['answer']}
-            
-            Make the question more clear and concise, and make the answer more comprehensive 
-            and easier to understand. Format your response exactly like this:
-            Question: [improved question]
-            Answer: [improved answer]"""
-
-            completion = self._get_completion(prompt)
-            if not completion:
-                raise ValueError("Failed to get AI response")
-
-            # Parse the response
-            lines = [line.strip() for line in completion.split('\n') if line.strip()]
-            question = ""
-            answer = ""
-            
-            for line in lines:
-                if line.startswith('Question:'):
-                    question = line.replace('Question:', '').strip()
-                elif line.startswith('Answer:'):
-                    answer = line.replace('Answer:', '').strip()
-
-            if not question or not answer:
+            improved = self._get_completion(
+                improve_prompt(flashcard), max_tokens=self._card_budget(flashcard), operation='improve',
+                parse=parse_card
+            )
+            if not improved:
                 raise ValueError("Failed to parse improved flashcard")
 
-            return {
-                'question': question,
-                'answer': answer
-            }
+            return improved[0]
         except Exception as e:
             print(f"Error improving flashcard: {str(e)}")
             raise
 
+    def improve_flashcards(self, flashcards: List[Dict]) -> List[Optional[Dict]]:
+        """Improve a whole deck in a few batched prompts; failed cards come back as None."""
+        results = self._run_indexed_batches(flashcards, self._improve_batch_prompt, 'improve')
+
+        # Anything the batch reply did not cover gets one individual attempt
+        missing = [index for index, card in enumerate(results) if card is None]
+        if missing:
+            retried = map_chunks(
+                [flashcards[index] for index in missing],
+                lambda card: [self.improve_flashcard(card)],
+                [()] * len(missing)
+            )
+            for index, cards in zip(missing, retried):
+                results[index] = cards[0] if cards else None
+
+        return results
+
+    def _improve_batch_prompt(self, numbered: List[Tuple[int, Dict]]) -> str:
+        return f"""Improve each of these flashcards while maintaining its core concept:
+        {numbered_cards_json(numbered)}
+        
+        Make each question more clear and concise, and make each answer more comprehensive 
+        and easier to understand. Respond with only a JSON array holding one object per card, keeping each
+        card's index, exactly like this:
+        {INDEXED_CARD_LIST_JSON}"""
+
+    def _run_indexed_batches(self, flashcards: List[Dict], build_prompt: Callable[[List[Tuple[int, Dict]]], str],
+                             operation: str) -> List[Optional[Dict]]:
+        """Send cards in token-budgeted numbered batches and map each reply back to its position."""
+        batches = self._pack_batches(flashcards, list(range(len(flashcards))))
+        results = [None] * len(flashcards)
+        arguments = [(flashcards, build_prompt, operation)] * len(batches)
+        for batch_results in map_chunks(batches, self._run_batch, arguments):
+            for index, card in batch_results:
+                results[index] = card
+        return results
+
+    def _pack_batches(self, flashcards: List[Dict], indices: List[int]) -> List[List[int]]:
+        """Group the given card indices into prompt-sized batches."""
+        texts = [f"{flashcards[index]['question']}\n{flashcards[index]['answer']}" for index in indices]
+        return [
+            [indices[position] for position in batch]
+            for batch in pack_by_tokens(texts, Config.BATCH_TOKEN_BUDGET, Config.BATCH_MAX_CARDS)
+        ]
+
+    def _run_batch(self, batch: List[int], flashcards: List[Dict], build_prompt: Callable[[List[Tuple[int, Dict]]], str],
+                   operation: str) -> List[Tuple[int, Optional[Dict]]]:
+        """Run one numbered batch and return (card index, parsed card or None) pairs.
+
+        Cards a partial reply left out are sent again once, on their own batch.
+        """
+        results = self._batch_completion(batch, flashcards, build_prompt, operation)
+        missing = [index for index in batch if index not in results]
+        if results and missing:
+            retried = self._batch_completion(missing, flashcards, build_prompt, operation)
+            parse_stats.count(operation, 'reprompts')
+            parse_stats.count(operation, 'reprompt_cards', len(retried))
+            results.update(retried)
+        return [(index, results.get(index)) for index in batch]
+
+    def _batch_completion(self, batch: List[int], flashcards: List[Dict],
+                          build_prompt: Callable[[List[Tuple[int, Dict]]], str], operation: str) -> Dict[int, Dict]:
+        """Send one numbered batch and return the parsed cards by card index."""
+        numbered = [(number, flashcards[index]) for number, index in enumerate(batch, 1)]
+        input_tokens = sum(
+            estimate_tokens(f"{flashcards[index]['question']}\n{flashcards[index]['answer']}") for index in batch
+        )
+        max_tokens = rewrite_budget(input_tokens, len(batch))
+        parsed = self._get_completion(
+            build_prompt(numbered), max_tokens=max_tokens, operation=operation, parse=parse_indexed_cards
+        ) or []
+        by_number = {card.pop('index'): card for card in parsed}
+        return {index: by_number[number] for number, index in enumerate(batch, 1) if number in by_number}
+
+    def translate_deck(self, flashcards: List[Dict], target_languages: List[str]) -> Iterator[Tuple[str, Dict]]:
+        """Translate a deck into several languages at once.
+
+        Every (language, batch) unit is scheduled on the shared pool up front, so
+        the total time is bounded by the slowest language. Yields ('progress', ...)
+        after each unit and ('language', ...) as soon as a language is complete.
+        """
+        states = {}
+        futures = {}
+        for language in target_languages:
+            results = self._translations_from_memory(flashcards, language)
+            pending = [index for index, card in enumerate(results) if card is None]
+            states[language] = {'results': results, 'units': 0, 'retried': False}
+            for batch in self._pack_batches(flashcards, pending):
+                futures[submit_task(self._translate_batch, batch, flashcards, language)] = language
+                states[language]['units'] += 1
+
+        total_units = len(futures)
+        completed_units = 0
+        finished = 0
+
+        try:
+            # Languages served entirely from translation memory are done already
+            for language, state in states.items():
+                if state['units'] == 0:
+                    finished += 1
+                    yield 'language', self._language_result(language, state['results'])
+
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    language = futures.pop(future)
+                    state = states[language]
+                    state['units'] -= 1
+                    completed_units += 1
+                    try:
+                        for index, card in future.result():
+                            state['results'][index] = card
+                    except Exception as e:
+                        print(f"Error translating batch to {language}: {str(e)}")
+
+                    if state['units'] == 0 and not state['retried']:
+                        # Cards the batch replies did not cover get one individual attempt
+                        state['retried'] = True
+                        for index, card in enumerate(state['results']):
+                            if card is None:
+                                futures[submit_task(self._translate_single, index, flashcards, language)] = language
+                                state['units'] += 1
+                                total_units += 1
+
+                    if state['units'] == 0:
+                        finished += 1
+
+                    yield 'progress', {
+                        'language': language,
+                        'completed_units': completed_units,
+                        'total_units': total_units,
+                        'completed_languages': finished,
+                        'total_languages': len(states)
+                    }
+                    if state['units'] == 0:
+                        yield 'language', self._language_result(language, state['results'])
+        finally:
+            # A client that stopped reading (or a failure) abandons the units not yet started
+            for future in futures:
+                future.cancel()
+
+    def _translations_from_memory(self, flashcards: List[Dict], target_language: str) -> List[Optional[Dict]]:
+        """Return the cards that are fully covered by translation memory, None elsewhere."""
+        results = [None] * len(flashcards)
+        if not self.translation_memory:
+            return results
+
+        texts = [text for card in flashcards for text in (card['question'], card['answer'])]
+        known = self.translation_memory.lookup_many(texts, target_language, self.model)
+        for index, card in enumerate(flashcards):
+            if card['question'] in known and card['answer'] in known:
+                results[index] = {
+                    'question': known[card['question']],
+                    'answer': known[card['answer']],
+                    'original_question': card['question'],
+                    'original_answer': card['answer']
+                }
+        return results
+
+    def _translate_batch(self, batch: List[int], flashcards: List[Dict],
+                         target_language: str) -> List[Tuple[int, Optional[Dict]]]:
+        """Translate one batch of cards and remember the results."""
+        results = self._run_batch(
+            batch, flashcards, lambda numbered: self._translate_batch_prompt(numbered, target_language), 'translate'
+        )
+
+        translations = {}
+        for index, card in results:
+            if card:
+                card['original_question'] = flashcards[index]['question']
+                card['original_answer'] = flashcards[index]['answer']
+                translations[card['original_question']] = card['question']
+                translations[card['original_answer']] = card['answer']
+        if self.translation_memory and translations:
+            self.translation_memory.store_many(translations, target_language, self.model)
+        return results
+
+    def _translate_single(self, index: int, flashcards: List[Dict],
+                          target_language: str) -> List[Tuple[int, Optional[Dict]]]:
+        return [(index, self.translate_flashcard(flashcards[index], target_language))]
+
+    def _translate_batch_prompt(self, numbered: List[Tuple[int, Dict]], target_language: str) -> str:
+        return f"""Translate each of these flashcards to {target_language}:
+        {numbered_cards_json(numbered)}
+        
+        Provide natural and accurate translations. Respond with only a JSON array holding one object per card,
+        keeping each card's index, exactly like this:
+        {INDEXED_CARD_LIST_JSON}"""
+
+    def _language_result(self, language: str, results: List[Optional[Dict]]) -> Dict:
+        return {
+            'language': language,
+            'flashcards': results,
+            'failed': [index for index, card in enumerate(results) if card is None]
+        }
+
     def translate_flashcard(self, flashcard: Dict, target_language: str) -> Dict:
         """Translate a flashcard to the target language."""
+        # Identical translations requested at the same time (a shared deck) run once
+        key = SingleFlight.make_key(
+            'translate', flashcard['question'], flashcard['answer'], target_language, self.model
+        )
+        return self.single_flight.do(key, self._translate_flashcard, flashcard, target_language)
+
+    def _translate_flashcard(self, flashcard: Dict, target_language: str) -> Dict:
         try:
-            prompt = f"""Translate this flashcard to {target_language}:
-            Original Question: {flashcard['question']}
-            Original Answer: {flashcard['answer']}
-            
-            Provide a natural and accurate translation. Format your response exactly like this:
-            Question: [translated question]
-            Answer: [translated answer]"""
-
-            completion = self._get_completion(prompt)
-            if not completion:
-                raise ValueError("Failed to get AI response")
-
-            # Parse the response
-            lines = [line.strip() for line in completion.split('\n') if line.strip()]
-            question = ""
-            answer = ""
-            
-            for line in lines:
-                if line.startswith('Question:'):
-                    question = line.replace('Question:', '').strip()
-                elif line.startswith('Answer:'):
-                    answer = line.replace('Answer:', '').strip()
+            if self.translation_memory:
+                known = self.translation_memory.lookup_many(
+                    [flashcard['question'], flashcard['answer']], target_language, self.model
+                )
+                if flashcard['question'] in known and flashcard['answer'] in known:
+                    return {
+                        'question': known[flashcard['question']],
+                        'answer': known[flashcard['answer']],
+                        'original_question': flashcard['question'],
+                        'original_answer': flashcard['answer']
+                    }
 
-            if not question or not answer:
+            translated = self._get_completion(
+                translate_prompt(flashcard, target_language), max_tokens=self._card_budget(flashcard),
+                operation='translate', parse=parse_card
+            )
+            if not translated:
                 raise ValueError("Failed to parse translated flashcard")
+            translated = translated[0]
+
+            if self.translation_memory:
+                self.translation_memory.store_many(
+                    {flashcard['question']: translated['question'], flashcard['answer']: translated['answer']},
+                    target_language, self.model
+                )
 
             return {
-                'question': question,
-                'answer': answer,
+                'question': translated['question'],
+                'answer': translated['answer'],
                 'original_question': flashcard['question'],
                 'original_answer': flashcard['answer']
             }
@@ -127,16 +470,216 @@ class AIService:
             print(f"Error translating flashcard: {str(e)}")
             raise
 
-    def _get_completion(self, prompt: str) -> Optional[str]:
-        """Get completion from Groq API."""
+    def complete(self, messages: List[Dict[str, str]], max_tokens: int = 2000, temperature: float = 0.7,
+                 operation: str = 'generate', parse: Optional[Callable[[str], object]] = None):
+        """Run one chat completion on the models routed for operation and return its text.
+
+        Every LLM call goes through here or _open_stream, so the rate governor,
+        deadline, retries and circuit breakers apply to all traffic. A model
+        that times out or keeps failing hands over to the next routed model.
+        With parse, the parsed reply is returned instead, and a reply parse
+        cannot use (a falsy result) also falls back; the last falsy result is
+        returned if no model did better. ParsedCards results are counted in
+        parse_stats. Raises RateLimitExceeded when the call
+        cannot be scheduled in time and LLMUnavailableError when no model answered.
+        """
+        fallback = self._fallback(operation, messages, max_tokens, parse)
+        for model, budget, deadline in fallback:
+            try:
+                response, _ = self._create(model, messages, budget, temperature, deadline=deadline)
+            except LLMUnavailableError as e:
+                fallback.failed(e)
+                continue
+            if fallback.accept(model, response.choices[0].message.content):
+                break
+        return fallback.outcome()
+
+    def stats(self) -> Dict:
+        """Return call counters, hedge delays, token usage, parse outcomes, per-model state and coalescing."""
+        stats = self.call_stats.stats()
+        stats['hedge_delay_ms'] = {
+            model: round(hedge_delay(self.router.latency, model) * 1000, 1) for model in self.router.models()
+        }
+        stats['tokens'] = self.token_usage.stats()
+        stats['parsing'] = parse_stats.stats()
+        stats['routing'] = self.router.stats()
+        stats['coalescing'] = self.single_flight.stats()
+        return stats
+
+    def _input_tokens(self, messages: List[Dict[str, str]]) -> int:
+        return sum(estimate_tokens(message['content']) for message in messages)
+
+    def _chunk_tokens(self, text: str, num_cards: int) -> int:
+        return generation_chunk_tokens(estimate_tokens(text), num_cards, self.router.models('generate'))
+
+    def _card_budget(self, flashcard: Dict) -> int:
+        return rewrite_budget(estimate_tokens(f"{flashcard['question']}\n{flashcard['answer']}"))
+
+    def _fallback(self, operation: str, messages: List[Dict[str, str]], max_tokens: int,
+                  parse: Optional[Callable[[str], object]] = None) -> ModelFallback:
+        return ModelFallback(
+            self.router, operation, self._input_tokens(messages), max_tokens, self.call_stats, self.token_usage, parse
+        )
+
+    def _create(self, model: str, messages: List[Dict[str, str]], max_tokens: int, temperature: float = 0.7,
+                deadline: Optional[float] = None, stream: bool = False) -> Tuple[object, Optional[Reservation]]:
+        """Send a request to one model within deadline, retrying transient failures with jittered back-off.
+
+        Streams return their reservation so the caller can settle it once the
+        output is consumed; other calls are hedged and settle themselves.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + Config.LLM_CALL_TIMEOUT
+        self.call_stats.count('calls')
+        attempt = 0
+        while True:
+            try:
+                if stream:
+                    return self._send(model, messages, max_tokens, temperature, deadline, stream=True)
+                return self._send_hedged(model, messages, max_tokens, temperature, deadline), None
+            except RETRYABLE_ERRORS as e:
+                attempt += 1
+                delay = retry_delay(model, attempt, deadline, e)
+                self.call_stats.count('retries')
+                cancellable_sleep(delay)
+
+    def _send_hedged(self, model: str, messages: List[Dict[str, str]], max_tokens: int, temperature: float,
+                     deadline: float):
+        """Send the request, and a duplicate if it has not answered by the recent p95; the first reply wins."""
+        started = time.monotonic()
+        # Copies of the context keep both requests charged to the caller's user and lane
+        primary = self._hedge_executor.submit(
+            contextvars.copy_context().run, self._send, model, messages, max_tokens, temperature, deadline
+        )
+        pending = {primary}
+        if Config.LLM_HEDGE_ENABLED:
+            delay = min(hedge_delay(self.router.latency, model), max(0.0, deadline - time.monotonic()))
+            done, _ = self._wait(pending, delay)
+            if not done and time.monotonic() < deadline:
+                # Hedges only use spare rate-limit capacity; they never queue behind other callers
+                pending.add(self._hedge_executor.submit(
+                    contextvars.copy_context().run, self._send, model, messages, max_tokens, temperature, deadline,
+                    queue_timeout=0
+                ))
+                self.call_stats.count('hedged')
+
+        errors = {}
+        while pending:
+            done, pending = self._wait(pending, max(0.0, deadline - time.monotonic()))
+            if not done:
+                self.call_stats.count('deadline_exceeded')
+                # A model that cannot answer in time counts as slow for routing
+                self.router.latency.record(model, time.monotonic() - started)
+                raise LLMUnavailableError(f"LLM call to {model} exceeded its deadline", retry_after=1.0)
+            for future in done:
+                try:
+                    response, _ = future.result()
+                except Exception as e:
+                    errors[future] = e
+                    continue
+                if future is not primary:
+                    self.call_stats.count('hedge_wins')
+                return response
+        # A hedge that found no spare capacity is not the interesting failure
+        raise errors.get(primary) or next(iter(errors.values()))
+
+    def _wait(self, futures, timeout: float):
+        """wait() for the first future to finish, raising Cancelled early if the caller's work is cancelled.
+
+        Requests already sent keep running on the pool and settle their own
+        reservations; nobody waits for their replies any more.
+        """
+        end = time.monotonic() + timeout
+        while True:
+            check_cancelled()
+            done, pending = wait(
+                futures, timeout=min(POLL_INTERVAL, max(0.0, end - time.monotonic())), return_when=FIRST_COMPLETED
+            )
+            if done or time.monotonic() >= end:
+                return done, pending
+
+    def _send(self, model: str, messages: List[Dict[str, str]], max_tokens: int, temperature: float,
+              deadline: float, stream: bool = False,
+              queue_timeout: Optional[float] = None) -> Tuple[object, Optional[Reservation]]:
+        """Make one attempt: wait for rate-limit capacity, check the model's breaker, then call the provider.
+
+        Provider 429s re-queue through the governor until the deadline.
+        """
+        # Providers meter prompt plus requested completion tokens; the reservation is settled with real usage
+        prompt_tokens = self._input_tokens(messages)
+        estimated = prompt_tokens + max_tokens
+        breaker = self.router.breaker(model)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.call_stats.count('deadline_exceeded')
+                raise LLMUnavailableError(f"LLM call to {model} exceeded its deadline", retry_after=1.0)
+
+            reservation = None
+            if self.governor:
+                timeout = min(Config.LLM_QUEUE_TIMEOUT, remaining) if queue_timeout is None else queue_timeout
+                reservation = self.governor.acquire(estimated, timeout=timeout)
+            try:
+                # Capacity granted to a call that was cancelled while it queued goes straight back
+                check_cancelled()
+                breaker.before_call()
+            except (LLMUnavailableError, Cancelled):
+                if reservation:
+                    reservation.settle(0)
+                raise
+
+            started = time.monotonic()
+            try:
+                response = self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=stream,
+                    timeout=max(0.1, deadline - started)
+                )
+            except RateLimitError as e:
+                # The provider answered, so this is not a breaker failure
+                breaker.record_success()
+                retry_after = retry_after_seconds(e)
+                if not self.governor:
+                    raise RateLimitExceeded(f"LLM provider rate limit reached: {e}", retry_after=retry_after)
+                # Nothing was generated: the next attempt takes a fresh reservation, so hand this one back
+                reservation.settle(0)
+                # Everyone backs off together; acquire() gives up once our deadline cannot be met
+                self.governor.backoff(retry_after)
+                continue
+            except RETRYABLE_ERRORS:
+                breaker.record_failure()
+                if reservation:
+                    reservation.settle(0)
+                raise
+            except Exception:
+                # Anything else (e.g. a 400) means the provider is up and the request was at fault
+                breaker.record_success()
+                if reservation:
+                    reservation.settle(0)
+                raise
+
+            breaker.record_success()
+            if stream:
+                return response, reservation
+            self.router.latency.record(model, time.monotonic() - started)
+            usage = getattr(response, 'usage', None)
+            self.token_usage.record(model, prompt_tokens, max_tokens, usage)
+            if reservation:
+                reservation.settle(getattr(usage, 'total_tokens', None))
+            return response, None
+
+    def _get_completion(self, prompt: str, max_tokens: int = 2000, operation: str = 'generate',
+                        parse: Optional[Callable[[str], object]] = None):
+        """Get completion from Groq API, parsed with parse when given."""
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-                max_tokens=2000
+            return self.complete(
+                [{"role": "user", "content": prompt}], max_tokens=max_tokens, operation=operation, parse=parse
             )
-            return response.choices[0].message.content
+        except (RateLimitExceeded, LLMUnavailableError, ContextOverflowError):
+            raise
         except Exception as e:
             print(f"Error getting completion: {str(e)}")
             return None
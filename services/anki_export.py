@@ -0,0 +1,109 @@
+import io
+import os
+import json
+import time
+import sqlite3
+import zipfile
+import hashlib
+import tempfile
+import itertools
+from typing import Dict, List
+
+import genanki
+
+# Bump whenever the package layout changes so cached exports are not served stale
+RENDERER_VERSION = 2
+
+# The note type users already have in their collections; changing it would make Anki import a second one
+ANKI_MODEL = genanki.Model(
+    1607392319,
+    'Simple Model',
+    fields=[
+        {'name': 'Question'},
+        {'name': 'Answer'},
+    ],
+    templates=[
+        {
+            'name': 'Card 1',
+            'qfmt': '{{Question}}',
+            'afmt': '{{FrontSide}}<hr id="answer">{{Answer}}',
+        },
+    ],
+    css="""
+    .card {
+        font-family: arial;
+        font-size: 20px;
+        text-align: center;
+        color: black;
+        background-color: white;
+    }
+    """
+)
+
+
+def stable_id(*parts: str) -> int:
+    """Derive a deterministic Anki id in the range genanki recommends (between 2^30 and 2^31)."""
+    digest = hashlib.sha256('\n'.join(parts).encode('utf-8')).digest()
+    return (1 << 30) + int.from_bytes(digest[:4], 'big') % (1 << 30)
+
+
+def note_guids(deck_name: str, flashcards: List[Dict]) -> List[str]:
+    """Derive note GUIDs from the deck name and question text.
+
+    Editing an answer keeps the GUID, so Anki updates the existing note on
+    re-import instead of adding a duplicate. Repeated questions are numbered.
+    """
+    seen = {}
+    guids = []
+    for card in flashcards:
+        question = ' '.join(str(card['question']).split())
+        occurrence = seen.get(question, 0)
+        seen[question] = occurrence + 1
+        guids.append(genanki.guid_for(deck_name, question, occurrence) if occurrence
+                     else genanki.guid_for(deck_name, question))
+    return guids
+
+
+def render_anki(flashcards: List[Dict], customization: Dict, deck_name: str = 'My Flashcards') -> bytes:
+    """Render a deck to .apkg bytes; customization is not applied, as the note type is fixed."""
+    deck = genanki.Deck(stable_id('deck', deck_name), deck_name)
+    for card, guid in zip(flashcards, note_guids(deck_name, flashcards)):
+        deck.add_note(genanki.Note(model=ANKI_MODEL, fields=[card['question'], card['answer']], guid=guid))
+    return package_to_bytes(genanki.Package(deck))
+
+
+def package_to_bytes(package: genanki.Package) -> bytes:
+    """Build an .apkg in memory instead of going through genanki's temp files."""
+    timestamp = time.time()
+    conn = sqlite3.connect(':memory:')
+    try:
+        package.write_to_db(conn.cursor(), timestamp, itertools.count(int(timestamp * 1000)))
+        conn.commit()
+        collection = _serialize(conn)
+    finally:
+        conn.close()
+
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as apkg:
+        apkg.writestr('collection.anki2', collection)
+        apkg.writestr('media', json.dumps({}))
+    return output.getvalue()
+
+
+def _serialize(conn: sqlite3.Connection) -> bytes:
+    if hasattr(conn, 'serialize'):
+        return conn.serialize()
+
+    # Python < 3.11 cannot serialize a connection, so back it up through a file we clean up ourselves
+    fd, path = tempfile.mkstemp(suffix='.anki2')
+    os.close(fd)
+    try:
+        target = sqlite3.connect(path)
+        try:
+            conn.backup(target)
+        finally:
+            target.close()
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(path)
@@ -0,0 +1,281 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Callable, Dict, Iterable, List, Optional
+
+import httpx
+from groq import AsyncGroq, RateLimitError
+
+from config import Config
+from services.translation_memory import TranslationMemory
+from services.rate_governor import RateGovernor, RateLimitExceeded
+from services.chunking import generate_in_chunks_async
+from services.llm_resilience import CallStats, LLMUnavailableError, hedge_delay, retry_delay
+from services.model_router import ModelFallback, ModelRouter
+from services.single_flight import SingleFlight
+from services.token_budget import (
+    TokenUsage, completion_budget, estimate_tokens, generation_chunk_tokens, rewrite_budget
+)
+from services.structured_output import ParsedCards, parse_card, parse_cards, parse_stats
+from services.ai_service import (
+    RETRYABLE_ERRORS, generation_messages, improve_prompt, retry_after_seconds, translate_prompt
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAIService:
+    """AIService for event-loop callers.
+
+    Every call goes through one AsyncGroq client on a pooled httpx connection
+    pool, so an in-flight generation holds a socket rather than a worker
+    thread. Prompts and parsing are shared with AIService. Create it inside the
+    running loop, and close it with aclose() on shutdown.
+    """
+
+    def __init__(self, translation_memory: Optional[TranslationMemory] = None,
+                 governor: Optional[RateGovernor] = None,
+                 router: Optional[ModelRouter] = None,
+                 max_connections: int = 200,
+                 single_flight: Optional[SingleFlight] = None,
+                 call_stats: Optional[CallStats] = None,
+                 token_usage: Optional[TokenUsage] = None):
+        self.api_key = os.getenv('GROQ_API_KEY')
+        if not self.api_key:
+            raise ValueError("GROQ_API_KEY is required")
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(60.0, connect=10.0)
+        )
+        # 429s are retried by the governor, which shares the back-off with every worker
+        self.client = AsyncGroq(
+            api_key=self.api_key,
+            http_client=self.http_client,
+            max_retries=0 if governor else 2
+        )
+        # Pass the sync service's router to share latency history, parse failures and circuit state
+        self.router = router or ModelRouter(
+            Config.LLM_MODEL_ROUTES, Config.LLM_BREAKER_FAILURES, Config.LLM_BREAKER_RESET
+        )
+        self.model = self.router.primary('translate')
+        self.translation_memory = translation_memory
+        self.governor = governor
+        # Pass the sync service's counters so /api/llm/stats covers calls made here too
+        self.call_stats = call_stats or CallStats()
+        self.token_usage = token_usage or TokenUsage()
+        # Pass the sync service's registry so calls coalesce across threads and loop tasks
+        self.single_flight = single_flight or SingleFlight()
+
+    async def aclose(self):
+        """Close the pooled connections."""
+        await self.client.close()
+
+    async def generate_flashcards(self, text: str, num_cards: int) -> List[Dict[str, str]]:
+        """Generate flashcards from input text, awaiting every chunk concurrently."""
+        chunk_tokens = generation_chunk_tokens(estimate_tokens(text), num_cards, self.router.models('generate'))
+        return await generate_in_chunks_async(text, num_cards, self._generate_chunk, max_tokens=chunk_tokens)
+
+    async def _generate_chunk(self, text: str, num_cards: Optional[int] = None) -> List[Dict[str, str]]:
+        return await self.generate_cards(generation_messages, text, num_cards)
+
+    async def generate_cards(self, build_messages: Callable[..., List[Dict[str, str]]], text: str,
+                             num_cards: Optional[int] = None, exclude: Iterable[str] = ()) -> ParsedCards:
+        """Generate cards for one chunk, re-asking only for those a cut-off reply lost; see AIService.generate_cards."""
+        exclude = list(exclude)
+        max_tokens = completion_budget(num_cards) if num_cards else 2000
+        cards = await self.complete(
+            build_messages(text, num_cards, exclude), max_tokens=max_tokens, operation='generate', parse=parse_cards
+        )
+        missing = (num_cards or 0) - len(cards)
+        if cards.status == 'salvaged' and missing > 0:
+            more = await self.complete(
+                build_messages(text, missing, exclude + [card['question'] for card in cards]),
+                max_tokens=completion_budget(missing), operation='generate', parse=parse_cards
+            )
+            parse_stats.count('generate', 'reprompts')
+            parse_stats.count('generate', 'reprompt_cards', len(more))
+            cards = ParsedCards(cards + more, cards.status)
+        return cards
+
+    async def improve_flashcard(self, flashcard: Dict) -> Dict:
+        """Improve a flashcard's content using AI."""
+        improved = await self.complete(
+            [{"role": "user", "content": improve_prompt(flashcard)}], max_tokens=self._card_budget(flashcard),
+            operation='improve', parse=parse_card
+        )
+        if not improved:
+            raise ValueError("Failed to parse improved flashcard")
+        return improved[0]
+
+    async def translate_flashcard(self, flashcard: Dict, target_language: str) -> Dict:
+        """Translate a flashcard to the target language, consulting translation memory first."""
+        key = SingleFlight.make_key(
+            'translate', flashcard['question'], flashcard['answer'], target_language, self.model
+        )
+        return await self.single_flight.do_async(key, lambda: self._translate_flashcard(flashcard, target_language))
+
+    async def _translate_flashcard(self, flashcard: Dict, target_language: str) -> Dict:
+        original = {'original_question': flashcard['question'], 'original_answer': flashcard['answer']}
+        if self.translation_memory:
+            known = await asyncio.to_thread(
+                self.translation_memory.lookup_many,
+                [flashcard['question'], flashcard['answer']], target_language, self.model
+            )
+            if flashcard['question'] in known and flashcard['answer'] in known:
+                return {'question': known[flashcard['question']], 'answer': known[flashcard['answer']], **original}
+
+        translated = await self.complete(
+            [{"role": "user", "content": translate_prompt(flashcard, target_language)}],
+            max_tokens=self._card_budget(flashcard), operation='translate', parse=parse_card
+        )
+        if not translated:
+            raise ValueError("Failed to parse translated flashcard")
+        translated = translated[0]
+
+        if self.translation_memory:
+            await asyncio.to_thread(
+                self.translation_memory.store_many,
+                {flashcard['question']: translated['question'], flashcard['answer']: translated['answer']},
+                target_language, self.model
+            )
+        return {**translated, **original}
+
+    async def complete(self, messages: List[Dict[str, str]], max_tokens: int = 2000, temperature: float = 0.7,
+                       operation: str = 'generate', parse: Optional[Callable[[str], object]] = None):
+        """Run one chat completion on the models routed for operation; see AIService.complete."""
+        fallback = ModelFallback(
+            self.router, operation, sum(estimate_tokens(message['content']) for message in messages), max_tokens,
+            self.call_stats, self.token_usage, parse
+        )
+        for model, budget, deadline in fallback:
+            try:
+                text = await self._complete_on(model, messages, budget, temperature, deadline)
+            except LLMUnavailableError as e:
+                fallback.failed(e)
+                continue
+            if fallback.accept(model, text):
+                break
+        return fallback.outcome()
+
+    def _card_budget(self, flashcard: Dict) -> int:
+        return rewrite_budget(estimate_tokens(f"{flashcard['question']}\n{flashcard['answer']}"))
+
+    async def _complete_on(self, model: str, messages: List[Dict[str, str]], max_tokens: int,
+                           temperature: float, deadline: float) -> str:
+        """Call one model within deadline, retrying transient failures with jittered back-off."""
+        self.call_stats.count('calls')
+        attempt = 0
+        while True:
+            try:
+                response = await self._send_hedged(model, messages, max_tokens, temperature, deadline)
+                return response.choices[0].message.content
+            except RETRYABLE_ERRORS as e:
+                attempt += 1
+                delay = retry_delay(model, attempt, deadline, e)
+                self.call_stats.count('retries')
+                await asyncio.sleep(delay)
+
+    async def _send_hedged(self, model: str, messages: List[Dict[str, str]], max_tokens: int, temperature: float,
+                           deadline: float):
+        """Send the request, and a duplicate once it outlives the recent p95; the loser is cancelled."""
+        started = time.monotonic()
+        primary = asyncio.ensure_future(self._send(model, messages, max_tokens, temperature, deadline))
+        pending = {primary}
+        errors = {}
+        try:
+            if Config.LLM_HEDGE_ENABLED:
+                done, _ = await asyncio.wait(
+                    pending, timeout=min(hedge_delay(self.router.latency, model), max(0.0, deadline - time.monotonic()))
+                )
+                if not done and time.monotonic() < deadline:
+                    pending.add(asyncio.ensure_future(
+                        self._send(model, messages, max_tokens, temperature, deadline, queue_timeout=0)
+                    ))
+                    self.call_stats.count('hedged')
+
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0.0, deadline - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    self.call_stats.count('deadline_exceeded')
+                    self.router.latency.record(model, time.monotonic() - started)
+                    raise LLMUnavailableError(f"LLM call to {model} exceeded its deadline", retry_after=1.0)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.call_stats.count('hedge_wins')
+                        return task.result()
+                    errors[task] = task.exception()
+            # A hedge that found no spare capacity is not the interesting failure
+            raise errors.get(primary) or next(iter(errors.values()))
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _send(self, model: str, messages: List[Dict[str, str]], max_tokens: int, temperature: float,
+                    deadline: float, queue_timeout: Optional[float] = None):
+        """Make one attempt: wait for capacity without blocking the loop, check the breaker, call the provider."""
+        prompt_tokens = sum(estimate_tokens(message['content']) for message in messages)
+        estimated = prompt_tokens + max_tokens
+        breaker = self.router.breaker(model)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.call_stats.count('deadline_exceeded')
+                raise LLMUnavailableError(f"LLM call to {model} exceeded its deadline", retry_after=1.0)
+
+            reservation = None
+            if self.governor:
+                timeout = min(Config.LLM_QUEUE_TIMEOUT, remaining) if queue_timeout is None else queue_timeout
+                reservation = await self.governor.acquire_async(estimated, timeout=timeout)
+            try:
+                breaker.before_call()
+            except LLMUnavailableError:
+                if reservation:
+                    await asyncio.to_thread(reservation.settle, 0)
+                raise
+
+            started = time.monotonic()
+            try:
+                response = await self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    timeout=max(0.1, deadline - started)
+                )
+            except RateLimitError as e:
+                breaker.record_success()
+                retry_after = retry_after_seconds(e)
+                if not self.governor:
+                    raise RateLimitExceeded(f"LLM provider rate limit reached: {e}", retry_after=retry_after)
+                await asyncio.to_thread(reservation.settle, 0)
+                await asyncio.to_thread(self.governor.backoff, retry_after)
+                continue
+            except RETRYABLE_ERRORS:
+                breaker.record_failure()
+                if reservation:
+                    await asyncio.to_thread(reservation.settle, 0)
+                raise
+            except asyncio.CancelledError:
+                # A cancelled hedge says nothing about the provider's health; free a half-open trial
+                breaker.release_trial()
+                if reservation:
+                    # The aborted request cost at most its prompt; the completion budget goes back to everyone
+                    await asyncio.to_thread(reservation.settle, prompt_tokens)
+                raise
+            except Exception:
+                breaker.record_success()
+                if reservation:
+                    await asyncio.to_thread(reservation.settle, 0)
+                raise
+
+            breaker.record_success()
+            self.router.latency.record(model, time.monotonic() - started)
+            usage = getattr(response, 'usage', None)
+            self.token_usage.record(model, prompt_tokens, max_tokens, usage)
+            if reservation:
+                await asyncio.to_thread(reservation.settle, getattr(usage, 'total_tokens', None))
+            return response
@@ -1,42 +1,101 @@
 import os
 import jwt
+import time
+import sqlite3
+import threading
 from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
 from typing import Dict, Optional
 
-class AuthService:
-    def __init__(self):
+from config import Config
+from services.lru import LRUCache
+from services.sqlite_store import SQLiteStore
+
+class AuthService(SQLiteStore):
+    """Users in SQLite, shared by every gunicorn worker on the host.
+
+    Verified tokens are remembered per worker until they expire, so
+    token_required costs a dictionary lookup instead of a JWT decode.
+    register_user and login_user hash the password on the calling thread;
+    the ASGI entry point calls them on worker threads, off its event loop.
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS users (
+        email TEXT PRIMARY KEY,
+        password TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    """
+
+    def __init__(self, path: str = Config.AUTH_DB_PATH, token_cache_size: int = Config.AUTH_TOKEN_CACHE_SIZE):
+        super().__init__(path)
         self.secret_key = os.getenv('JWT_SECRET_KEY', 'your-secret-key')  # In production, always use environment variable
-        self._users = {}  # In production, use a proper database
+        self._tokens = LRUCache(token_cache_size)
+        self._stats_lock = threading.Lock()
+        self._stats = {'token_hits': 0, 'token_misses': 0}
 
     def register_user(self, email: str, password: str) -> Dict:
         """Register a new user."""
-        if email in self._users:
+        if self._password_hash(email) is not None:
             raise ValueError("Email already registered")
 
         hashed_password = generate_password_hash(password)
-        self._users[email] = {
-            'password': hashed_password,
-            'created_at': datetime.utcnow()
-        }
+        try:
+            with self.transaction() as conn:
+                conn.execute(
+                    'INSERT INTO users (email, password, created_at) VALUES (?, ?, ?)',
+                    (email, hashed_password, time.time())
+                )
+        except sqlite3.IntegrityError:
+            # Registered by a concurrent request, possibly on another worker
+            raise ValueError("Email already registered")
 
         return self._create_user_response(email)
 
     def login_user(self, email: str, password: str) -> Dict:
         """Authenticate a user and return a token."""
-        user = self._users.get(email)
-        if not user or not check_password_hash(user['password'], password):
+        hashed_password = self._password_hash(email)
+        if hashed_password is None or not check_password_hash(hashed_password, password):
             raise ValueError("Invalid email or password")
 
         return self._create_user_response(email)
 
     def verify_token(self, token: str) -> Optional[str]:
         """Verify a JWT token and return the user email."""
+        email = self._tokens.get(token)
+        if email is not None:
+            self._count('token_hits')
+            return email
+
+        self._count('token_misses')
         try:
             payload = jwt.decode(token, self.secret_key, algorithms=['HS256'])
-            return payload.get('email')
         except jwt.InvalidTokenError:
             return None
+        email = payload.get('email')
+        # Remembered only until the token expires, so an expired token is never accepted from the cache
+        lifetime = payload.get('exp', 0) - time.time()
+        if email and lifetime > 0:
+            self._tokens.set(token, email, ttl=lifetime)
+        return email
+
+    def stats(self) -> Dict:
+        """Return verified-token cache counters for this process."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['token_hits'] + stats['token_misses']
+        stats['token_hit_rate'] = stats['token_hits'] / lookups if lookups else 0.0
+        stats['cached_tokens'] = len(self._tokens)
+        return stats
+
+    def _password_hash(self, email: str) -> Optional[str]:
+        row = self.connection().execute('SELECT password FROM users WHERE email = ?', (email,)).fetchone()
+        return row[0] if row else None
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
 
     def _create_user_response(self, email: str) -> Dict:
         """Create a response with token for the user."""
@@ -0,0 +1,107 @@
+import io
+import csv
+import json
+import time
+import logging
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the CSV/JSON layout changes so cached exports are not served stale
+CSV_RENDERER_VERSION = 1
+JSON_RENDERER_VERSION = 1
+
+# Members that are already zip archives gain nothing from being deflated again
+STORED_EXTENSIONS = ('.apkg',)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def render_csv(flashcards: List[Dict], customization: Dict) -> bytes:
+    """Render a deck as a question,answer CSV."""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['question', 'answer'])
+    for card in flashcards:
+        writer.writerow([card['question'], card['answer']])
+    # The BOM lets Excel detect UTF-8 instead of mangling non-ASCII cards
+    return output.getvalue().encode('utf-8-sig')
+
+
+def render_json(flashcards: List[Dict], customization: Dict) -> bytes:
+    """Render a deck as a JSON document in the same shape the API returns."""
+    return json.dumps({'flashcards': flashcards}, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+class _StreamSink:
+    """Write-only file object that hands zipfile's output back in pieces.
+
+    It has no tell() or seek(), so zipfile writes each member's sizes in a
+    data descriptor after its data instead of seeking back to the header.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_bundle(renders: Dict[str, Callable[[], bytes]]) -> Iterator[bytes]:
+    """Render every member concurrently and yield a zip archive as members finish.
+
+    renders maps member file names to callables returning their bytes. Members
+    are written in completion order, so the first bytes go out as soon as the
+    fastest format is ready. Members that fail are listed in errors.json.
+    """
+    executor = _get_executor()
+    futures = {executor.submit(render): name for name, render in renders.items()}
+    errors = {}
+    sink = _StreamSink()
+    try:
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as bundle:
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    data = future.result()
+                except Exception as e:
+                    logger.error(f"Error rendering {name} for bundle: {e}")
+                    errors[name] = str(e)
+                    continue
+
+                info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+                info.compress_type = zipfile.ZIP_STORED if name.endswith(STORED_EXTENSIONS) else zipfile.ZIP_DEFLATED
+                bundle.writestr(info, data)
+                yield sink.drain()
+
+            if errors:
+                bundle.writestr('errors.json', json.dumps({'errors': errors}, indent=2))
+        yield sink.drain()
+    finally:
+        # A client that disconnects early should not leave queued renders behind
+        for future in futures:
+            future.cancel()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Return the process-wide pool used for bundle rendering."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=Config.EXPORT_MAX_WORKERS, thread_name_prefix='export-worker')
+        return _executor
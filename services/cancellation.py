@@ -0,0 +1,112 @@
+import time
+import threading
+import contextvars
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+# How often blocked waits wake up to see whether their work was cancelled
+POLL_INTERVAL = 0.1
+
+
+class Cancelled(BaseException):
+    """Raised inside work that was abandoned because its client disconnected or its job was cancelled.
+
+    Like asyncio.CancelledError it is not an Exception, so the broad
+    except-Exception handlers around LLM calls and chunk fan-out let it through.
+    """
+
+
+class CancelToken:
+    """Cancellation flag shared by everything done on behalf of one request or job.
+
+    poll, when given, is asked (at most every poll_interval seconds) whether
+    the work was cancelled somewhere this process cannot signal directly, such
+    as a cancel request served by another worker.
+    """
+
+    def __init__(self, poll: Optional[Callable[[], bool]] = None, poll_interval: float = 1.0):
+        self.reason = 'cancelled'
+        self._event = threading.Event()
+        self._poll = poll
+        self._poll_interval = poll_interval
+        self._polled_at = 0.0
+
+    def cancel(self, reason: str = 'cancelled'):
+        self.reason = reason
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self._poll and time.monotonic() - self._polled_at >= self._poll_interval:
+            self._polled_at = time.monotonic()
+            if self._poll():
+                self._event.set()
+        return self._event.is_set()
+
+    def check(self):
+        """Raise Cancelled if the work was cancelled."""
+        if self.cancelled:
+            raise Cancelled(self.reason)
+
+    def sleep(self, seconds: float):
+        """Sleep for up to seconds, raising Cancelled as soon as the work is cancelled."""
+        end = time.monotonic() + seconds
+        while True:
+            self.check()
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return
+            # A polled token is not woken by the event, so it is re-checked at the poll interval
+            self._event.wait(min(remaining, POLL_INTERVAL) if self._poll else remaining)
+
+
+_token: contextvars.ContextVar = contextvars.ContextVar('cancel_token', default=None)
+
+
+@contextmanager
+def cancellation(token: Optional[CancelToken]):
+    """Make token the cancellation token of the work done inside the block (and of the pools it submits to)."""
+    context_token = _token.set(token)
+    try:
+        yield token
+    finally:
+        _token.reset(context_token)
+
+
+def current_token() -> Optional[CancelToken]:
+    return _token.get()
+
+
+def check_cancelled():
+    """Raise Cancelled if the current work was cancelled; a no-op outside any cancellable work."""
+    token = _token.get()
+    if token is not None:
+        token.check()
+
+
+def cancellable_sleep(seconds: float):
+    """time.sleep() that is cut short by cancellation of the current work."""
+    token = _token.get()
+    if token is None:
+        time.sleep(seconds)
+    else:
+        token.sleep(seconds)
+
+
+def wait_result(future: Future, timeout: Optional[float] = None):
+    """Return future.result(timeout), raising Cancelled early if the current work is cancelled meanwhile."""
+    token = _token.get()
+    if token is None:
+        return future.result(timeout)
+    end = None if timeout is None else time.monotonic() + timeout
+    while True:
+        token.check()
+        wait = POLL_INTERVAL if end is None else min(POLL_INTERVAL, max(0.0, end - time.monotonic()))
+        try:
+            return future.result(wait)
+        except FutureTimeoutError:
+            if end is not None and time.monotonic() >= end:
+                raise
@@ -0,0 +1,283 @@
+import re
+import asyncio
+import threading
+import contextvars
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from config import Config
+from services.rate_governor import RateLimitExceeded
+from services.cancellation import Cancelled, wait_result
+from services.llm_resilience import LLMUnavailableError
+from services.token_budget import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def split_text(text: str, max_tokens: int) -> List[str]:
+    """Split text into chunks of at most max_tokens, on paragraph boundaries where possible."""
+    if estimate_tokens(text) <= max_tokens:
+        return [text] if text.strip() else []
+
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for piece, tokens in _split_pieces(text, max_tokens):
+        if current and current_tokens + tokens + 1 > max_tokens:
+            chunks.append('\n'.join(current))
+            current = []
+            current_tokens = 0
+        current.append(piece)
+        current_tokens += tokens + 1
+
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+
+def _split_pieces(text: str, max_tokens: int):
+    """Yield (piece, tokens) for paragraphs, breaking oversized ones into sentences and then slices."""
+    for paragraph in text.split('\n'):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = estimate_tokens(paragraph)
+        if tokens <= max_tokens:
+            yield paragraph, tokens
+            continue
+        for sentence in _SENTENCE_RE.split(paragraph):
+            tokens = estimate_tokens(sentence)
+            if tokens <= max_tokens:
+                yield sentence, tokens
+                continue
+            # Slice at the sentence's own characters-per-token rate, so dense text gets shorter slices
+            step = max(1, len(sentence) * max_tokens // tokens)
+            for start in range(0, len(sentence), step):
+                piece = sentence[start:start + step]
+                yield piece, estimate_tokens(piece)
+
+
+def pack_by_tokens(texts: List[str], max_tokens: int, max_items: int) -> List[List[int]]:
+    """Group item indices into batches that stay within max_tokens and max_items."""
+    batches = []
+    current = []
+    current_tokens = 0
+
+    for index, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(index)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def allocate_cards(chunks: List[str], num_cards: int) -> List[int]:
+    """Distribute num_cards across chunks in proportion to their length."""
+    total = sum(len(chunk) for chunk in chunks)
+    if not chunks or total == 0:
+        return [0] * len(chunks)
+
+    shares = [num_cards * len(chunk) / total for chunk in chunks]
+    allocations = [int(share) for share in shares]
+    # Hand out the remaining cards by largest remainder
+    remaining = num_cards - sum(allocations)
+    by_remainder = sorted(range(len(chunks)), key=lambda i: shares[i] - allocations[i], reverse=True)
+    for i in by_remainder[:remaining]:
+        allocations[i] += 1
+    return allocations
+
+
+def submit_task(fn: Callable, *args) -> Future:
+    """Schedule fn(*args) on the shared pool used for LLM fan-out, as the current LLM caller."""
+    return _get_executor().submit(contextvars.copy_context().run, fn, *args)
+
+
+def map_chunks(chunks: List, fn: Callable, args: List[tuple]) -> List[List]:
+    """Run fn(chunk, *args[i]) for every chunk on the shared pool and return results in chunk order."""
+    executor = _get_executor()
+    futures = [
+        executor.submit(contextvars.copy_context().run, fn, chunk, *extra) for chunk, extra in zip(chunks, args)
+    ]
+
+    results = []
+    throttled = None
+    for index, future in enumerate(futures):
+        try:
+            results.append(wait_result(future) or [])
+        except Cancelled:
+            # Chunks already running stop at their next check; the rest never start
+            for pending in futures[index + 1:]:
+                pending.cancel()
+            raise
+        except (RateLimitExceeded, LLMUnavailableError) as e:
+            # Being throttled or a failing provider is not a bad chunk; surface it instead of a short deck
+            throttled = throttled or e
+            results.append([])
+        except Exception as e:
+            logger.error(f"Error processing chunk {index}: {e}")
+            results.append([])
+    if throttled:
+        raise throttled
+    return results
+
+
+def merge_flashcards(results: List[List[Dict]], allocations: Optional[List[int]] = None,
+                     num_cards: Optional[int] = None) -> List[Dict]:
+    """Merge per-chunk flashcards, dropping duplicates and keeping document order."""
+    seen = set()
+    selected = [[] for _ in results]
+    surplus = []
+
+    for index, cards in enumerate(results):
+        if not isinstance(cards, list):
+            continue
+        quota = allocations[index] if allocations is not None else None
+        for card in cards:
+            if not isinstance(card, dict) or not card.get('question') or not card.get('answer'):
+                continue
+            key = ' '.join(str(card['question']).lower().split())
+            if key in seen:
+                continue
+            seen.add(key)
+            if quota is None or len(selected[index]) < quota:
+                selected[index].append(card)
+            else:
+                surplus.append((index, card))
+
+    if num_cards is not None:
+        # Top up chunks that came back short with extras from the others
+        shortfall = num_cards - sum(len(cards) for cards in selected)
+        for index, card in surplus[:max(shortfall, 0)]:
+            selected[index].append(card)
+
+    merged = [card for cards in selected for card in cards]
+    return merged[:num_cards] if num_cards is not None else merged
+
+
+def generate_in_chunks(text: str, num_cards: int, generate_chunk: Callable[[str, int], List[Dict]],
+                       max_tokens: int) -> List[Dict]:
+    """Generate num_cards flashcards from text by fanning chunks out to generate_chunk."""
+    chunks = split_text(text, max_tokens)
+    if len(chunks) <= 1:
+        return merge_flashcards([generate_chunk(text, num_cards)], num_cards=num_cards)
+
+    allocations = allocate_cards(chunks, num_cards)
+    work = [(chunk, count) for chunk, count in zip(chunks, allocations) if count > 0]
+    logger.info(f"Generating {num_cards} flashcards from {len(work)} of {len(chunks)} chunks")
+
+    # Over-request slightly so duplicates and short chunks can still be covered by the merge
+    results = map_chunks(
+        [chunk for chunk, _ in work],
+        generate_chunk,
+        [(count + max(1, count // 4),) for _, count in work]
+    )
+    return merge_flashcards(results, [count for _, count in work], num_cards)
+
+
+async def generate_in_chunks_async(text: str, num_cards: int,
+                                   generate_chunk: Callable[[str, int], Awaitable[List[Dict]]],
+                                   max_tokens: int) -> List[Dict]:
+    """generate_in_chunks() for event-loop callers: chunks are awaited concurrently instead of on the pool."""
+    chunks = split_text(text, max_tokens)
+    if len(chunks) <= 1:
+        return merge_flashcards([await generate_chunk(text, num_cards)], num_cards=num_cards)
+
+    allocations = allocate_cards(chunks, num_cards)
+    work = [(chunk, count) for chunk, count in zip(chunks, allocations) if count > 0]
+    logger.info(f"Generating {num_cards} flashcards from {len(work)} of {len(chunks)} chunks")
+
+    outcomes = await asyncio.gather(
+        *(generate_chunk(chunk, count + max(1, count // 4)) for chunk, count in work),
+        return_exceptions=True
+    )
+    results = []
+    for index, outcome in enumerate(outcomes):
+        if isinstance(outcome, (RateLimitExceeded, LLMUnavailableError, Cancelled, asyncio.CancelledError)):
+            raise outcome
+        if isinstance(outcome, BaseException):
+            logger.error(f"Error processing chunk {index}: {outcome}")
+            outcome = []
+        results.append(outcome or [])
+    return merge_flashcards(results, [count for _, count in work], num_cards)
+
+
+def generate_in_sections(sections: List[str], fingerprints: List[str], num_cards: int,
+                         generate_chunk: Callable[..., List[Dict]], max_tokens: int,
+                         previous: Dict[str, List[Dict]]) -> List[List[Dict]]:
+    """Generate num_cards flashcards across document sections, reusing previous cards for unchanged ones.
+
+    Returns one list of cards per section. Sections whose fingerprint is not in
+    previous are sent to generate_chunk(chunk, count). An unchanged section
+    with fewer previous cards than its share keeps them and asks only for the
+    rest, as generate_chunk(chunk, count, exclude) with the questions it has.
+    """
+    allocations = allocate_cards(sections, num_cards)
+    results = [None] * len(sections)
+    kept = {}
+    for index, fingerprint in enumerate(fingerprints):
+        cards = previous.get(fingerprint)
+        if cards is None:
+            continue
+        if len(cards) >= allocations[index]:
+            results[index] = cards[:allocations[index]]
+        else:
+            kept[index] = cards
+
+    pending = [index for index, cards in enumerate(results) if cards is None]
+    logger.info(
+        f"Reusing {len(sections) - len(pending)} of {len(sections)} sections, topping up {len(kept)}, "
+        f"regenerating {len(pending) - len(kept)}"
+    )
+
+    units = []
+    for index in pending:
+        cards = kept.get(index, [])
+        results[index] = cards
+        count = allocations[index] - len(cards)
+        if count <= 0:
+            continue
+        extra = (tuple(card['question'] for card in cards),) if cards else ()
+        chunks = split_text(sections[index], max_tokens)
+        for chunk, chunk_count in zip(chunks, allocate_cards(chunks, count)):
+            if chunk_count > 0:
+                units.append((index, chunk, chunk_count, extra))
+
+    generated = map_chunks(
+        [chunk for _, chunk, _, _ in units],
+        generate_chunk,
+        [(count + max(1, count // 4),) + extra for _, _, count, extra in units]
+    )
+
+    per_section = {}
+    for (index, _, count, _), cards in zip(units, generated):
+        section_results, section_allocations = per_section.setdefault(
+            index, ([results[index]], [len(results[index])])
+        )
+        section_results.append(cards)
+        section_allocations.append(count)
+    for index, (section_results, section_allocations) in per_section.items():
+        # Kept cards come first, so new ones that repeat them are dropped
+        results[index] = merge_flashcards(section_results, section_allocations, allocations[index])
+    return results
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Return the process-wide pool used for chunk fan-out."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=Config.CHUNK_MAX_WORKERS, thread_name_prefix='chunk-worker')
+        return _executor
@@ -0,0 +1,91 @@
+import os
+import time
+import zlib
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional
+
+from services.sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionCache(SQLiteStore):
+    """Compressed on-disk cache of extracted document text, bounded by total bytes with LRU eviction."""
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS extractions (
+        key TEXT PRIMARY KEY,
+        text BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        accessed_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_extractions_accessed_at ON extractions (accessed_at);
+    """
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        super().__init__(path)
+        self.max_bytes = max_bytes
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'writes': 0}
+
+    @staticmethod
+    def make_key(file_sha256: str, filename: str, extractor_version: int, max_chars: int,
+                 kind: str = 'text') -> str:
+        """Key a file's extracted text by its content hash and everything that shapes the output."""
+        extension = os.path.splitext(filename.lower())[1]
+        payload = f'{file_sha256}:{extension}:{extractor_version}:{max_chars}:{kind}'
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached text for key, or None."""
+        text = None
+        try:
+            conn = self.connection()
+            row = conn.execute('SELECT text FROM extractions WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                conn.execute('UPDATE extractions SET accessed_at = ? WHERE key = ?', (time.time(), key))
+                text = zlib.decompress(row[0]).decode('utf-8')
+        except Exception as e:
+            logger.error(f"Error reading extraction cache: {e}")
+
+        self._count('hits' if text is not None else 'misses')
+        return text
+
+    def set(self, key: str, text: str):
+        """Store compressed text and evict least recently used entries beyond the byte budget."""
+        data = zlib.compress(text.encode('utf-8'), 6)
+        if len(data) > self.max_bytes:
+            return
+        try:
+            with self.transaction() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO extractions (key, text, size, accessed_at) VALUES (?, ?, ?, ?)',
+                    (key, data, len(data), time.time())
+                )
+                conn.execute(
+                    'DELETE FROM extractions WHERE key IN ('
+                    'SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC) AS total '
+                    'FROM extractions) WHERE total > ?)',
+                    (self.max_bytes,)
+                )
+            self._count('writes')
+        except Exception as e:
+            logger.error(f"Error writing extraction cache: {e}")
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters for this process and the cache's current footprint."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        entries, size = self.connection().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions').fetchone()
+        stats['entries'] = entries
+        stats['bytes'] = size
+        stats['max_bytes'] = self.max_bytes
+        return stats
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
@@ -0,0 +1,109 @@
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from services.lru import LRUCache
+from services.sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationCache(SQLiteStore):
+    """Two-tier cache of generated flashcards: a per-process LRU in front of a shared SQLite table."""
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS generations (
+        key TEXT PRIMARY KEY,
+        flashcards TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_generations_accessed_at ON generations (accessed_at);
+    """
+
+    def __init__(self, path: str, max_memory_entries: int = 256, max_disk_entries: int = 10000,
+                 ttl: float = 7 * 24 * 3600):
+        super().__init__(path)
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self._memory = LRUCache(max_memory_entries, ttl)
+        self._stats_lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'writes': 0}
+
+    @staticmethod
+    def make_key(text: str, num_cards: int, model: str, prompt_version: int) -> str:
+        """Build a content-addressed key for a generation request."""
+        normalized = ' '.join(text.split())
+        payload = json.dumps([normalized, num_cards, model, prompt_version], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """Return cached flashcards for key, checking memory first and then disk."""
+        flashcards = self._memory.get(key)
+        if flashcards is not None:
+            self._count('memory_hits')
+            return flashcards
+
+        try:
+            row = self._get_from_disk(key)
+        except Exception as e:
+            logger.error(f"Error reading generation cache: {e}")
+            row = None
+
+        if row is None:
+            self._count('misses')
+            return None
+
+        flashcards, created_at = row
+        self._count('disk_hits')
+        self._memory.set(key, flashcards, ttl=created_at + self.ttl - time.time())
+        return flashcards
+
+    def set(self, key: str, flashcards: List[Dict]):
+        """Store flashcards in both tiers, evicting old disk entries beyond the size limit."""
+        self._memory.set(key, flashcards)
+        now = time.time()
+        try:
+            with self.transaction() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO generations (key, flashcards, created_at, accessed_at) '
+                    'VALUES (?, ?, ?, ?)',
+                    (key, json.dumps(flashcards, ensure_ascii=False), now, now)
+                )
+                conn.execute('DELETE FROM generations WHERE created_at <= ?', (now - self.ttl,))
+                conn.execute(
+                    'DELETE FROM generations WHERE key IN ('
+                    'SELECT key FROM generations ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                    (self.max_disk_entries,)
+                )
+            self._count('writes')
+        except Exception as e:
+            logger.error(f"Error writing generation cache: {e}")
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters for this process and the current tier sizes."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        stats['memory_entries'] = len(self._memory)
+        stats['disk_entries'] = self.connection().execute('SELECT COUNT(*) FROM generations').fetchone()[0]
+        return stats
+
+    def _get_from_disk(self, key: str) -> Optional[tuple]:
+        conn = self.connection()
+        row = conn.execute('SELECT flashcards, created_at FROM generations WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] <= now - self.ttl:
+            return None
+        conn.execute('UPDATE generations SET accessed_at = ? WHERE key = ?', (now, key))
+        return json.loads(row[0]), row[1]
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
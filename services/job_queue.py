@@ -0,0 +1,161 @@
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from services.cancellation import CancelToken, Cancelled, cancellation
+from services.sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class JobQueue(SQLiteStore):
+    """Bounded background worker pool for generation jobs.
+
+    Work runs in the submitting process, but job state lives in SQLite so a
+    status poll can be answered by any gunicorn worker. A job cancelled from
+    any worker is marked in SQLite; the worker running it notices within
+    CANCEL_POLL_INTERVAL (at once if it served the cancel itself) and stops.
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        owner TEXT,
+        kind TEXT NOT NULL,
+        status TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        client_error INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at);
+    """
+
+    # How often a running job checks SQLite for a cancel served by another worker
+    CANCEL_POLL_INTERVAL = 1.0
+
+    def __init__(self, path: str, max_workers: int = 4, max_pending: int = 32, result_ttl: float = 3600):
+        super().__init__(path)
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job-worker')
+        self._pending = 0
+        self._tokens: Dict[str, CancelToken] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn: Callable, *args, owner: Optional[str] = None,
+               cleanup: Optional[Callable[[], None]] = None) -> str:
+        """Queue fn(*args) as a background job and return its id.
+
+        cleanup, when given, runs once the job is over, whether fn finished,
+        failed or never started because the job was cancelled while queued.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"Job queue is full ({self.max_pending} pending)")
+            self._pending += 1
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        try:
+            with self.transaction() as conn:
+                conn.execute('DELETE FROM jobs WHERE created_at <= ?', (now - self.result_ttl,))
+                conn.execute(
+                    'INSERT INTO jobs (id, owner, kind, status, created_at, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (job_id, owner, kind, 'queued', now, now)
+                )
+            # Jobs run in the submitting request's context, so their LLM calls are charged to its user
+            self._executor.submit(contextvars.copy_context().run, self._run, job_id, fn, args, cleanup)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Return a job's state, or None if it does not exist or has expired."""
+        row = self.connection().execute(
+            'SELECT id, owner, kind, status, result, error, client_error, created_at, updated_at '
+            'FROM jobs WHERE id = ?',
+            (job_id,)
+        ).fetchone()
+        if row is None or row[7] <= time.time() - self.result_ttl:
+            return None
+        return {
+            'id': row[0],
+            'owner': row[1],
+            'kind': row[2],
+            'status': row[3],
+            'result': json.loads(row[4]) if row[4] is not None else None,
+            'error': row[5],
+            'client_error': bool(row[6]),
+            'created_at': row[7],
+            'updated_at': row[8]
+        }
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; returns False if it had already finished."""
+        with self.transaction() as conn:
+            cancelled = conn.execute(
+                "UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id)
+            ).rowcount
+        with self._lock:
+            token = self._tokens.get(job_id)
+        if cancelled and token:
+            token.cancel('job cancelled')
+        return bool(cancelled)
+
+    def pending(self) -> int:
+        """Return the number of queued or running jobs in this process."""
+        return self._pending
+
+    def _run(self, job_id: str, fn: Callable, args: tuple, cleanup: Optional[Callable[[], None]] = None):
+        token = CancelToken(poll=lambda: self._status(job_id) == 'cancelled', poll_interval=self.CANCEL_POLL_INTERVAL)
+        with self._lock:
+            self._tokens[job_id] = token
+        try:
+            with cancellation(token):
+                # A job cancelled while it was queued never starts
+                token.check()
+                self._update(job_id, status='running')
+                result = fn(*args)
+            self._update(job_id, status='completed', result=json.dumps(result, ensure_ascii=False))
+        except Cancelled:
+            logger.info(f"Job {job_id} cancelled")
+        except Exception as e:
+            logger.error(f"Error in job {job_id}: {str(e)}")
+            self._update(job_id, status='failed', error=str(e), client_error=int(isinstance(e, ValueError)))
+        finally:
+            if cleanup is not None:
+                try:
+                    cleanup()
+                except Exception as e:
+                    logger.error(f"Error cleaning up job {job_id}: {str(e)}")
+            with self._lock:
+                self._tokens.pop(job_id, None)
+                self._pending -= 1
+
+    def _status(self, job_id: str) -> Optional[str]:
+        row = self.connection().execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def _update(self, job_id: str, **fields):
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self.transaction() as conn:
+            # A cancelled job keeps that status whatever its work does next
+            conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ? AND status != 'cancelled'", (*fields.values(), job_id)
+            )
@@ -0,0 +1,168 @@
+import time
+import random
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+from config import Config
+
+
+class LLMUnavailableError(Exception):
+    """Raised when the provider is failing: the circuit is open or retries ran out before the deadline."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Exponential back-off with full jitter, so retries from many callers do not arrive in lockstep."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_delay(model: str, attempt: int, deadline: float, error: Exception) -> float:
+    """Return how long to back off before retry number attempt, or raise once retries or the deadline run out."""
+    delay = backoff_delay(attempt)
+    if attempt > Config.LLM_MAX_RETRIES or time.monotonic() + delay >= deadline:
+        raise LLMUnavailableError(
+            f"LLM call to {model} failed after {attempt} attempts: {error}", retry_after=max(1.0, delay)
+        ) from error
+    return delay
+
+
+def hedge_delay(latency: 'LatencyTracker', model: str) -> float:
+    """Hedge after the model's recent p95 latency, clamped to the configured range."""
+    p95 = latency.percentile(model, 0.95, min_samples=Config.LLM_HEDGE_MIN_SAMPLES)
+    if p95 is None:
+        return Config.LLM_HEDGE_MAX_DELAY
+    return min(max(p95, Config.LLM_HEDGE_MIN_DELAY), Config.LLM_HEDGE_MAX_DELAY)
+
+
+class CallStats:
+    """Counters of calls, retries, hedges, missed deadlines and fallbacks.
+
+    The sync and async LLM clients of a worker share one instance, so
+    /api/llm/stats covers traffic from both.
+    """
+
+    NAMES = ('calls', 'retries', 'hedged', 'hedge_wins', 'deadline_exceeded', 'fallbacks')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.NAMES, 0)
+
+    def count(self, name: str):
+        with self._lock:
+            self._counts[name] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies per key (e.g. model), for percentiles and hedge delays."""
+
+    def __init__(self, window: int = 500):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append((time.monotonic(), seconds))
+
+    def percentile(self, key: str, q: float, min_samples: int = 1,
+                   max_age: Optional[float] = None) -> Optional[float]:
+        """Return the q-quantile (0..1) of key's recent latencies, or None with too few samples.
+
+        With max_age, only samples recorded in the last max_age seconds count.
+        """
+        cutoff = time.monotonic() - max_age if max_age is not None else None
+        with self._lock:
+            samples = sorted(
+                seconds for at, seconds in self._samples.get(key, ()) if cutoff is None or at >= cutoff
+            )
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Return p50/p90/p95/p99 in milliseconds and the sample count for every key."""
+        with self._lock:
+            keys = list(self._samples)
+        snapshot = {}
+        for key in keys:
+            with self._lock:
+                samples = sorted(seconds for _, seconds in self._samples[key])
+            pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 1)
+            snapshot[key] = {
+                'count': len(samples),
+                'p50_ms': pick(0.50),
+                'p90_ms': pick(0.90),
+                'p95_ms': pick(0.95),
+                'p99_ms': pick(0.99),
+            }
+        return snapshot
+
+
+class CircuitBreaker:
+    """Fails calls fast while the provider is degraded.
+
+    After failure_threshold consecutive failures the circuit opens and every
+    call is rejected for reset_timeout seconds. Then a single trial call is let
+    through (half-open): success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self._stats = {'rejected': 0, 'opened': 0}
+
+    def before_call(self):
+        """Raise LLMUnavailableError if the call should not be attempted right now."""
+        with self._lock:
+            if self.state == 'open':
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    self._stats['rejected'] += 1
+                    raise LLMUnavailableError("LLM provider is unavailable", retry_after=remaining)
+                self.state = 'half_open'
+            if self.state == 'half_open':
+                if self._trial_in_flight:
+                    self._stats['rejected'] += 1
+                    raise LLMUnavailableError("LLM provider is recovering", retry_after=1.0)
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half_open' or self._failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self._stats['opened'] += 1
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Forget an abandoned half-open trial call without counting it either way."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'state': self.state, 'consecutive_failures': self._failures, **self._stats}
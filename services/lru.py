@@ -0,0 +1,65 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with an optional per-entry TTL and total size budget."""
+
+    def __init__(self, max_entries: int, ttl: Optional[float] = None, max_bytes: Optional[int] = None,
+                 size_of: Callable[[Any], int] = len):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self.total_bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store a value, evicting the least recently used entries when full."""
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        size = self.size_of(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (value, expires_at)
+            self.total_bytes += size
+            while len(self._data) > self.max_entries or (
+                    self.max_bytes is not None and self.total_bytes > self.max_bytes):
+                self._remove(next(iter(self._data)))
+
+    def delete(self, key: str):
+        """Remove a key if present."""
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            self._data.clear()
+            self.total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _remove(self, key: str):
+        entry = self._data.pop(key, None)
+        if entry is not None and self.max_bytes is not None:
+            self.total_bytes -= self.size_of(entry[0])
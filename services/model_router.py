@@ -0,0 +1,187 @@
+import time
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import Config
+from services.llm_resilience import CallStats, CircuitBreaker, LatencyTracker, LLMUnavailableError
+from services.structured_output import ParsedCards, parse_stats
+from services.token_budget import ContextOverflowError, TokenUsage, fit_completion
+
+
+class ModelRouter:
+    """Picks the models for each LLM call from a per-operation routing table.
+
+    routes maps an operation ('generate', 'improve', 'translate') to
+    {'timeout': s, 'slow_after': s, 'routes': [[max input tokens or None, [models...]], ...]}.
+    The first row whose limit fits the prompt gives the models in preference
+    order. Models that are currently unhealthy (circuit open, recent p95 above
+    slow_after, or too many unparseable replies) move to the back of the list,
+    so callers fall back to them only when everything else failed too. Health
+    is judged on the last health_window seconds, so a demoted model is tried
+    first again once its bad samples age out.
+    """
+
+    def __init__(self, routes: Dict[str, Dict], breaker_failures: int = 5, breaker_reset: float = 30.0,
+                 health_window: float = 300.0, min_samples: int = 5, max_parse_failure_rate: float = 0.5):
+        if 'generate' not in routes:
+            raise ValueError("The model routing table needs a 'generate' entry")
+        self.routes = routes
+        self.health_window = health_window
+        self.min_samples = min_samples
+        self.max_parse_failure_rate = max_parse_failure_rate
+        self.latency = LatencyTracker()
+        self._breaker_failures = breaker_failures
+        self._breaker_reset = breaker_reset
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._parses: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self._stats = {'routed': 0, 'demoted': 0}
+
+    def primary(self, operation: str) -> str:
+        """Return the model an operation normally runs on (first model of its first row)."""
+        return self._route(operation)['routes'][0][1][0]
+
+    def timeout(self, operation: str) -> float:
+        """Return how long one model may take on this operation before the next one is tried."""
+        return float(self._route(operation)['timeout'])
+
+    def models(self, operation: Optional[str] = None) -> List[str]:
+        """Return every model an operation may be routed to, or every model in the table."""
+        routes = [self._route(operation)] if operation else self.routes.values()
+        names = [model for route in routes for _, models in route['routes'] for model in models]
+        return list(dict.fromkeys(names))
+
+    def candidates(self, operation: str, input_tokens: int) -> List[str]:
+        """Return the models to try for a prompt of input_tokens, healthy ones first."""
+        route = self._route(operation)
+        rows = route['routes']
+        models = next((models for limit, models in rows if limit is None or input_tokens <= limit), rows[-1][1])
+        healthy = [model for model in models if self.is_healthy(model, route['slow_after'])]
+        with self._lock:
+            self._stats['routed'] += 1
+            if healthy[:1] != models[:1]:
+                self._stats['demoted'] += 1
+        return healthy + [model for model in models if model not in healthy]
+
+    def is_healthy(self, model: str, slow_after: float) -> bool:
+        if self.breaker(model).state == 'open':
+            return False
+        p95 = self.latency.percentile(model, 0.95, min_samples=self.min_samples, max_age=self.health_window)
+        if p95 is not None and p95 > slow_after:
+            return False
+        failure_rate = self._parse_failure_rate(model)
+        return failure_rate is None or failure_rate <= self.max_parse_failure_rate
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        """Return the model's own circuit breaker, so one failing model does not block the others."""
+        with self._lock:
+            breaker = self._breakers.get(model)
+            if breaker is None:
+                breaker = self._breakers[model] = CircuitBreaker(self._breaker_failures, self._breaker_reset)
+            return breaker
+
+    def record_parse(self, model: str, ok: bool):
+        """Record whether a reply from model could be parsed into the expected output."""
+        with self._lock:
+            parses = self._parses.get(model)
+            if parses is None:
+                parses = self._parses[model] = deque(maxlen=200)
+            parses.append((time.monotonic(), ok))
+
+    def stats(self) -> Dict:
+        """Return routing counters plus latency, parse failures and circuit state per model."""
+        with self._lock:
+            stats = dict(self._stats)
+        latency = self.latency.snapshot()
+        stats['models'] = {}
+        for model in self.models():
+            failure_rate = self._parse_failure_rate(model, min_samples=1)
+            stats['models'][model] = {
+                'latency': latency.get(model),
+                'parse_failure_rate': None if failure_rate is None else round(failure_rate, 3),
+                'circuit': self.breaker(model).stats(),
+            }
+        return stats
+
+    def _route(self, operation: str) -> Dict:
+        return self.routes.get(operation) or self.routes['generate']
+
+    def _parse_failure_rate(self, model: str, min_samples: Optional[int] = None) -> Optional[float]:
+        cutoff = time.monotonic() - self.health_window
+        with self._lock:
+            recent = [ok for at, ok in self._parses.get(model, ()) if at >= cutoff]
+        if len(recent) < (self.min_samples if min_samples is None else min_samples):
+            return None
+        return recent.count(False) / len(recent)
+
+
+class ModelFallback:
+    """The fallback policy of one LLM call, shared by the sync and async clients.
+
+    Iterating yields (model, completion budget, model deadline) for every
+    routed model the prompt fits, until the call's deadline passes; the client
+    calls the model and reports back with failed() or accept(). With parse, a
+    reply that parses to something falsy also falls through to the next model,
+    and the last such result is what outcome() returns if no model did better.
+    """
+
+    def __init__(self, router: ModelRouter, operation: str, input_tokens: int, max_tokens: int,
+                 call_stats: CallStats, token_usage: TokenUsage, parse: Optional[Callable[[str], object]] = None):
+        self.router = router
+        self.operation = operation
+        self.input_tokens = input_tokens
+        self.max_tokens = max_tokens
+        self.call_stats = call_stats
+        self.token_usage = token_usage
+        self.parse = parse
+        self.deadline = time.monotonic() + Config.LLM_CALL_TIMEOUT
+        self.error: Optional[Exception] = None
+        self.answered = False
+        self.result = None
+
+    def __iter__(self) -> Iterator[Tuple[str, int, float]]:
+        for model in self.router.candidates(self.operation, self.input_tokens):
+            if time.monotonic() >= self.deadline:
+                return
+            budget = fit_completion(model, self.input_tokens, self.max_tokens)
+            if budget is None:
+                self.token_usage.count('context_skips')
+                continue
+            if budget < self.max_tokens:
+                self.token_usage.count('clamped')
+            if self.error or self.answered:
+                self.call_stats.count('fallbacks')
+            # One model gets the operation's timeout, within what is left of the call's deadline
+            yield model, budget, min(self.deadline, time.monotonic() + self.router.timeout(self.operation))
+
+    def failed(self, error: LLMUnavailableError):
+        """Record that a model could not be reached; the next one is tried."""
+        self.error = error
+
+    def accept(self, model: str, text: Optional[str]) -> bool:
+        """Record a model's reply and return whether it is good enough to stop at."""
+        self.answered = True
+        if self.parse is None:
+            self.result = text
+            return True
+        self.result = self.parse(text or '')
+        if isinstance(self.result, ParsedCards):
+            parse_stats.record(self.operation, self.result)
+        self.router.record_parse(model, bool(self.result))
+        return bool(self.result)
+
+    def outcome(self):
+        """Return the accepted result, or raise failure() if no model answered."""
+        if self.answered:
+            return self.result
+        raise self.failure()
+
+    def failure(self) -> Exception:
+        """Return the error to raise when no model answered: the last model's, a missed deadline or an overflow."""
+        if self.error or time.monotonic() >= self.deadline:
+            return self.error or LLMUnavailableError("LLM call deadline exceeded", retry_after=1.0)
+        return ContextOverflowError(
+            f"Prompt of about {self.input_tokens} tokens does not fit any model for {self.operation}; "
+            "shorten the input"
+        )
@@ -0,0 +1,144 @@
+from typing import Dict, List, Tuple
+
+from fpdf import FPDF
+
+# (background, border, question, answer) colors per card style
+PDF_STYLES = {
+    'Modern': ((245, 245, 245), (33, 150, 243), (33, 150, 243), (85, 85, 85)),
+    'Minimalist': ((255, 255, 255), (200, 200, 200), (0, 0, 0), (85, 85, 85)),
+    'Colorful': ((240, 248, 255), (33, 150, 243), (156, 39, 176), (0, 150, 136)),
+    'Classic': ((250, 250, 250), (180, 180, 180), (33, 33, 33), (85, 85, 85)),
+}
+
+TITLE_COLOR = (33, 150, 243)  # Primary blue color
+
+# Bump whenever the layout changes so cached exports are not served stale
+RENDERER_VERSION = 1
+
+
+class _ChunkBuffer:
+    """Stand-in for FPDF's output string that appends in O(1).
+
+    FPDF 1.7 grows its document with ``self.buffer += ...``, which is quadratic
+    for large decks. It only ever appends to the buffer and takes its length
+    for the xref offsets, so a list of chunks with a running length suffices.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self._length = 0
+
+    def __iadd__(self, text: str):
+        self.chunks.append(text)
+        self._length += len(text)
+        return self
+
+    def __len__(self) -> int:
+        return self._length
+
+
+class _FPDF(FPDF):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only FPDF 1.7 keeps its output in a str attribute; any other version keeps its own buffer
+        if isinstance(getattr(self, 'buffer', None), str):
+            self.buffer = _ChunkBuffer()
+
+    def output_bytes(self) -> bytes:
+        """Close the document and return it."""
+        self.close()
+        if isinstance(self.buffer, _ChunkBuffer):
+            return ''.join(self.buffer.chunks).encode('latin-1')
+        output = self.output(dest='S')
+        return output.encode('latin-1') if isinstance(output, str) else bytes(output)
+
+
+class PdfRenderer:
+    """Renders a deck with FPDF, only emitting font and color changes when the state actually changes.
+
+    The whole document is built in memory and returned as one bytes object:
+    FPDF writes the page objects and the cross-reference table only when the
+    document is closed, so nothing can be sent before the last card is laid
+    out. Exports are served from the render cache instead of being streamed.
+    """
+
+    def __init__(self, customization: Dict):
+        font_family = customization.get('font', 'Arial')
+        self.font_family = font_family if font_family in ['Arial', 'Times'] else 'Arial'
+        self.font_size = int(customization.get('fontSize', 12))
+        self.bg_color, self.border_color, self.question_color, self.answer_color = PDF_STYLES.get(
+            customization.get('style', 'Classic'), PDF_STYLES['Classic']
+        )
+        self.pdf = _FPDF()
+        self._font_state = None
+        self._text_color = None
+        self._fill_color = None
+        self._draw_color = None
+
+    def render(self, flashcards: List[Dict]) -> bytes:
+        """Lay out every card and return the finished PDF."""
+        pdf = self.pdf
+        pdf.add_page()
+
+        self._set_font('B', self.font_size + 6)
+        self._set_text_color(TITLE_COLOR)
+        pdf.cell(0, 20, txt="My Flashcards", ln=1, align='C')
+        pdf.ln(10)
+
+        # Fill and border colors are the same for every card
+        self._set_fill_color(self.bg_color)
+        self._set_draw_color(self.border_color)
+
+        for i, card in enumerate(flashcards, 1):
+            pdf.rect(10, pdf.get_y(), 190, 0, 'S')
+            pdf.ln(5)
+
+            # Card number
+            self._set_font('B', self.font_size)
+            self._set_text_color(self.question_color)
+            pdf.cell(0, 10, txt=f"Card {i}", ln=1, align='L')
+
+            # Question
+            pdf.multi_cell(0, 10, txt="Question:", fill=True)
+            self._set_font('', self.font_size)
+            pdf.multi_cell(0, 10, txt=card['question'])
+            pdf.ln(5)
+
+            # Answer
+            self._set_font('B', self.font_size)
+            self._set_text_color(self.answer_color)
+            pdf.multi_cell(0, 10, txt="Answer:", fill=True)
+            self._set_font('', self.font_size)
+            pdf.multi_cell(0, 10, txt=card['answer'])
+            pdf.ln(10)
+
+        output = pdf.output_bytes()
+        # The page buffers are no longer needed once the document is serialized
+        pdf.pages = {}
+        return output
+
+    def _set_font(self, style: str, size: int):
+        state = (style, size)
+        if state != self._font_state:
+            self.pdf.set_font(self.font_family, style=style, size=size)
+            self._font_state = state
+
+    def _set_text_color(self, color: Tuple[int, int, int]):
+        if color != self._text_color:
+            self.pdf.set_text_color(*color)
+            self._text_color = color
+
+    def _set_fill_color(self, color: Tuple[int, int, int]):
+        if color != self._fill_color:
+            self.pdf.set_fill_color(*color)
+            self._fill_color = color
+
+    def _set_draw_color(self, color: Tuple[int, int, int]):
+        if color != self._draw_color:
+            self.pdf.set_draw_color(*color)
+            self._draw_color = color
+
+
+def render_pdf(flashcards: List[Dict], customization: Dict) -> bytes:
+    """Render a deck to PDF bytes, built in memory (see PdfRenderer)."""
+    return PdfRenderer(customization).render(flashcards)
@@ -0,0 +1,417 @@
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from services.cancellation import cancellable_sleep, check_cancelled
+from services.sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+# Scheduling lanes in priority order: interactive calls always go first, batch work gets the capacity they leave
+LANES = ('interactive', 'batch')
+
+_caller: contextvars.ContextVar = contextvars.ContextVar('llm_caller', default=(None, 'batch'))
+
+
+@contextmanager
+def llm_caller(owner: Optional[str], lane: str = 'batch'):
+    """Attribute the LLM calls made inside the block to owner and schedule them on lane.
+
+    Thread pools that run LLM work submit through contextvars.copy_context(),
+    so calls made on worker threads keep the caller of the request.
+    """
+    if lane not in LANES:
+        raise ValueError(f"Unknown scheduling lane: {lane}")
+    token = _caller.set((owner, lane))
+    try:
+        yield
+    finally:
+        _caller.reset(token)
+
+
+def current_caller() -> Tuple[Optional[str], str]:
+    """Return the (owner, lane) LLM calls are currently attributed to."""
+    return _caller.get()
+
+
+class RateLimitExceeded(Exception):
+    """Raised when an LLM call cannot be scheduled before its deadline."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QuotaExceeded(RateLimitExceeded):
+    """Raised when a user has spent their LLM token quota for the current window."""
+
+
+class Reservation:
+    """Capacity taken from the governor for one call, corrected once the real token usage is known."""
+
+    def __init__(self, governor: 'RateGovernor', tokens: int, owner: Optional[str] = None,
+                 period: Optional[int] = None):
+        self.governor = governor
+        self.tokens = tokens
+        self.owner = owner
+        self.period = period
+        self._settled = False
+
+    def settle(self, actual_tokens: Optional[int]):
+        """Give back (or take more of) the token budget the estimate got wrong."""
+        if self._settled or actual_tokens is None:
+            return
+        self._settled = True
+        if actual_tokens != self.tokens:
+            self.governor.adjust_tokens(self.tokens - actual_tokens, self.owner, self.period)
+
+
+class RateGovernor(SQLiteStore):
+    """Token-bucket scheduler for LLM calls shared by every gunicorn worker on the host.
+
+    One bucket meters requests per minute and one meters tokens per minute.
+    Callers queue on a lane (see llm_caller): the interactive lane is always
+    served first, and batch calls may not dip into the share of each bucket
+    kept back for it. Within a lane, users are served by weighted fair
+    queueing on tokens: each call is tagged with a virtual finish time that
+    advances with its owner's usage, and the earliest tag goes next. A user
+    with fifty uploads queued therefore waits behind another user's first
+    call, not the other way around, while a large prompt still cannot be
+    starved by a stream of small ones from the same user. Tokens granted are
+    accounted per user, and a user over their quota is refused outright. A
+    429 from the provider pauses everyone until its Retry-After has passed.
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS rate_buckets (
+        name TEXT PRIMARY KEY,
+        level REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS rate_queue (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        owner TEXT,
+        lane INTEGER NOT NULL,
+        start REAL NOT NULL,
+        finish REAL NOT NULL,
+        deadline REAL NOT NULL,
+        heartbeat REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_rate_queue_order ON rate_queue (lane, finish, id);
+    CREATE TABLE IF NOT EXISTS rate_flows (
+        owner TEXT NOT NULL,
+        lane INTEGER NOT NULL,
+        finish REAL NOT NULL,
+        PRIMARY KEY (owner, lane)
+    );
+    CREATE TABLE IF NOT EXISTS rate_usage (
+        owner TEXT NOT NULL,
+        period INTEGER NOT NULL,
+        tokens REAL NOT NULL,
+        PRIMARY KEY (owner, period)
+    );
+    CREATE TABLE IF NOT EXISTS rate_state (
+        name TEXT PRIMARY KEY,
+        value REAL NOT NULL
+    );
+    """
+
+    # How often a queued caller re-checks the buckets
+    POLL_INTERVAL = 0.05
+    # Waiters that stop polling (e.g. their worker was killed) are dropped after this long
+    STALE_AFTER = 10.0
+
+    def __init__(self, path: str, requests_per_minute: int, tokens_per_minute: int, burst_seconds: float = 10.0,
+                 interactive_reserve: float = 0.2, user_quota: int = 0, quota_window: float = 3600.0,
+                 user_quotas: Optional[Dict[str, int]] = None, user_weights: Optional[Dict[str, float]] = None):
+        super().__init__(path)
+        # name -> (refill per second, capacity); a small burst keeps throughput smooth instead of spiky
+        self.buckets = {
+            'requests': (requests_per_minute / 60.0, max(1.0, requests_per_minute * burst_seconds / 60.0)),
+            'tokens': (tokens_per_minute / 60.0, max(1.0, tokens_per_minute * burst_seconds / 60.0)),
+        }
+        self.interactive_reserve = interactive_reserve
+        self.user_quota = user_quota
+        self.quota_window = quota_window
+        self.user_quotas = user_quotas or {}
+        self.user_weights = user_weights or {}
+        self._stats_lock = threading.Lock()
+        self._stats = {'granted': 0, 'queued': 0, 'rejected': 0, 'quota_rejected': 0, 'provider_429s': 0}
+
+    def acquire(self, tokens: int, timeout: float) -> Reservation:
+        """Block until one request and tokens are available, in fair-queue order.
+
+        The call is charged to the caller set with llm_caller(). Raises
+        QuotaExceeded when that user has no quota left, and RateLimitExceeded
+        when the call could not be scheduled within timeout seconds, both with
+        a hint of how long the caller should back off. A caller whose work is
+        cancelled while queued gives up its place and raises Cancelled.
+        """
+        check_cancelled()
+        owner, lane = current_caller()
+        deadline = time.time() + timeout
+        waiter_id = self._enqueue(deadline, tokens, owner, lane)
+        granted = False
+        queued = False
+        try:
+            while True:
+                granted, wait = self._try_acquire(waiter_id, tokens)
+                if granted:
+                    return self._granted(tokens, queued, owner)
+                queued = True
+                # A cancelled caller leaves the queue at once instead of waiting for its turn
+                cancellable_sleep(self._next_poll(wait, deadline))
+        finally:
+            if not granted:
+                self._dequeue(waiter_id)
+
+    async def acquire_async(self, tokens: int, timeout: float) -> Reservation:
+        """acquire() for event-loop callers: queued calls sleep on the loop instead of holding a thread."""
+        owner, lane = current_caller()
+        deadline = time.time() + timeout
+        waiter_id = await asyncio.to_thread(self._enqueue, deadline, tokens, owner, lane)
+        granted = False
+        queued = False
+        try:
+            while True:
+                granted, wait = await asyncio.to_thread(self._try_acquire, waiter_id, tokens)
+                if granted:
+                    return self._granted(tokens, queued, owner)
+                queued = True
+                check_cancelled()
+                await asyncio.sleep(self._next_poll(wait, deadline))
+        finally:
+            if not granted:
+                await asyncio.to_thread(self._dequeue, waiter_id)
+
+    def adjust_tokens(self, delta: float, owner: Optional[str] = None, period: Optional[int] = None):
+        """Return (positive) or charge (negative) tokens after a call's real usage is known."""
+        now = time.time()
+        try:
+            with self.transaction() as conn:
+                level = self._levels(conn, now)['tokens']
+                self._store_level(conn, 'tokens', level + delta, now)
+                if owner is not None and period is not None:
+                    self._charge(conn, owner, period, -delta)
+        except Exception as e:
+            logger.error(f"Error adjusting token bucket: {e}")
+
+    def backoff(self, retry_after: float):
+        """Pause all callers after the provider answered 429, and drain the buckets.
+
+        Draining means traffic resumes at the steady refill rate instead of
+        bursting straight back into the limit.
+        """
+        self._count('provider_429s')
+        now = time.time()
+        with self.transaction() as conn:
+            self._set_state(conn, 'blocked_until', max(self._blocked_until(conn), now + retry_after))
+            for name, level in self._levels(conn, now).items():
+                self._store_level(conn, name, min(level, 0.0), now)
+
+    def quota(self, owner: str) -> int:
+        """Return the tokens owner may spend per quota window, 0 meaning unlimited."""
+        return int(self.user_quotas.get(owner, self.user_quota))
+
+    def usage(self, owner: str) -> Dict:
+        """Return the tokens owner has spent in the current quota window and what is left of their quota."""
+        now = time.time()
+        period = self._period(now)
+        used = self._used(self.connection(), owner, period)
+        quota = self.quota(owner)
+        return {
+            'tokens_used': round(used),
+            'quota': quota or None,
+            'remaining': max(0, round(quota - used)) if quota else None,
+            'resets_in': round((period + 1) * self.quota_window - now, 1),
+            'weight': self.user_weights.get(owner, 1.0)
+        }
+
+    def stats(self) -> Dict:
+        """Return scheduling counters for this process and the shared bucket and queue state."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        now = time.time()
+        conn = self.connection()
+        levels = self._levels(conn, now)
+        stats['requests_available'] = round(levels['requests'], 2)
+        stats['tokens_available'] = round(levels['tokens'], 2)
+        waiting = dict(conn.execute(
+            'SELECT lane, COUNT(*) FROM rate_queue WHERE heartbeat >= ? GROUP BY lane', (now - self.STALE_AFTER,)
+        ).fetchall())
+        stats['waiting'] = sum(waiting.values())
+        stats['waiting_by_lane'] = {name: waiting.get(index, 0) for index, name in enumerate(LANES)}
+        stats['blocked_for'] = round(max(0.0, self._blocked_until(conn) - now), 2)
+        return stats
+
+    def _enqueue(self, deadline: float, tokens: int, owner: Optional[str], lane: str) -> int:
+        """Check owner's quota and queue the call with its virtual start and finish tags."""
+        now = time.time()
+        lane_index = LANES.index(lane)
+        # Calls without an owner share one flow
+        flow = owner or ''
+        weight = self.user_weights.get(owner, 1.0) if owner else 1.0
+        with self.transaction() as conn:
+            if owner:
+                self._check_quota(conn, owner, tokens, now)
+            row = conn.execute(
+                'SELECT finish FROM rate_flows WHERE owner = ? AND lane = ?', (flow, lane_index)
+            ).fetchone()
+            # A flow that went idle restarts at the lane's clock, so it cannot bank credit while away
+            start = max(self._state(conn, f'virtual_time:{lane_index}'), row[0] if row else 0.0)
+            finish = start + max(1, tokens) / weight
+            conn.execute(
+                'INSERT OR REPLACE INTO rate_flows (owner, lane, finish) VALUES (?, ?, ?)', (flow, lane_index, finish)
+            )
+            return conn.execute(
+                'INSERT INTO rate_queue (owner, lane, start, finish, deadline, heartbeat) VALUES (?, ?, ?, ?, ?, ?)',
+                (owner, lane_index, start, finish, deadline, now)
+            ).lastrowid
+
+    def _dequeue(self, waiter_id: int):
+        with self.transaction() as conn:
+            self._remove_waiters(conn, 'id = ?', (waiter_id,))
+
+    def _remove_waiters(self, conn, where: str, params: tuple):
+        """Drop queued calls that were never granted, and give their owners back the virtual time they were tagged.
+
+        Otherwise a user whose calls keep timing out, being cancelled or losing
+        a hedge would be pushed back in line for capacity they never used.
+        """
+        rows = conn.execute(
+            f"SELECT id, COALESCE(owner, ''), lane, finish - start FROM rate_queue WHERE {where}", params
+        ).fetchall()
+        for waiter_id, flow, lane, cost in rows:
+            conn.execute('DELETE FROM rate_queue WHERE id = ?', (waiter_id,))
+            conn.execute(
+                'UPDATE rate_flows SET finish = finish - ? WHERE owner = ? AND lane = ?', (cost, flow, lane)
+            )
+            # The flow's later calls were tagged after this one, so they move up by its cost
+            conn.execute(
+                "UPDATE rate_queue SET start = start - ?, finish = finish - ? "
+                "WHERE COALESCE(owner, '') = ? AND lane = ? AND id > ?",
+                (cost, cost, flow, lane, waiter_id)
+            )
+
+    def _granted(self, tokens: int, queued: bool, owner: Optional[str]) -> Reservation:
+        self._count('granted')
+        if queued:
+            self._count('queued')
+        return Reservation(self, tokens, owner, self._period(time.time()) if owner else None)
+
+    def _check_quota(self, conn, owner: str, tokens: int, now: float):
+        quota = self.quota(owner)
+        if not quota:
+            return
+        period = self._period(now)
+        used = self._used(conn, owner, period)
+        # A single call bigger than the whole quota still gets through at the start of a window
+        if used > 0 and used + tokens > quota:
+            self._count('quota_rejected')
+            retry_after = (period + 1) * self.quota_window - now
+            raise QuotaExceeded(
+                f"LLM token quota of {quota} tokens used up; resets in {retry_after:.0f}s", retry_after=retry_after
+            )
+
+    def _period(self, now: float) -> int:
+        return int(now // self.quota_window)
+
+    def _used(self, conn, owner: str, period: int) -> float:
+        row = conn.execute('SELECT tokens FROM rate_usage WHERE owner = ? AND period = ?', (owner, period)).fetchone()
+        return row[0] if row else 0.0
+
+    def _charge(self, conn, owner: str, period: int, tokens: float):
+        conn.execute(
+            'INSERT INTO rate_usage (owner, period, tokens) VALUES (?, ?, ?) '
+            'ON CONFLICT (owner, period) DO UPDATE SET tokens = tokens + excluded.tokens',
+            (owner, period, tokens)
+        )
+
+    def _next_poll(self, wait: float, deadline: float) -> float:
+        """Return how long to sleep before polling again, or raise if the deadline cannot be met."""
+        if time.time() + wait > deadline:
+            self._count('rejected')
+            raise RateLimitExceeded(f"LLM rate limit reached; retry in {wait:.1f}s", retry_after=max(1.0, wait))
+        # Heads sleep until capacity should be back; everyone else keeps polling their place
+        return min(max(wait, self.POLL_INTERVAL), 1.0)
+
+    def _try_acquire(self, waiter_id: int, tokens: int) -> Tuple[bool, float]:
+        """Take capacity if this waiter is next in line and the buckets allow it, else return how long to wait."""
+        now = time.time()
+        with self.transaction() as conn:
+            # Our own deadline is enforced by the caller, so a zero-timeout try still gets one look
+            self._remove_waiters(
+                conn, 'id != ? AND (deadline < ? OR heartbeat < ?)', (waiter_id, now, now - self.STALE_AFTER)
+            )
+            row = conn.execute('SELECT lane, start, owner FROM rate_queue WHERE id = ?', (waiter_id,)).fetchone()
+            head = conn.execute('SELECT id FROM rate_queue ORDER BY lane, finish, id LIMIT 1').fetchone()
+            if row is None or head is None:
+                # Another waiter purged us because our deadline passed (or we stopped polling)
+                self._count('rejected')
+                raise RateLimitExceeded("LLM call expired while queued", retry_after=1.0)
+            lane, start, owner = row
+            conn.execute('UPDATE rate_queue SET heartbeat = ? WHERE id = ?', (now, waiter_id))
+
+            levels = self._levels(conn, now)
+            costs = {'requests': 1, 'tokens': tokens}
+            # Batch calls leave a share of every bucket for interactive ones that may arrive meanwhile
+            reserve = self.interactive_reserve if lane > 0 else 0.0
+            wait = max(0.0, self._blocked_until(conn) - now)
+            for name, (rate, capacity) in self.buckets.items():
+                # A call bigger than the bucket waits for a full bucket and leaves it in debt
+                needed = min(costs[name] + reserve * capacity, capacity)
+                if levels[name] < needed:
+                    wait = max(wait, (needed - levels[name]) / rate)
+
+            if head[0] != waiter_id:
+                return False, max(wait, self.POLL_INTERVAL)
+            if wait > 0:
+                return False, wait
+
+            for name, level in levels.items():
+                self._store_level(conn, name, level - costs[name], now)
+            conn.execute('DELETE FROM rate_queue WHERE id = ?', (waiter_id,))
+            virtual_time = f'virtual_time:{lane}'
+            self._set_state(conn, virtual_time, max(self._state(conn, virtual_time), start))
+            if owner:
+                self._charge(conn, owner, self._period(now), tokens)
+            return True, 0.0
+
+    def _levels(self, conn, now: float) -> Dict[str, float]:
+        """Return every bucket's level refilled up to now."""
+        stored = {
+            name: (level, updated_at)
+            for name, level, updated_at in conn.execute('SELECT name, level, updated_at FROM rate_buckets')
+        }
+        levels = {}
+        for name, (rate, capacity) in self.buckets.items():
+            if name not in stored:
+                levels[name] = capacity
+                continue
+            level, updated_at = stored[name]
+            levels[name] = min(capacity, level + max(0.0, now - updated_at) * rate)
+        return levels
+
+    def _store_level(self, conn, name: str, level: float, now: float):
+        conn.execute(
+            'INSERT OR REPLACE INTO rate_buckets (name, level, updated_at) VALUES (?, ?, ?)',
+            (name, min(level, self.buckets[name][1]), now)
+        )
+
+    def _blocked_until(self, conn) -> float:
+        return self._state(conn, 'blocked_until')
+
+    def _state(self, conn, name: str) -> float:
+        row = conn.execute('SELECT value FROM rate_state WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else 0.0
+
+    def _set_state(self, conn, name: str, value: float):
+        conn.execute('INSERT OR REPLACE INTO rate_state (name, value) VALUES (?, ?)', (name, value))
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
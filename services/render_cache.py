@@ -0,0 +1,60 @@
+import json
+import hashlib
+import threading
+from typing import Callable, Dict, Optional
+
+from services.lru import LRUCache
+
+
+class RenderCache:
+    """In-memory cache of rendered export files, bounded by total bytes with LRU eviction."""
+
+    def __init__(self, max_bytes: int = 128 * 1024 * 1024, max_entries: int = 1024):
+        self._cache = LRUCache(max_entries, max_bytes=max_bytes)
+        self.max_bytes = max_bytes
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+
+    @staticmethod
+    def make_key(flashcards, customization: Dict, export_format: str, renderer_version: int,
+                 options: Optional[Dict] = None) -> str:
+        """Hash a canonical encoding of everything that shapes the rendered file.
+
+        The key doubles as the response's ETag, so it must not depend on dict
+        ordering or whitespace in the request body.
+        """
+        payload = json.dumps(
+            [export_format, renderer_version, flashcards, customization or {}, options or {}],
+            sort_keys=True, separators=(',', ':'), ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_or_render(self, key: str, render: Callable[[], bytes]) -> bytes:
+        """Return the cached file for key, rendering and storing it on a miss."""
+        data = self._cache.get(key)
+        if data is not None:
+            self._count('hits')
+            return data
+        self._count('misses')
+        data = render()
+        self._cache.set(key, data)
+        return data
+
+    def record_not_modified(self):
+        """Count a conditional request answered with 304 without touching the cache."""
+        self._count('not_modified')
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters for this process and the cache's current footprint."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['entries'] = len(self._cache)
+        stats['bytes'] = self._cache.total_bytes
+        stats['max_bytes'] = self.max_bytes
+        return stats
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
@@ -0,0 +1,64 @@
+import json
+import time
+import hashlib
+import logging
+from typing import Dict, List, Optional
+
+from services.sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint_section(title: str, text: str) -> str:
+    """Fingerprint a document section, ignoring whitespace-only edits."""
+    normalized = ' '.join(title.split()) + '\n' + ' '.join(text.split())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class SectionStore(SQLiteStore):
+    """Remembers which cards were generated from which section of a user's document."""
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS document_sections (
+        doc_key TEXT PRIMARY KEY,
+        sections TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_document_sections_updated_at ON document_sections (updated_at);
+    """
+
+    def __init__(self, path: str, ttl: float = 90 * 24 * 3600):
+        super().__init__(path)
+        self.ttl = ttl
+
+    @staticmethod
+    def make_key(owner: Optional[str], filename: str) -> str:
+        """Identify a document by who uploaded it and under which name."""
+        payload = f'{owner or ""}\n{filename.lower()}'
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, doc_key: str) -> Dict[str, List[Dict]]:
+        """Return the previous upload's cards keyed by section fingerprint."""
+        try:
+            row = self.connection().execute(
+                'SELECT sections, updated_at FROM document_sections WHERE doc_key = ?', (doc_key,)
+            ).fetchone()
+        except Exception as e:
+            logger.error(f"Error reading section store: {e}")
+            return {}
+        if row is None or row[1] <= time.time() - self.ttl:
+            return {}
+        return json.loads(row[0])
+
+    def set(self, doc_key: str, sections: Dict[str, List[Dict]]):
+        """Replace the stored cards for a document with the latest upload's."""
+        now = time.time()
+        try:
+            with self.transaction() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO document_sections (doc_key, sections, updated_at) VALUES (?, ?, ?)',
+                    (doc_key, json.dumps(sections, ensure_ascii=False), now)
+                )
+                conn.execute('DELETE FROM document_sections WHERE updated_at <= ?', (now - self.ttl,))
+        except Exception as e:
+            logger.error(f"Error writing section store: {e}")
@@ -0,0 +1,156 @@
+import copy
+import json
+import asyncio
+import hashlib
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.cancellation import POLL_INTERVAL, CancelToken, Cancelled, cancellation, current_token
+
+
+class _Flight:
+    """One in-progress call and everyone waiting for it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        # Cancel tokens of the callers still interested in the result (None for a caller that cannot be cancelled)
+        self.participants: List[Optional[CancelToken]] = []
+        # The call itself is cancelled only once every caller has gone
+        self.token = CancelToken(poll=self.abandoned, poll_interval=0)
+        self.task: Optional[asyncio.Task] = None
+
+    def abandoned(self) -> bool:
+        return all(token is not None and token.cancelled for token in list(self.participants))
+
+    def outcome(self):
+        if self.error is not None:
+            raise self.error
+        # Each caller gets its own copy, so one request mutating its result cannot leak into another's
+        return copy.deepcopy(self.result)
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls within a worker: one caller runs, the rest share its result.
+
+    Threads and event-loop tasks share one registry, so a request served by
+    the ASGI handlers can wait on a generation started by a Flask thread and
+    vice versa. Errors are shared too; nothing is cached once the call ends.
+    A caller whose work is cancelled stops waiting, but the call keeps running
+    for the others and is only cancelled once nobody is left waiting for it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def make_key(operation: str, *inputs, **params) -> str:
+        """Hash a canonical encoding of the operation, its inputs and its parameters."""
+        payload = json.dumps(
+            [operation, inputs, params], sort_keys=True, separators=(',', ':'), ensure_ascii=False
+        )
+        return f"{operation}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    def do(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Return fn(*args, **kwargs), or the result of an identical call already in flight."""
+        token = current_token()
+        with self._lock:
+            flight, leader = self._join_locked(key, token)
+        if not leader:
+            while not flight.done.wait(POLL_INTERVAL):
+                if token is not None and token.cancelled:
+                    self._leave(flight, token)
+                    raise Cancelled(token.reason)
+            try:
+                return flight.outcome()
+            except Cancelled:
+                if token is not None and token.cancelled:
+                    raise
+                # Everyone else gave up on the call just as we joined it, so run it again
+                return self.do(key, fn, *args, **kwargs)
+
+        try:
+            with cancellation(flight.token):
+                result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._land(key, flight, None, e)
+            raise
+        self._land(key, flight, result, None)
+        return result
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """do() for event-loop callers: the call runs as its own task, so cancelling one caller does not stop it."""
+        token = current_token()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            flight, leader = self._join_locked(key, token)
+            flight.waiters.append((loop, future))
+            if leader:
+                flight.task = loop.create_task(self._lead(key, flight, fn))
+        try:
+            await future
+        except asyncio.CancelledError:
+            self._leave(flight, token)
+            raise
+        try:
+            return flight.outcome()
+        except (Cancelled, asyncio.CancelledError):
+            if leader or (token is not None and token.cancelled):
+                raise
+            # Everyone else gave up on the call just as we joined it, so run it again
+            return await self.do_async(key, fn)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return calls made and calls saved per operation."""
+        with self._lock:
+            return {operation: dict(counts) for operation, counts in self._stats.items()}
+
+    async def _lead(self, key: str, flight: _Flight, fn: Callable[[], Awaitable[Any]]):
+        try:
+            with cancellation(flight.token):
+                result = await fn()
+        except BaseException as e:
+            # Delivered to the callers through the flight, so the task itself ends quietly
+            self._land(key, flight, None, e)
+            return
+        self._land(key, flight, result, None)
+
+    def _join_locked(self, key: str, token: Optional[CancelToken]) -> Tuple[_Flight, bool]:
+        counts = self._stats.setdefault(key.split(':', 1)[0], {'calls': 0, 'saved': 0})
+        flight = self._flights.get(key)
+        leader = flight is None
+        if leader:
+            counts['calls'] += 1
+            flight = self._flights[key] = _Flight()
+        else:
+            counts['saved'] += 1
+        flight.participants.append(token)
+        return flight, leader
+
+    def _leave(self, flight: _Flight, token: Optional[CancelToken]):
+        """Drop a caller that stopped waiting, and cancel an async call nobody is waiting for any more."""
+        with self._lock:
+            if token in flight.participants:
+                flight.participants.remove(token)
+            abandoned = not flight.done.is_set() and flight.abandoned()
+        if abandoned and flight.task is not None:
+            flight.task.get_loop().call_soon_threadsafe(flight.task.cancel)
+
+    def _land(self, key: str, flight: _Flight, result: Any, error: Optional[BaseException]):
+        with self._lock:
+            del self._flights[key]
+            waiters = list(flight.waiters)
+        flight.result, flight.error = result, error
+        flight.done.set()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
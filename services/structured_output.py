@@ -0,0 +1,188 @@
+import re
+import json
+import threading
+from typing import Dict, Iterable, List, Optional
+
+# Example shapes quoted in prompts
+CARD_JSON = '{"question": "...", "answer": "..."}'
+CARD_LIST_JSON = f'[{CARD_JSON}, ...]'
+INDEXED_CARD_LIST_JSON = '[{"index": 1, "question": "...", "answer": "..."}, ...]'
+
+# Only these characters change the scanner's state
+_SPECIAL_RE = re.compile(r'[{}"\\]')
+
+
+class ParsedCards(list):
+    """Flashcards parsed from one reply.
+
+    status is 'ok' when the whole reply was valid JSON of the expected shape,
+    'salvaged' when cards were recovered from a truncated or partly invalid
+    reply, and 'failed' when nothing usable was found.
+    """
+
+    def __init__(self, cards: Iterable[Dict] = (), status: str = 'ok'):
+        super().__init__(cards)
+        self.status = status
+
+
+class JSONObjectScanner:
+    """Incrementally pull complete JSON objects out of text that may be cut off or wrapped in prose.
+
+    Each balanced {...} is decoded as soon as its closing brace arrives, nested
+    ones first, so the cards of a truncated array are still recovered.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._pos = 0
+        self._starts: List[int] = []
+        self._in_string = False
+
+    def feed(self, text: str) -> List[object]:
+        """Consume more text and return every object completed by it."""
+        buffer = self._buffer = self._buffer + text
+        pos = self._pos
+        found = []
+        while True:
+            match = _SPECIAL_RE.search(buffer, pos)
+            if not match:
+                pos = len(buffer)
+                break
+            char, index = match.group(), match.start()
+            if char == '\\':
+                if index + 1 >= len(buffer):
+                    # Wait for the escaped character
+                    pos = index
+                    break
+                pos = index + 2
+                continue
+            pos = index + 1
+            if char == '"':
+                self._in_string = not self._in_string
+            elif self._in_string:
+                continue
+            elif char == '{':
+                self._starts.append(index)
+            elif self._starts:
+                start = self._starts.pop()
+                try:
+                    found.append(json.loads(buffer[start:index + 1]))
+                except ValueError:
+                    pass
+
+        if self._starts:
+            self._pos = pos
+        else:
+            # Nothing open, so nothing before pos can be part of a later object
+            self._buffer, self._pos = buffer[pos:], 0
+        return found
+
+
+def clean_card(value: object, indexed: bool = False) -> Optional[Dict]:
+    """Return value as a flashcard if it matches the schema, else None.
+
+    A card is an object with non-empty string "question" and "answer" (and an
+    integer "index" for numbered batches); other keys are dropped.
+    """
+    if not isinstance(value, dict):
+        return None
+    question, answer = value.get('question'), value.get('answer')
+    if not isinstance(question, str) or not isinstance(answer, str) or not question.strip() or not answer.strip():
+        return None
+    card = {'question': question.strip(), 'answer': answer.strip()}
+    if indexed:
+        index = value.get('index')
+        if isinstance(index, bool) or not isinstance(index, int):
+            return None
+        card['index'] = index
+    return card
+
+
+def parse_cards(completion: str, indexed: bool = False) -> ParsedCards:
+    """Parse a JSON array of flashcards (or {"flashcards": [...]}), salvaging what it can."""
+    document = _decode_document(completion)
+    if isinstance(document, dict) and isinstance(document.get('flashcards'), list):
+        document = document['flashcards']
+    if isinstance(document, list):
+        cards = [clean_card(item, indexed) for item in document]
+        valid = [card for card in cards if card]
+        if valid:
+            return ParsedCards(valid, 'ok' if len(valid) == len(cards) else 'salvaged')
+
+    valid = [card for card in map(lambda item: clean_card(item, indexed), _scan(completion)) if card]
+    return ParsedCards(valid, 'salvaged' if valid else 'failed')
+
+
+def parse_card(completion: str) -> ParsedCards:
+    """Parse a reply holding one flashcard object; the result holds at most one card."""
+    document = _decode_document(completion)
+    card = clean_card(document)
+    if card:
+        return ParsedCards([card])
+    cards = [card for card in map(clean_card, _scan(completion)) if card]
+    return ParsedCards(cards[:1], 'salvaged' if cards else 'failed')
+
+
+def parse_indexed_cards(completion: str) -> ParsedCards:
+    """Parse a numbered batch reply; every card carries the "index" it was sent with."""
+    return parse_cards(completion, indexed=True)
+
+
+def card_list_prompt(exclude: Iterable[str] = ()) -> str:
+    """Output instructions for generating a list of cards, skipping questions already asked."""
+    instructions = f"Respond with only a JSON array, one object per flashcard, exactly like this:\n{CARD_LIST_JSON}"
+    exclude = list(exclude)
+    if exclude:
+        instructions += "\nDo not repeat any of these questions:\n" + '\n'.join(f"- {question}" for question in exclude)
+    return instructions
+
+
+class ParseStats:
+    """Counts parse outcomes per operation, to show how often replies are salvaged or wasted."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def record(self, operation: str, result: ParsedCards):
+        self._add(operation, 'replies')
+        self._add(operation, result.status)
+        self._add(operation, 'cards', len(result))
+
+    def count(self, operation: str, name: str, amount: int = 1):
+        self._add(operation, name, amount)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Return the counters with failure and salvage rates for every operation."""
+        with self._lock:
+            stats = {operation: dict(counts) for operation, counts in self._stats.items()}
+        for counts in stats.values():
+            replies = counts.get('replies', 0)
+            counts['failure_rate'] = round(counts.get('failed', 0) / replies, 3) if replies else None
+            counts['salvage_rate'] = round(counts.get('salvaged', 0) / replies, 3) if replies else None
+        return stats
+
+    def _add(self, operation: str, name: str, amount: int = 1):
+        with self._lock:
+            counts = self._stats.setdefault(operation, {'replies': 0, 'ok': 0, 'salvaged': 0, 'failed': 0})
+            counts[name] = counts.get(name, 0) + amount
+
+
+# Shared by the sync and async services
+parse_stats = ParseStats()
+
+
+def _decode_document(completion: str) -> object:
+    """Decode the JSON value in a reply, ignoring code fences or prose around it; None if it is not valid."""
+    starts = [index for index in (completion.find('['), completion.find('{')) if index >= 0]
+    end = max(completion.rfind(']'), completion.rfind('}'))
+    if not starts or end < min(starts):
+        return None
+    try:
+        return json.loads(completion[min(starts):end + 1])
+    except ValueError:
+        return None
+
+
+def _scan(completion: str) -> List[object]:
+    return JSONObjectScanner().feed(completion)
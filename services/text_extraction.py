@@ -0,0 +1,271 @@
+import os
+import csv
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import PyPDF2
+from docx import Document
+from pptx import Presentation
+
+from config import Config
+from services.cancellation import check_cancelled
+
+logger = logging.getLogger(__name__)
+
+SPOOL_BLOCK_SIZE = 64 * 1024
+
+# Bump whenever extraction output changes so cached text is not reused
+EXTRACTOR_VERSION = 1
+
+SUPPORTED_EXTENSIONS = ('.txt', '.md', '.pdf', '.docx', '.pptx', '.csv')
+# Formats whose structure is kept so re-uploads can be regenerated section by section
+SECTIONED_EXTENSIONS = ('.docx', '.pptx')
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+
+class SpooledUpload:
+    """An uploaded file copied to disk in fixed-size blocks, hashed on the way through.
+
+    The spool file is deleted on close, so use it as a context manager.
+    """
+
+    def __init__(self, file, spool_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.filename = file.filename
+        self.size = 0
+        digest = hashlib.sha256()
+        fd, self.path = tempfile.mkstemp(prefix='upload-', suffix=os.path.splitext(file.filename)[1], dir=spool_dir)
+        try:
+            with os.fdopen(fd, 'wb') as spool:
+                while True:
+                    block = file.stream.read(SPOOL_BLOCK_SIZE)
+                    if not block:
+                        break
+                    self.size += len(block)
+                    if max_bytes is not None and self.size > max_bytes:
+                        raise ValueError(f'File exceeds the {max_bytes // (1024 * 1024)}MB upload limit')
+                    digest.update(block)
+                    spool.write(block)
+        except BaseException:
+            self.close()
+            raise
+        self.sha256 = digest.hexdigest()
+
+    def close(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def iter_text(path: str, filename: str) -> Iterator[str]:
+    """Yield the text of a document one page, slide, paragraph or row at a time."""
+    filename = filename.lower()
+    if filename.endswith('.txt') or filename.endswith('.md'):
+        return _iter_plain_text(path)
+    elif filename.endswith('.pdf'):
+        return _iter_pdf(path)
+    elif filename.endswith('.docx'):
+        return _iter_docx(path)
+    elif filename.endswith('.pptx'):
+        return _iter_pptx(path)
+    elif filename.endswith('.csv'):
+        return _iter_csv(path)
+    raise ValueError('Unsupported file format')
+
+
+def extract_text(path: str, filename: str, max_chars: int) -> Tuple[str, Dict]:
+    """Collect a document's text, stopping once max_chars have been gathered.
+
+    Returns the text and a small report of what the extraction cost.
+    """
+    started = time.time()
+    rss_before = _current_rss_kb()
+    parts = []
+    total = 0
+    truncated = False
+
+    for part in iter_text(path, filename):
+        # Between pages, so a cancelled upload stops extracting (and drops its queued PDF ranges) promptly
+        check_cancelled()
+        if total + len(part) > max_chars:
+            parts.append(part[:max_chars - total])
+            truncated = True
+            break
+        parts.append(part)
+        total += len(part) + 1
+
+    text = '\n'.join(parts)
+    rss_after = _current_rss_kb()
+    stats = {
+        'filename': filename,
+        'spooled_bytes': os.path.getsize(path),
+        'extracted_chars': len(text),
+        'truncated': truncated,
+        'seconds': round(time.time() - started, 3),
+        # How much this worker's resident memory grew while extracting, in KB (None without /proc). Other
+        # requests on the worker count too, and pages extracted in the PDF process pool do not.
+        'rss_growth_kb': rss_after - rss_before if rss_before is not None and rss_after is not None else None
+    }
+    logger.info(f"Extracted text: {stats}")
+    return text, stats
+
+
+def _current_rss_kb() -> Optional[int]:
+    """Return this process's resident memory right now, in KB, where /proc provides it."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def iter_sections(path: str, filename: str) -> Iterator[Tuple[str, str]]:
+    """Yield (title, text) for each DOCX heading section or PPTX slide."""
+    filename = filename.lower()
+    if filename.endswith('.docx'):
+        return _iter_docx_sections(path)
+    elif filename.endswith('.pptx'):
+        return _iter_pptx_sections(path)
+    raise ValueError('Unsupported file format')
+
+
+def extract_sections(path: str, filename: str, max_chars: int) -> List[Tuple[str, str]]:
+    """Collect a document's sections, stopping once max_chars have been gathered."""
+    sections = []
+    total = 0
+    for title, text in iter_sections(path, filename):
+        check_cancelled()
+        if total + len(text) > max_chars:
+            sections.append((title, text[:max_chars - total]))
+            break
+        sections.append((title, text))
+        total += len(text) + 1
+    logger.info(f"Extracted {len(sections)} sections from {filename}")
+    return sections
+
+
+def _iter_plain_text(path: str) -> Iterator[str]:
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            yield line.rstrip('\n')
+
+
+def _iter_pdf(path: str) -> Iterator[str]:
+    with open(path, 'rb') as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        page_count = len(pdf_reader.pages)
+        parallel = Config.PDF_PROCESS_WORKERS > 1 and page_count >= Config.PDF_PARALLEL_MIN_PAGES
+        if not parallel:
+            for page in pdf_reader.pages:
+                yield page.extract_text()
+            return
+
+    yield from _iter_pdf_parallel(path, page_count)
+
+
+def _iter_pdf_parallel(path: str, page_count: int) -> Iterator[str]:
+    """Extract page ranges in worker processes and yield the pages in order."""
+    # Several ranges per worker so one slow range does not hold up the rest
+    range_size = max(1, -(-page_count // (Config.PDF_PROCESS_WORKERS * 4)))
+    starts = list(range(0, page_count, range_size))
+    done = 0
+    try:
+        pool = _get_pdf_pool()
+        ranges = pool.map(_extract_pdf_pages, [path] * len(starts), starts,
+                          [min(start + range_size, page_count) for start in starts])
+        for pages in ranges:
+            yield from pages
+            done += len(pages)
+    except BrokenProcessPool as e:
+        logger.error(f"PDF process pool failed, extracting in-process: {e}")
+        _reset_pdf_pool()
+        yield from _extract_pdf_pages(path, done, page_count)
+
+
+def _extract_pdf_pages(path: str, start: int, stop: int) -> List[str]:
+    """Extract pages [start, stop) of a PDF; runs inside a pool worker."""
+    with open(path, 'rb') as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        return [pdf_reader.pages[index].extract_text() for index in range(start, stop)]
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # spawn rather than fork: the web worker is multi-threaded
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=Config.PDF_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pdf_pool
+
+
+def _reset_pdf_pool():
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is not None:
+            _pdf_pool.shutdown(wait=False, cancel_futures=True)
+        _pdf_pool = None
+
+
+def _iter_docx(path: str) -> Iterator[str]:
+    doc = Document(path)
+    for paragraph in doc.paragraphs:
+        yield paragraph.text
+
+
+def _iter_docx_sections(path: str) -> Iterator[Tuple[str, str]]:
+    doc = Document(path)
+    title = 'Introduction'
+    lines = []
+    for paragraph in doc.paragraphs:
+        style = paragraph.style.name if paragraph.style is not None else ''
+        if style.startswith('Heading') or style == 'Title':
+            if any(line.strip() for line in lines):
+                yield title, '\n'.join(lines)
+            title = paragraph.text.strip() or title
+            lines = []
+        lines.append(paragraph.text)
+    if any(line.strip() for line in lines):
+        yield title, '\n'.join(lines)
+
+
+def _iter_pptx_sections(path: str) -> Iterator[Tuple[str, str]]:
+    prs = Presentation(path)
+    for number, slide in enumerate(prs.slides, 1):
+        texts = [shape.text for shape in slide.shapes if hasattr(shape, "text")]
+        if not any(text.strip() for text in texts):
+            continue
+        title_shape = slide.shapes.title
+        title = title_shape.text.strip() if title_shape is not None else ''
+        yield title or f'Slide {number}', '\n'.join(texts)
+
+
+def _iter_pptx(path: str) -> Iterator[str]:
+    prs = Presentation(path)
+    for slide in prs.slides:
+        for shape in slide.shapes:
+            if hasattr(shape, "text"):
+                yield shape.text
+
+
+def _iter_csv(path: str) -> Iterator[str]:
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.reader(f):
+            yield ' '.join(row)
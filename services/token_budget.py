@@ -0,0 +1,149 @@
+import re
+import math
+import logging
+import threading
+from typing import Dict, Iterable, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Pre-tokenization close to the Llama/Mixtral BPE tokenizers: words with their leading space,
+# digit runs, punctuation runs, and newlines
+_PIECE_RE = re.compile(r" ?[^\W\d_]+| ?\d+| ?[^\s\w]+|_+|\n+|\s+")
+
+
+class ContextOverflowError(ValueError):
+    """Raised when a prompt cannot fit the context window of any model it could be sent to."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate how many tokens text costs, without calling a tokenizer.
+
+    Common English words are one token and longer ones split every few
+    characters; digits and punctuation split finer; non-ASCII text costs
+    roughly a token per character (less for accented Latin words).
+    """
+    tokens = 0
+    for piece in _PIECE_RE.findall(text):
+        word = piece.lstrip(' ')
+        if not word:
+            tokens += 1
+        elif word[0] == '\n':
+            tokens += len(word)
+        elif word.isspace():
+            tokens += 1
+        elif word.isascii() and word[0].isalpha():
+            tokens += 1 + max(0, len(word) - 6) // 4
+        elif word.isascii() and word[0].isdigit():
+            tokens += (len(word) + 2) // 3
+        elif word.isascii():
+            tokens += (len(word) + 1) // 2
+        else:
+            tokens += math.ceil(len(word.encode('utf-8')) / 3)
+    return tokens
+
+
+def context_window(model: str) -> int:
+    return Config.LLM_MODEL_LIMITS.get(model, {}).get('context', Config.LLM_DEFAULT_CONTEXT)
+
+
+def max_output_tokens(model: str) -> int:
+    return Config.LLM_MODEL_LIMITS.get(model, {}).get('max_output', context_window(model))
+
+
+def usable_context(model: str) -> int:
+    """Context tokens we plan against, keeping a margin for estimation error."""
+    return int(context_window(model) * (1 - Config.TOKEN_ESTIMATE_MARGIN))
+
+
+def completion_budget(num_cards: int) -> int:
+    """max_tokens for a reply of num_cards new flashcards."""
+    return Config.COMPLETION_OVERHEAD_TOKENS + Config.TOKENS_PER_CARD * max(1, num_cards)
+
+
+def rewrite_budget(input_tokens: int, num_cards: int = 1) -> int:
+    """max_tokens for improving or translating cards of input_tokens in total.
+
+    Replies are usually a little longer than the input, plus the numbering and
+    labels per card.
+    """
+    return input_tokens * 2 + 50 * max(1, num_cards)
+
+
+def fit_completion(model: str, prompt_tokens: int, max_tokens: int) -> Optional[int]:
+    """Clamp max_tokens to what model has room for after the prompt, or None if the prompt does not fit."""
+    room = min(usable_context(model) - prompt_tokens, max_output_tokens(model))
+    if room < min(max_tokens, Config.MIN_COMPLETION_TOKENS):
+        return None
+    return min(max_tokens, room)
+
+
+def generation_chunk_tokens(text_tokens: int, num_cards: int, models: Iterable[str],
+                            prompt_tokens: int = 200) -> int:
+    """Size the text chunks for generating num_cards cards from text_tokens of input on models.
+
+    Text is split into enough chunks that each chunk's share of the cards fits
+    in one reply, and every chunk plus its prompt and reply fits the smallest
+    context window among the models the call may be routed to.
+    """
+    models = list(models)
+    context = min(usable_context(model) for model in models)
+    # Replies get at most half the context, so the text they come from still has room
+    reply_room = min(min(max_output_tokens(model) for model in models), context // 2)
+    cards_per_call = max(1, (reply_room - Config.COMPLETION_OVERHEAD_TOKENS) // Config.TOKENS_PER_CARD)
+
+    # Chunks are asked for a quarter more cards than their share, see generate_in_chunks
+    requested = num_cards + max(1, num_cards // 4)
+    chunks = max(1, math.ceil(requested / cards_per_call))
+    chunk_tokens = Config.CHUNK_TOKEN_BUDGET
+    if chunks > 1:
+        chunk_tokens = min(chunk_tokens, math.ceil(text_tokens / chunks))
+
+    cards = min(requested, cards_per_call)
+    room = context - prompt_tokens - completion_budget(cards)
+    return max(Config.MIN_CHUNK_TOKENS, min(chunk_tokens, room))
+
+
+class TokenUsage:
+    """Compares estimated token counts with the provider's reported usage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            'calls': 0, 'prompt_estimated': 0, 'prompt_actual': 0, 'completion_budget': 0, 'completion_actual': 0,
+            'context_skips': 0, 'clamped': 0
+        }
+
+    def record(self, model: str, prompt_estimated: int, max_tokens: int, usage):
+        """Log and count one call's estimate next to its actual usage (if the provider reported it)."""
+        prompt_actual = getattr(usage, 'prompt_tokens', None)
+        completion_actual = getattr(usage, 'completion_tokens', None)
+        if prompt_actual is None or completion_actual is None:
+            return
+        logger.info(
+            f"LLM usage on {model}: prompt {prompt_actual} tokens (estimated {prompt_estimated}), "
+            f"completion {completion_actual} of {max_tokens} budgeted"
+        )
+        with self._lock:
+            self._stats['calls'] += 1
+            self._stats['prompt_estimated'] += prompt_estimated
+            self._stats['prompt_actual'] += prompt_actual
+            self._stats['completion_budget'] += max_tokens
+            self._stats['completion_actual'] += completion_actual
+
+    def count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict:
+        """Return the totals plus estimate accuracy and the share of budgeted completion tokens left unused."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['prompt_estimate_ratio'] = (
+            round(stats['prompt_estimated'] / stats['prompt_actual'], 3) if stats['prompt_actual'] else None
+        )
+        stats['completion_unused_rate'] = (
+            round(1 - stats['completion_actual'] / stats['completion_budget'], 3) if stats['completion_budget'] else None
+        )
+        return stats
@@ -0,0 +1,123 @@
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from services.sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+TRANSLATED_CARD_FIELDS = ('question', 'answer', 'original_question', 'original_answer')
+
+
+def is_translated_card(card) -> bool:
+    """Check that card is a translated flashcard as returned by /api/translate: four non-empty strings."""
+    return isinstance(card, dict) and all(
+        isinstance(card.get(field), str) and card[field].strip() for field in TRANSLATED_CARD_FIELDS
+    )
+
+
+class TranslationMemory(SQLiteStore):
+    """Persistent memory of translated strings keyed by (source text hash, target language, model)."""
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS translations (
+        source_hash TEXT NOT NULL,
+        target_language TEXT NOT NULL,
+        model TEXT NOT NULL,
+        translation TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (source_hash, target_language, model)
+    );
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'writes': 0}
+
+    @staticmethod
+    def source_hash(text: str) -> str:
+        """Hash a source string, ignoring whitespace differences."""
+        return hashlib.sha256(' '.join(text.split()).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def normalize_language(language: str) -> str:
+        return ' '.join(language.lower().split())
+
+    def lookup_many(self, texts: List[str], target_language: str, model: str) -> Dict[str, str]:
+        """Return the known translations for any of texts, keyed by source text."""
+        hashes = {self.source_hash(text): text for text in texts}
+        if not hashes:
+            return {}
+        language = self.normalize_language(target_language)
+        found = {}
+        try:
+            placeholders = ', '.join('?' * len(hashes))
+            rows = self.connection().execute(
+                f'SELECT source_hash, translation FROM translations '
+                f'WHERE target_language = ? AND model = ? AND source_hash IN ({placeholders})',
+                (language, model, *hashes)
+            ).fetchall()
+            found = {hashes[source_hash]: translation for source_hash, translation in rows}
+        except Exception as e:
+            logger.error(f"Error reading translation memory: {e}")
+
+        with self._stats_lock:
+            self._stats['hits'] += len(found)
+            self._stats['misses'] += len(hashes) - len(found)
+        return found
+
+    def lookup(self, text: str, target_language: str, model: str) -> Optional[str]:
+        """Return the known translation of text, if any."""
+        return self.lookup_many([text], target_language, model).get(text)
+
+    def store_many(self, translations: Dict[str, str], target_language: str, model: str) -> int:
+        """Remember source -> translation pairs and return how many were written."""
+        language = self.normalize_language(target_language)
+        now = time.time()
+        rows = [
+            (self.source_hash(source), language, model, translation, now)
+            for source, translation in translations.items()
+            if source and source.strip() and translation and translation.strip()
+        ]
+        if not rows:
+            return 0
+        try:
+            with self.transaction() as conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO translations '
+                    '(source_hash, target_language, model, translation, created_at) VALUES (?, ?, ?, ?, ?)',
+                    rows
+                )
+        except Exception as e:
+            logger.error(f"Error writing translation memory: {e}")
+            return 0
+
+        with self._stats_lock:
+            self._stats['writes'] += len(rows)
+        return len(rows)
+
+    def import_deck(self, flashcards: List[Dict], target_language: str, model: str) -> int:
+        """Pre-warm the memory from an already translated deck.
+
+        Each card needs original_question/original_answer alongside the
+        translated question/answer, as returned by /api/translate; cards
+        that do not (see is_translated_card) are skipped.
+        """
+        translations = {}
+        for card in flashcards:
+            if is_translated_card(card):
+                translations[card['original_question']] = card['question']
+                translations[card['original_answer']] = card['answer']
+        return self.store_many(translations, target_language, model)
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters for this process and the number of stored translations."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['entries'] = self.connection().execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+        return stats
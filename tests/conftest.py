@@ -0,0 +1,80 @@
+import os
+import sys
+import json
+import asyncio
+
+import pytest
+
+# The services import config and each other from the repository root, as backend/app.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def backend(tmp_path_factory):
+    """Import backend/app.py (as asgi.py does) with every store under a temporary directory."""
+    data_dir = tmp_path_factory.mktemp('data')
+    for name in dir(Config):
+        if name.endswith('_PATH'):
+            setattr(Config, name, str(data_dir / os.path.basename(getattr(Config, name))))
+    os.environ.setdefault('GROQ_API_KEY', 'test')
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+    import app
+    return app
+
+
+@pytest.fixture
+def client(backend):
+    return backend.app.test_client()
+
+
+@pytest.fixture
+def auth_headers(backend):
+    """Log in a fresh user and return the Authorization header for them."""
+    def login(email='user@example.com'):
+        try:
+            token = backend.auth_service.register_user(email, 'secret')['token']
+        except ValueError:
+            token = backend.auth_service.login_user(email, 'secret')['token']
+        return {'Authorization': f'Bearer {token}'}
+    return login
+
+
+@pytest.fixture(scope='session')
+def asgi(backend):
+    """Import backend/asgi.py on top of the backend fixture."""
+    import asgi
+    return asgi
+
+
+async def asgi_request(app, method, path, body=None, headers=None, disconnect_after=None):
+    """Send one HTTP request through an ASGI app and return (status, headers, parsed JSON body).
+
+    With disconnect_after, the client goes away that many seconds after sending the body.
+    """
+    payload = json.dumps(body).encode('utf-8') if body is not None else b''
+    messages = [{'type': 'http.request', 'body': payload, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        if disconnect_after is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(disconnect_after)
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'query_string': b'',
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in (headers or {}).items()],
+    }
+    await app(scope, receive, send)
+    if not sent:
+        return None, {}, None
+    start, response = sent[0], b''.join(message.get('body', b'') for message in sent[1:])
+    response_headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in start['headers']}
+    return start['status'], response_headers, json.loads(response) if response else None
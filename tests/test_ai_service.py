@@ -0,0 +1,186 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from groq import APIConnectionError, BadRequestError, RateLimitError
+
+from config import Config
+from services import llm_resilience
+from services.ai_service import AIService
+from services.async_ai_service import AsyncAIService
+from services.llm_resilience import CallStats, LLMUnavailableError
+from services.model_router import ModelRouter
+from services.rate_governor import RateGovernor, llm_caller
+from services.structured_output import parse_card
+
+ROUTES = {'generate': {'timeout': 5, 'slow_after': 5, 'routes': [[None, ['model-a', 'model-b']]]}}
+CARD = '{"question": "Q?", "answer": "A."}'
+
+
+def reply(text, total_tokens=None):
+    usage = SimpleNamespace(total_tokens=total_tokens) if total_tokens is not None else None
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))], usage=usage)
+
+
+def connection_error():
+    return APIConnectionError(request=httpx.Request('POST', 'https://api.example.com'))
+
+
+def provider_error(cls, status, headers=None):
+    response = httpx.Response(status, headers=headers, request=httpx.Request('POST', 'https://api.example.com'))
+    return cls(f'status {status}', response=response, body=None)
+
+
+class FakeCompletions:
+    """Plays back one scripted outcome per call: a reply text, an exception, or (delay, text[, total_tokens])."""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.models = []
+
+    def next(self, model):
+        self.models.append(model)
+        outcome = self.script.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome if isinstance(outcome, tuple) else (0, outcome)
+
+    def create(self, model, **kwargs):
+        delay, *outcome = self.next(model)
+        time.sleep(delay)
+        return reply(*outcome)
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    async def create(self, model, **kwargs):
+        delay, *outcome = self.next(model)
+        await asyncio.sleep(delay)
+        return reply(*outcome)
+
+
+@pytest.fixture(autouse=True)
+def fast_policy(monkeypatch):
+    monkeypatch.setenv('GROQ_API_KEY', 'test')
+    monkeypatch.setattr(llm_resilience, 'backoff_delay', lambda attempt: 0.0)
+    monkeypatch.setattr(Config, 'LLM_HEDGE_ENABLED', False)
+
+
+def make_services(script, async_script, governor=None):
+    router = ModelRouter(ROUTES)
+    call_stats = CallStats()
+    sync_service = AIService(router=router, call_stats=call_stats, governor=governor)
+    sync_service.client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(script)))
+    async_service = AsyncAIService(
+        router=router, call_stats=call_stats, token_usage=sync_service.token_usage, governor=governor
+    )
+    async_service.client = SimpleNamespace(chat=SimpleNamespace(completions=FakeAsyncCompletions(async_script)))
+    return sync_service, async_service
+
+
+def run_both(sync_service, async_service, **kwargs):
+    messages = [{'role': 'user', 'content': 'Make a card'}]
+    sync_result = sync_service.complete(messages, **kwargs)
+    async_result = asyncio.run(async_service.complete(messages, **kwargs))
+    return sync_result, async_result
+
+
+def test_retries_are_counted_for_both_clients():
+    script = [connection_error(), CARD]
+    sync_service, async_service = make_services(script, script)
+    sync_result, async_result = run_both(sync_service, async_service, parse=parse_card)
+
+    assert sync_result == async_result == [{'question': 'Q?', 'answer': 'A.'}]
+    stats = sync_service.stats()
+    assert stats['calls'] == 2
+    assert stats['retries'] == 2
+
+
+def test_unparseable_reply_falls_back_to_next_model_for_both_clients():
+    script = ['not json at all', CARD]
+    sync_service, async_service = make_services(script, script)
+    sync_result, async_result = run_both(sync_service, async_service, parse=parse_card)
+
+    assert sync_result == async_result == [{'question': 'Q?', 'answer': 'A.'}]
+    assert sync_service.client.chat.completions.models == ['model-a', 'model-b']
+    assert async_service.client.chat.completions.models == ['model-a', 'model-b']
+    assert sync_service.stats()['fallbacks'] == 2
+
+
+def test_exhausted_retries_fall_back_and_then_fail(monkeypatch):
+    monkeypatch.setattr(Config, 'LLM_MAX_RETRIES', 0)
+    script = [connection_error(), connection_error()]
+    sync_service, async_service = make_services(script, script)
+    messages = [{'role': 'user', 'content': 'Make a card'}]
+
+    with pytest.raises(LLMUnavailableError):
+        sync_service.complete(messages)
+    with pytest.raises(LLMUnavailableError):
+        asyncio.run(async_service.complete(messages))
+    assert sync_service.stats()['fallbacks'] == 2
+
+
+def test_hedges_are_counted_for_both_clients(monkeypatch):
+    monkeypatch.setattr(Config, 'LLM_HEDGE_ENABLED', True)
+    monkeypatch.setattr(Config, 'LLM_HEDGE_MAX_DELAY', 0.05)
+    # The first request stalls, so the hedge sent after 50ms answers first
+    script = [(1.0, 'slow'), (0, 'fast')]
+    sync_service, async_service = make_services(script, script)
+    sync_result, async_result = run_both(sync_service, async_service)
+
+    assert sync_result == async_result == 'fast'
+    stats = sync_service.stats()
+    assert stats['hedged'] == 2
+    assert stats['hedge_wins'] == 2
+
+
+def test_failed_attempts_give_their_tokens_back_to_the_governor(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'LLM_MAX_RETRIES', 0)
+    governor = RateGovernor(str(tmp_path / 'rate.db'), requests_per_minute=600, tokens_per_minute=60000)
+    capacity = governor.stats()['tokens_available']
+    # The first model drops the connection, then the fallback model answers 400
+    script = [connection_error(), provider_error(BadRequestError, 400)]
+    sync_service, async_service = make_services(script, list(script), governor)
+    messages = [{'role': 'user', 'content': 'Make a card'}]
+
+    with pytest.raises(BadRequestError):
+        sync_service.complete(messages)
+    with pytest.raises(BadRequestError):
+        asyncio.run(async_service.complete(messages))
+    # Each attempt reserved prompt plus 2000 completion tokens; none of them stays charged
+    assert governor.stats()['tokens_available'] == pytest.approx(capacity, abs=50)
+
+
+def test_user_is_charged_only_for_the_attempt_that_answered(tmp_path):
+    # Enough quota for one call's estimate, not for a 429'd attempt and its retry both
+    governor = RateGovernor(
+        str(tmp_path / 'rate.db'), requests_per_minute=600, tokens_per_minute=60000, user_quota=150
+    )
+    script = [provider_error(RateLimitError, 429, {'retry-after': '0'}), (0, CARD, 30)]
+    sync_service, async_service = make_services(script, list(script), governor)
+    messages = [{'role': 'user', 'content': 'Make a card'}]
+
+    with llm_caller('a@example.com'):
+        assert sync_service.complete(messages, max_tokens=100, parse=parse_card)
+    assert governor.usage('a@example.com')['tokens_used'] == 30
+
+    with llm_caller('b@example.com'):
+        assert asyncio.run(async_service.complete(messages, max_tokens=100, parse=parse_card))
+    assert governor.usage('b@example.com')['tokens_used'] == 30
+
+
+def test_failed_call_gives_the_users_quota_back(tmp_path):
+    governor = RateGovernor(
+        str(tmp_path / 'rate.db'), requests_per_minute=600, tokens_per_minute=60000, user_quota=150
+    )
+    script = [provider_error(BadRequestError, 400)]
+    sync_service, async_service = make_services(script, list(script), governor)
+    messages = [{'role': 'user', 'content': 'Make a card'}]
+
+    with llm_caller('a@example.com'):
+        with pytest.raises(BadRequestError):
+            sync_service.complete(messages, max_tokens=100)
+        with pytest.raises(BadRequestError):
+            asyncio.run(async_service.complete(messages, max_tokens=100))
+    assert governor.usage('a@example.com')['remaining'] == 150
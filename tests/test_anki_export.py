@@ -0,0 +1,35 @@
+import io
+import sqlite3
+import zipfile
+
+from services.anki_export import ANKI_MODEL, note_guids, render_anki
+
+CARDS = [{'question': 'What is 2 + 2?', 'answer': '4'}, {'question': 'Capital of France?', 'answer': 'Paris'}]
+
+
+def open_collection(apkg, tmp_path):
+    path = tmp_path / 'collection.anki2'
+    with zipfile.ZipFile(io.BytesIO(apkg)) as package:
+        path.write_bytes(package.read('collection.anki2'))
+    return sqlite3.connect(str(path))
+
+
+def test_package_uses_the_existing_note_type(tmp_path):
+    apkg = render_anki(CARDS, {'style': 'Modern', 'fontSize': 16}, deck_name='Maths')
+    conn = open_collection(apkg, tmp_path)
+    try:
+        models = conn.execute('SELECT models FROM col').fetchone()[0]
+        notes = conn.execute('SELECT mid, flds FROM notes ORDER BY id').fetchall()
+    finally:
+        conn.close()
+    assert ANKI_MODEL.model_id == 1607392319
+    assert '"1607392319"' in models and 'Simple Model' in models
+    assert notes == [(1607392319, 'What is 2 + 2?\x1f4'), (1607392319, 'Capital of France?\x1fParis')]
+
+
+def test_note_guids_follow_the_question_not_the_answer():
+    edited = [dict(CARDS[0], answer='four'), CARDS[1]]
+    assert note_guids('Maths', CARDS) == note_guids('Maths', edited)
+    assert note_guids('Maths', CARDS) != note_guids('History', CARDS)
+    repeated = note_guids('Maths', [CARDS[0], CARDS[0]])
+    assert repeated[0] != repeated[1]
@@ -0,0 +1,52 @@
+import io
+import zipfile
+
+DECK = {'flashcards': [{'question': 'What is a cell?', 'answer': 'The basic unit of life.'}],
+        'customization': {'style': 'Modern'}}
+
+
+def test_export_sends_an_etag_and_answers_304_for_it(backend, client, auth_headers):
+    headers = auth_headers()
+    first = client.post('/api/export/pdf', json=DECK, headers=headers)
+    assert first.status_code == 200
+    assert first.data.startswith(b'%PDF-')
+    etag = first.headers['ETag']
+
+    stats = backend.render_cache.stats()
+    again = client.post('/api/export/pdf', json=DECK, headers={**headers, 'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == etag
+    # A 304 is answered from the key alone, without rendering or reading the cache
+    after = backend.render_cache.stats()
+    assert after['not_modified'] == stats['not_modified'] + 1
+    assert (after['hits'], after['misses']) == (stats['hits'], stats['misses'])
+
+
+def test_changed_deck_or_options_get_a_new_etag(client, auth_headers):
+    headers = auth_headers()
+    etag = client.post('/api/export/pdf', json=DECK, headers=headers).headers['ETag']
+
+    restyled = {**DECK, 'customization': {'style': 'Colorful'}}
+    response = client.post('/api/export/pdf', json=restyled, headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+    anki = client.post('/api/export/anki', json=DECK, headers={**headers, 'If-None-Match': etag})
+    assert anki.status_code == 200
+    assert anki.headers['ETag'] != etag
+
+
+def test_bundle_route_streams_a_zip_of_the_requested_formats(client, auth_headers):
+    response = client.post('/api/export/bundle', json={**DECK, 'formats': ['json', 'csv', 'json']}, headers=auth_headers())
+    assert response.status_code == 200
+    assert response.mimetype == 'application/zip'
+    bundle = zipfile.ZipFile(io.BytesIO(response.data))
+    assert bundle.testzip() is None
+    assert sorted(bundle.namelist()) == ['flashcards.csv', 'flashcards.json']
+
+
+def test_bundle_route_rejects_unknown_formats(client, auth_headers):
+    response = client.post('/api/export/bundle', json={**DECK, 'formats': ['pdf', 'docx']}, headers=auth_headers())
+    assert response.status_code == 400
+    assert 'docx' in response.get_json()['error']
@@ -0,0 +1,49 @@
+import io
+import json
+
+from services.cancellation import current_token
+
+
+def upload(text):
+    return {'file': (io.BytesIO(text.encode('utf-8')), 'notes.txt'), 'num_cards': '2'}
+
+
+def events(chunks):
+    return [json.loads(line[len('data: '):]) for chunk in chunks for line in chunk.decode().split('\n')
+            if line.startswith('data: ')]
+
+
+def test_sse_disconnect_cancels_the_requests_work(backend, client, auth_headers, monkeypatch):
+    seen = {}
+
+    def stream_flashcards(text, num_cards):
+        seen['token'] = current_token()
+        yield {'question': 'Q1', 'answer': 'A1'}
+        seen['resumed'] = True
+        yield {'question': 'Q2', 'answer': 'A2'}
+
+    monkeypatch.setattr(backend.ai_service, 'stream_flashcards', stream_flashcards)
+    response = client.post(
+        '/api/upload/stream', data=upload('A note about disconnects.'), headers=auth_headers(), buffered=False
+    )
+    assert response.status_code == 200
+    body = iter(response.response)
+    assert events([next(body)]) == [{'question': 'Q1', 'answer': 'A1'}]
+
+    # The server closes the body once a write to the departed client fails
+    response.close()
+    assert seen['token'].cancelled
+    assert 'resumed' not in seen
+
+
+def test_finished_sse_stream_is_not_cancelled(backend, client, auth_headers, monkeypatch):
+    seen = {}
+
+    def stream_flashcards(text, num_cards):
+        seen['token'] = current_token()
+        yield {'question': 'Q1', 'answer': 'A1'}
+
+    monkeypatch.setattr(backend.ai_service, 'stream_flashcards', stream_flashcards)
+    response = client.post('/api/upload/stream', data=upload('A note that streams to the end.'), headers=auth_headers())
+    assert events([response.data]) == [{'question': 'Q1', 'answer': 'A1'}, {'count': 1}]
+    assert not seen['token'].cancelled
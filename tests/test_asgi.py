@@ -0,0 +1,142 @@
+import asyncio
+from types import SimpleNamespace
+
+from conftest import asgi_request
+from test_ai_service import FakeAsyncCompletions, ROUTES
+
+from services.async_ai_service import AsyncAIService
+from services.cancellation import current_token
+from services.model_router import ModelRouter
+from services.translation_memory import TranslationMemory
+
+CARD = {'question': 'What is a cell?', 'answer': 'The basic unit of life.'}
+
+
+class FakeService:
+    """Stands in for AsyncAIService, recording each call and the token it ran under."""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = []
+
+    async def improve_flashcard(self, flashcard):
+        self.calls.append(('improve', current_token()))
+        await asyncio.sleep(self.delay)
+        return {**flashcard, 'answer': 'Improved.'}
+
+    async def translate_flashcard(self, flashcard, target_language):
+        self.calls.append(('translate', current_token()))
+        await asyncio.sleep(self.delay)
+        return {**flashcard, 'question': f'[{target_language}] {flashcard["question"]}'}
+
+
+def make_app(asgi, service=None):
+    app = asgi.FlashcardASGI(asgi.flask_app)
+    app.ai_service = service or FakeService()
+    return app
+
+
+def test_llm_routes_need_a_token(asgi):
+    app = make_app(asgi)
+
+    async def scenario():
+        missing = await asgi_request(app, 'POST', '/api/improve', {'flashcard': CARD})
+        invalid = await asgi_request(
+            app, 'POST', '/api/translate', {'flashcard': CARD, 'target_language': 'French'},
+            headers={'Authorization': 'Bearer not-a-token'}
+        )
+        return missing, invalid
+
+    missing, invalid = asyncio.run(scenario())
+    assert missing[0] == 401 and missing[2] == {'error': 'Token is missing'}
+    assert invalid[0] == 401 and invalid[2] == {'error': 'Invalid token'}
+    assert app.ai_service.calls == []
+
+
+def test_improve_and_translate_run_on_the_async_service(asgi, auth_headers):
+    app = make_app(asgi)
+    headers = {**auth_headers(), 'Origin': 'http://localhost:3000'}
+
+    async def scenario():
+        improved = await asgi_request(app, 'POST', '/api/improve', {'flashcard': CARD}, headers)
+        translated = await asgi_request(
+            app, 'POST', '/api/translate', {'flashcard': CARD, 'target_language': 'French'}, headers
+        )
+        return improved, translated
+
+    improved, translated = asyncio.run(scenario())
+    assert improved[0] == 200 and improved[2] == {'flashcard': {**CARD, 'answer': 'Improved.'}}
+    assert translated[0] == 200 and translated[2]['flashcard']['question'] == '[French] What is a cell?'
+    assert [name for name, _ in app.ai_service.calls] == ['improve', 'translate']
+    # Allowed origins get the same CORS headers Flask sends, including the ones the client reads
+    assert improved[1]['access-control-allow-origin'] == 'http://localhost:3000'
+    assert improved[1]['access-control-expose-headers'] == ', '.join(asgi.CORS_EXPOSE_HEADERS)
+
+
+def test_missing_fields_are_rejected(asgi, auth_headers):
+    app = make_app(asgi)
+
+    async def scenario():
+        return (
+            await asgi_request(app, 'POST', '/api/improve', {}, auth_headers()),
+            await asgi_request(app, 'POST', '/api/translate', {'flashcard': CARD}, auth_headers()),
+        )
+
+    improve, translate = asyncio.run(scenario())
+    assert improve[0] == 400 and improve[2] == {'error': 'No flashcard provided'}
+    assert translate[0] == 400 and translate[2] == {'error': 'Missing flashcard or target language'}
+    assert 'access-control-allow-origin' not in improve[1]
+    assert app.ai_service.calls == []
+
+
+def test_other_routes_fall_through_to_flask(asgi):
+    app = make_app(asgi)
+    seen = []
+
+    async def wsgi(scope, receive, send):
+        seen.append((scope['method'], scope['path']))
+
+    app.wsgi = wsgi
+    asyncio.run(asgi_request(app, 'POST', '/api/upload'))
+    asyncio.run(asgi_request(app, 'GET', '/api/improve'))
+    assert seen == [('POST', '/api/upload'), ('GET', '/api/improve')]
+
+
+def test_disconnect_cancels_the_handler(asgi, auth_headers):
+    app = make_app(asgi, FakeService(delay=5))
+
+    async def scenario():
+        started = asyncio.get_running_loop().time()
+        response = await asgi_request(
+            app, 'POST', '/api/improve', {'flashcard': CARD}, auth_headers(), disconnect_after=0.05
+        )
+        return response, asyncio.get_running_loop().time() - started
+
+    (status, _, body), elapsed = asyncio.run(scenario())
+    # Nobody is left to answer, so nothing is sent and the handler's sleep is cut short
+    assert status is None and body is None
+    assert elapsed < 1
+    [(_, token)] = app.ai_service.calls
+    assert token.cancelled
+
+
+def test_async_translation_is_remembered(tmp_path, monkeypatch):
+    monkeypatch.setenv('GROQ_API_KEY', 'test')
+    completions = FakeAsyncCompletions(['{"question": "Qu\'est-ce qu\'une cellule ?", "answer": "L\'unité de base."}'])
+
+    async def scenario():
+        service = AsyncAIService(
+            translation_memory=TranslationMemory(str(tmp_path / 'memory.db')), router=ModelRouter(ROUTES)
+        )
+        service.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        first = await service.translate_flashcard(CARD, 'French')
+        second = await service.translate_flashcard(CARD, 'French')
+        await service.http_client.aclose()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == second
+    assert first['question'] == "Qu'est-ce qu'une cellule ?"
+    assert first['original_question'] == CARD['question']
+    # The second call is answered from translation memory without reaching the model
+    assert completions.models == ['model-a']
@@ -0,0 +1,87 @@
+import time
+import asyncio
+import threading
+
+import jwt
+import pytest
+
+from conftest import asgi_request
+from services.auth_service import AuthService
+
+
+@pytest.fixture
+def auth(tmp_path):
+    return AuthService(str(tmp_path / 'auth.db'))
+
+
+def test_users_persist_across_instances(auth):
+    token = auth.register_user('a@example.com', 'secret')['token']
+
+    # Another worker opening the same database sees the user and accepts the token
+    other = AuthService(auth.path)
+    assert other.login_user('a@example.com', 'secret')['email'] == 'a@example.com'
+    assert other.verify_token(token) == 'a@example.com'
+    with pytest.raises(ValueError):
+        other.login_user('a@example.com', 'wrong')
+    with pytest.raises(ValueError):
+        other.login_user('nobody@example.com', 'secret')
+
+
+def test_duplicate_email_is_refused(auth):
+    auth.register_user('a@example.com', 'secret')
+    with pytest.raises(ValueError, match='already registered'):
+        AuthService(auth.path).register_user('a@example.com', 'other')
+
+
+def test_verified_tokens_are_cached_until_they_expire(auth):
+    expires = int(time.time()) + 2
+    token = jwt.encode({'email': 'a@example.com', 'exp': expires}, auth.secret_key, algorithm='HS256')
+
+    assert auth.verify_token(token) == 'a@example.com'
+    assert auth.verify_token(token) == 'a@example.com'
+    assert auth.stats()['token_hits'] == 1
+    assert auth.stats()['cached_tokens'] == 1
+
+    # From exp on the token is decoded again, and not cached again (PyJWT itself allows the rest of that second)
+    time.sleep(max(0.0, expires - time.time()) + 0.1)
+    auth.verify_token(token)
+    assert auth.stats()['token_misses'] == 2
+    assert auth.stats()['cached_tokens'] == 0
+
+    time.sleep(max(0.0, expires + 1 - time.time()) + 0.1)
+    assert auth.verify_token(token) is None
+
+
+def test_invalid_tokens_are_not_cached(auth):
+    assert auth.verify_token('not-a-token') is None
+    assert auth.stats()['cached_tokens'] == 0
+
+
+def test_asgi_register_and_login_hash_off_the_event_loop(asgi, monkeypatch):
+    threads = []
+    register_user = asgi.auth_service.register_user
+
+    def recording_register(email, password):
+        threads.append(threading.get_ident())
+        return register_user(email, password)
+
+    monkeypatch.setattr(asgi.auth_service, 'register_user', recording_register)
+    body = {'email': 'asgi@example.com', 'password': 'secret'}
+
+    async def scenario():
+        app = asgi.FlashcardASGI(asgi.flask_app)
+        loop_thread = threading.get_ident()
+        registered = await asgi_request(app, 'POST', '/api/auth/register', body)
+        duplicate = await asgi_request(app, 'POST', '/api/auth/register', body)
+        login = await asgi_request(app, 'POST', '/api/auth/login', body)
+        wrong = await asgi_request(app, 'POST', '/api/auth/login', {**body, 'password': 'nope'})
+        missing = await asgi_request(app, 'POST', '/api/auth/login', {'email': body['email']})
+        return loop_thread, registered, duplicate, login, wrong, missing
+
+    loop_thread, registered, duplicate, login, wrong, missing = asyncio.run(scenario())
+    assert registered[0] == 200 and registered[2]['email'] == 'asgi@example.com'
+    assert duplicate[0] == 400
+    assert login[0] == 200 and asgi.auth_service.verify_token(login[2]['token']) == 'asgi@example.com'
+    assert wrong[0] == 400
+    assert missing[0] == 400
+    assert threads and loop_thread not in threads
@@ -0,0 +1,121 @@
+import re
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from config import Config
+from services.ai_service import AIService
+from services.model_router import ModelRouter
+from services.translation_memory import TranslationMemory
+
+ROUTE = {'timeout': 5, 'slow_after': 5, 'routes': [[None, ['model-a']]]}
+ROUTES = {'generate': ROUTE, 'improve': ROUTE, 'translate': ROUTE}
+DECK = [{'question': f'Question {i}?', 'answer': f'Answer {i}.'} for i in range(45)]
+
+
+class FakeModel:
+    """Rewrites every card it is sent: numbered batches come back as indexed lists, single cards as objects.
+
+    Questions in drop are left out of batch replies; questions in refuse are never answered at all.
+    """
+
+    def __init__(self, drop=(), refuse=()):
+        self.drop = set(drop)
+        self.refuse = set(refuse)
+        self.batches = []
+        self.singles = 0
+        self._lock = threading.Lock()
+
+    def create(self, model, messages, **kwargs):
+        prompt = messages[0]['content']
+        match = re.search(r'to (\w+):', prompt)
+        prefix = f'[{match.group(1)}]' if match else '[improved]'
+        start = prompt.find('[{"index"')
+        if start >= 0:
+            sent, _ = json.JSONDecoder().raw_decode(prompt, start)
+            with self._lock:
+                self.batches.append(len(sent))
+                drop = set(self.drop)
+                # A card is only left out of the first reply it was sent in
+                self.drop -= {card['question'] for card in sent}
+            reply = [
+                {'index': card['index'], 'question': f"{prefix} {card['question']}", 'answer': f"{prefix} {card['answer']}"}
+                for card in sent if card['question'] not in drop | self.refuse
+            ]
+        else:
+            card, _ = json.JSONDecoder().raw_decode(prompt, prompt.find('{"question"'))
+            with self._lock:
+                self.singles += 1
+            reply = {} if card['question'] in self.refuse else {
+                'question': f"{prefix} {card['question']}", 'answer': f"{prefix} {card['answer']}"
+            }
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(reply)))], usage=None
+        )
+
+
+@pytest.fixture
+def make_service(monkeypatch):
+    monkeypatch.setenv('GROQ_API_KEY', 'test')
+    monkeypatch.setattr(Config, 'BATCH_MAX_CARDS', 20)
+    monkeypatch.setattr(Config, 'LLM_HEDGE_ENABLED', False)
+
+    def make(model, translation_memory=None):
+        service = AIService(router=ModelRouter(ROUTES), translation_memory=translation_memory)
+        service.client = SimpleNamespace(chat=SimpleNamespace(completions=model))
+        return service
+    return make
+
+
+def test_improve_packs_the_deck_into_a_few_calls(make_service):
+    model = FakeModel()
+    improved = make_service(model).improve_flashcards(DECK)
+
+    assert sorted(model.batches) == [5, 20, 20]
+    assert model.singles == 0
+    assert [card['question'] for card in improved] == [f"[improved] {card['question']}" for card in DECK]
+
+
+def test_cards_left_out_of_a_reply_are_asked_for_again_then_singly(make_service):
+    model = FakeModel(drop={'Question 3?'}, refuse={'Question 30?'})
+    improved = make_service(model).improve_flashcards(DECK)
+
+    # Question 3 comes back in the re-ask of its batch; Question 30 fails there and on its own
+    assert improved[3]['question'] == '[improved] Question 3?'
+    assert improved[30] is None
+    assert sorted(model.batches) == [1, 1, 5, 20, 20]
+    assert model.singles == 1
+    assert sum(card is not None for card in improved) == len(DECK) - 1
+
+
+def test_translate_deck_fans_out_every_language_at_once(make_service):
+    model = FakeModel()
+    events = list(make_service(model).translate_deck(DECK, ['French', 'German']))
+
+    assert sorted(model.batches) == [5, 5, 20, 20, 20, 20]
+    progress = [payload for event, payload in events if event == 'progress']
+    assert [payload['completed_units'] for payload in progress] == list(range(1, 7))
+    assert progress[-1]['completed_languages'] == progress[-1]['total_languages'] == 2
+
+    results = {payload['language']: payload for event, payload in events if event == 'language'}
+    assert set(results) == {'French', 'German'}
+    for language, result in results.items():
+        assert result['failed'] == []
+        assert result['flashcards'][44] == {
+            'question': f'[{language}] Question 44?', 'answer': f'[{language}] Answer 44.',
+            'original_question': 'Question 44?', 'original_answer': 'Answer 44.'
+        }
+
+
+def test_translate_deck_serves_known_languages_from_memory(make_service, tmp_path):
+    memory = TranslationMemory(str(tmp_path / 'translations.db'))
+    list(make_service(FakeModel(), memory).translate_deck(DECK, ['French']))
+
+    model = FakeModel()
+    events = list(make_service(model, memory).translate_deck(DECK, ['French', 'German']))
+    assert sorted(model.batches) == [5, 20, 20]
+    # French is complete before any German unit has finished
+    assert events[0][0] == 'language' and events[0][1]['language'] == 'French'
+    assert events[0][1]['flashcards'][0]['question'] == '[French] Question 0?'
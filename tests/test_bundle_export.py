@@ -0,0 +1,62 @@
+import io
+import csv
+import json
+import time
+import zipfile
+import threading
+
+from services.bundle_export import render_csv, render_json, stream_bundle
+
+CARDS = [{'question': 'Café?', 'answer': 'Coffee, "quoted", with commas'}]
+
+
+def read_zip(chunks):
+    return zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+
+
+def test_csv_and_json_renderers():
+    rows = list(csv.reader(io.StringIO(render_csv(CARDS, {}).decode('utf-8-sig'))))
+    assert rows == [['question', 'answer'], [CARDS[0]['question'], CARDS[0]['answer']]]
+    assert json.loads(render_json(CARDS, {})) == {'flashcards': CARDS}
+
+
+def test_bundle_is_a_valid_zip_of_every_member():
+    bundle = read_zip(stream_bundle({
+        'flashcards.csv': lambda: render_csv(CARDS, {}),
+        'flashcards.json': lambda: render_json(CARDS, {}),
+        'flashcards.apkg': lambda: b'already compressed',
+    }))
+    assert bundle.testzip() is None
+    assert sorted(bundle.namelist()) == ['flashcards.apkg', 'flashcards.csv', 'flashcards.json']
+    assert json.loads(bundle.read('flashcards.json')) == {'flashcards': CARDS}
+    # Anki packages are zips already, so they are stored rather than deflated again
+    assert bundle.getinfo('flashcards.apkg').compress_type == zipfile.ZIP_STORED
+    assert bundle.getinfo('flashcards.csv').compress_type == zipfile.ZIP_DEFLATED
+
+
+def test_failed_member_is_listed_in_errors_json():
+    def broken():
+        raise ValueError('renderer exploded')
+
+    bundle = read_zip(stream_bundle({'flashcards.json': lambda: render_json(CARDS, {}), 'flashcards.pdf': broken}))
+    assert bundle.testzip() is None
+    assert sorted(bundle.namelist()) == ['errors.json', 'flashcards.json']
+    assert json.loads(bundle.read('errors.json')) == {'errors': {'flashcards.pdf': 'renderer exploded'}}
+
+
+def test_first_member_is_sent_before_the_slowest_is_rendered():
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return b'slow'
+
+    chunks = stream_bundle({'slow.txt': slow, 'fast.txt': lambda: b'fast'})
+    first = next(chunks)
+    assert b'fast.txt' in first and b'slow.txt' not in first
+
+    release.set()
+    started = time.monotonic()
+    bundle = read_zip([first, *chunks])
+    assert time.monotonic() - started < 5
+    assert bundle.read('slow.txt') == b'slow'
@@ -0,0 +1,111 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services.cancellation import (
+    CancelToken, Cancelled, cancellable_sleep, cancellation, check_cancelled, current_token, wait_result
+)
+from services.single_flight import SingleFlight
+
+
+def test_token_check_and_reason():
+    token = CancelToken()
+    token.check()
+    token.cancel('client disconnected')
+    assert token.cancelled
+    with pytest.raises(Cancelled, match='client disconnected'):
+        token.check()
+
+
+def test_polled_token_notices_outside_cancellation():
+    flag = {'cancelled': False}
+    token = CancelToken(poll=lambda: flag['cancelled'], poll_interval=0)
+    assert not token.cancelled
+    flag['cancelled'] = True
+    assert token.cancelled
+
+
+def test_helpers_are_no_ops_outside_cancellable_work():
+    assert current_token() is None
+    check_cancelled()
+    cancellable_sleep(0)
+
+
+def test_sleep_is_cut_short_by_cancel():
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel).start()
+    started = time.monotonic()
+    with cancellation(token), pytest.raises(Cancelled):
+        cancellable_sleep(5)
+    assert time.monotonic() - started < 1
+
+
+def test_wait_result_stops_waiting_when_cancelled():
+    token = CancelToken()
+    with ThreadPoolExecutor(1) as executor:
+        future = executor.submit(time.sleep, 0.5)
+        threading.Timer(0.1, token.cancel).start()
+        with cancellation(token), pytest.raises(Cancelled):
+            wait_result(future)
+        assert wait_result(future) is None
+
+
+def test_cancelled_follower_leaves_the_flight_running_for_others():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    leader_token = {}
+    results = {}
+
+    def generate():
+        leader_token['token'] = current_token()
+        started.set()
+        release.wait(5)
+        return 'cards'
+
+    def leader():
+        results['leader'] = flight.do('generate:k', generate)
+
+    def follower(token):
+        with cancellation(token):
+            try:
+                results['follower'] = flight.do('generate:k', generate)
+            except Cancelled:
+                results['follower'] = 'cancelled'
+
+    follower_token = CancelToken()
+    threads = [threading.Thread(target=leader)]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=follower, args=(follower_token,)))
+    threads[1].start()
+
+    follower_token.cancel()
+    threads[1].join(5)
+    # The leader cannot be cancelled, so the call carries on for it
+    assert results['follower'] == 'cancelled'
+    assert not leader_token['token'].cancelled
+
+    release.set()
+    threads[0].join(5)
+    assert results['leader'] == 'cards'
+
+
+def test_flight_is_cancelled_once_every_caller_has_gone():
+    flight = SingleFlight()
+    token = CancelToken()
+    seen = {}
+
+    def generate():
+        threading.Timer(0.1, token.cancel).start()
+        try:
+            cancellable_sleep(5)
+        except Cancelled:
+            seen['cancelled'] = True
+            raise
+
+    with cancellation(token), pytest.raises(Cancelled):
+        flight.do('generate:k', generate)
+    assert seen == {'cancelled': True}
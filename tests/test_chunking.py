@@ -0,0 +1,107 @@
+import pytest
+
+from services.cancellation import CancelToken, Cancelled, cancellation
+from services.chunking import (
+    allocate_cards, generate_in_chunks, map_chunks, merge_flashcards, pack_by_tokens, split_text
+)
+from services.rate_governor import RateLimitExceeded
+from services.token_budget import estimate_tokens
+
+
+def card(question, answer='answer'):
+    return {'question': question, 'answer': answer}
+
+
+def test_short_text_is_one_chunk():
+    assert split_text('A short paragraph.', 100) == ['A short paragraph.']
+    assert split_text('   \n  ', 100) == []
+
+
+def test_split_respects_budget_and_keeps_every_paragraph():
+    paragraphs = [f'Paragraph {i} talks about topic number {i} in some detail.' for i in range(50)]
+    chunks = split_text('\n\n'.join(paragraphs), 60)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 60 for chunk in chunks)
+    # Paragraphs are kept whole and in document order
+    assert [line for chunk in chunks for line in chunk.split('\n')] == paragraphs
+
+
+def test_oversized_paragraph_is_split_into_sentences_and_slices():
+    long_word = 'x' * 2000
+    text = 'First sentence here. Second sentence there. ' + long_word
+    chunks = split_text(text, 40)
+    assert all(estimate_tokens(chunk) <= 40 for chunk in chunks)
+    assert ''.join(chunks).replace('\n', '').count('x') == 2000
+
+
+def test_pack_by_tokens_limits_tokens_and_items():
+    texts = ['word ' * 10] * 7
+    batches = pack_by_tokens(texts, max_tokens=25, max_items=3)
+    assert [index for batch in batches for index in batch] == list(range(7))
+    assert all(len(batch) <= 3 for batch in batches)
+    assert all(sum(estimate_tokens(texts[index]) for index in batch) <= 25 for batch in batches)
+
+
+def test_allocate_cards_is_proportional_and_exact():
+    allocations = allocate_cards(['a' * 100, 'b' * 300, 'c' * 600], 10)
+    assert allocations == [1, 3, 6]
+    assert sum(allocate_cards(['a' * 7, 'b' * 11, 'c' * 13], 5)) == 5
+    assert allocate_cards([], 5) == []
+
+
+def test_merge_drops_duplicates_and_keeps_order():
+    merged = merge_flashcards([
+        [card('What is X?'), card('What is Y?')],
+        [card('what  is x?'), card('What is Z?'), {'question': '', 'answer': 'no question'}],
+        'not a list',
+    ])
+    assert [c['question'] for c in merged] == ['What is X?', 'What is Y?', 'What is Z?']
+
+
+def test_merge_tops_up_short_chunks_from_surplus():
+    results = [[card('A1'), card('A2'), card('A3')], [card('B1')]]
+    merged = merge_flashcards(results, allocations=[2, 2], num_cards=4)
+    assert [c['question'] for c in merged] == ['A1', 'A2', 'A3', 'B1']
+
+
+def test_map_chunks_keeps_order_and_isolates_failing_chunks():
+    def generate(chunk, suffix):
+        if chunk == 'bad':
+            raise ValueError('broken chunk')
+        return [card(chunk + suffix)]
+
+    results = map_chunks(['one', 'bad', 'three'], generate, [('!',)] * 3)
+    assert results == [[card('one!')], [], [card('three!')]]
+
+
+def test_map_chunks_surfaces_throttling():
+    def generate(chunk):
+        if chunk == 'throttled':
+            raise RateLimitExceeded('slow down', retry_after=3)
+        return [card(chunk)]
+
+    with pytest.raises(RateLimitExceeded):
+        map_chunks(['one', 'throttled'], generate, [()] * 2)
+
+
+def test_map_chunks_stops_when_cancelled():
+    token = CancelToken()
+    token.cancel()
+    with cancellation(token), pytest.raises(Cancelled):
+        map_chunks(['one', 'two'], lambda chunk: [card(chunk)], [()] * 2)
+
+
+def test_generate_in_chunks_fans_out_and_merges():
+    text = '\n'.join(f'Section {i} explains idea {i} carefully and at length.' for i in range(40))
+    calls = []
+
+    def generate(chunk, count):
+        calls.append(count)
+        first = chunk.split('\n')[0]
+        return [card(f'{first} #{n}') for n in range(count)]
+
+    flashcards = generate_in_chunks(text, 8, generate, max_tokens=80)
+    assert len(calls) > 1
+    assert len(flashcards) == 8
+    assert len({c['question'] for c in flashcards}) == 8
@@ -0,0 +1,57 @@
+import random
+import string
+import time
+import zlib
+
+from services.extraction_cache import ExtractionCache
+
+
+def incompressible(size):
+    return ''.join(random.choice(string.ascii_letters) for _ in range(size))
+
+
+def stored_size(text):
+    return len(zlib.compress(text.encode('utf-8'), 6))
+
+
+def test_key_depends_on_content_extension_and_extractor():
+    key = ExtractionCache.make_key('abc', 'Notes.PDF', 1, 1000)
+    assert key == ExtractionCache.make_key('abc', 'other-name.pdf', 1, 1000)
+    assert key != ExtractionCache.make_key('abc', 'notes.docx', 1, 1000)
+    assert key != ExtractionCache.make_key('abc', 'notes.pdf', 2, 1000)
+    assert key != ExtractionCache.make_key('abc', 'notes.pdf', 1, 2000)
+    assert key != ExtractionCache.make_key('abd', 'notes.pdf', 1, 1000)
+
+
+def test_round_trip_and_counters(tmp_path):
+    cache = ExtractionCache(str(tmp_path / 'extraction.db'))
+    assert cache.get('k') is None
+    cache.set('k', 'Unicode text – ünïcødé')
+    assert cache.get('k') == 'Unicode text – ünïcødé'
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['writes'], stats['entries']) == (1, 1, 1, 1)
+
+
+def test_evicts_least_recently_used_beyond_the_byte_budget(tmp_path):
+    texts = {key: incompressible(1000) for key in 'abc'}
+    budget = stored_size(texts['a']) + stored_size(texts['b']) + stored_size(texts['c']) - 1
+    cache = ExtractionCache(str(tmp_path / 'extraction.db'), max_bytes=budget)
+    cache.set('a', texts['a'])
+    time.sleep(0.01)
+    cache.set('b', texts['b'])
+    time.sleep(0.01)
+    # Reading a makes b the least recently used
+    assert cache.get('a') == texts['a']
+    time.sleep(0.01)
+    cache.set('c', texts['c'])
+
+    assert cache.get('b') is None
+    assert cache.get('a') == texts['a'] and cache.get('c') == texts['c']
+    assert cache.stats()['bytes'] <= budget
+
+
+def test_text_larger_than_the_budget_is_not_stored(tmp_path):
+    cache = ExtractionCache(str(tmp_path / 'extraction.db'), max_bytes=100)
+    cache.set('big', incompressible(10000))
+    assert cache.get('big') is None
+    assert cache.stats()['entries'] == 0
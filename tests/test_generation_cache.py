@@ -0,0 +1,59 @@
+import time
+
+from services.generation_cache import GenerationCache
+
+CARDS = [{'question': 'Q', 'answer': 'A'}]
+
+
+def make_cache(tmp_path, **kwargs):
+    return GenerationCache(str(tmp_path / 'generations.db'), **kwargs)
+
+
+def test_key_ignores_whitespace_but_not_inputs():
+    key = GenerationCache.make_key('Some   text\n', 5, 'model-a', 1)
+    assert key == GenerationCache.make_key('Some text', 5, 'model-a', 1)
+    assert key != GenerationCache.make_key('Some text', 6, 'model-a', 1)
+    assert key != GenerationCache.make_key('Some text', 5, 'model-b', 1)
+    assert key != GenerationCache.make_key('Some text', 5, 'model-a', 2)
+
+
+def test_memory_then_shared_disk_tier(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set('k', CARDS)
+    assert cache.get('k') == CARDS
+
+    # Another worker on the host finds it on disk, then in its own memory
+    other = make_cache(tmp_path)
+    assert other.get('k') == CARDS
+    assert other.get('k') == CARDS
+    assert other.get('missing') is None
+    stats = other.stats()
+    assert (stats['memory_hits'], stats['disk_hits'], stats['misses']) == (1, 1, 1)
+    assert stats['disk_entries'] == 1
+
+
+def test_entries_expire_after_ttl_in_both_tiers(tmp_path):
+    cache = make_cache(tmp_path, ttl=0.2)
+    cache.set('k', CARDS)
+    other = make_cache(tmp_path, ttl=0.2)
+    assert other.get('k') == CARDS
+
+    time.sleep(0.3)
+    assert cache.get('k') is None
+    assert other.get('k') is None
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    cache = make_cache(tmp_path, max_memory_entries=1, max_disk_entries=2)
+    for key in ('a', 'b'):
+        cache.set(key, CARDS)
+        time.sleep(0.01)
+    # Memory only holds 'b', so 'a' is read from disk, which makes 'b' the least recently used there
+    assert cache.get('a') == CARDS
+    time.sleep(0.01)
+    cache.set('c', CARDS)
+
+    fresh = make_cache(tmp_path)
+    assert fresh.get('b') is None
+    assert fresh.get('a') == CARDS and fresh.get('c') == CARDS
+    assert fresh.stats()['disk_entries'] == 2
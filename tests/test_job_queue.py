@@ -0,0 +1,151 @@
+import io
+import os
+import threading
+import time
+
+from services.cancellation import Cancelled, cancellable_sleep, check_cancelled, current_token
+from services.chunking import map_chunks
+from services.job_queue import JobQueue
+from services.text_extraction import SpooledUpload
+
+
+class FakeFile:
+    def __init__(self, filename, data):
+        self.filename = filename
+        self.stream = io.BytesIO(data)
+
+
+def wait_for(predicate, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < end, 'timed out'
+        time.sleep(0.01)
+
+
+def make_queue(tmp_path, **kwargs):
+    return JobQueue(str(tmp_path / 'jobs.db'), **kwargs)
+
+
+def test_job_completes_and_runs_cleanup(tmp_path):
+    queue = make_queue(tmp_path)
+    cleaned = threading.Event()
+    job_id = queue.submit('test', lambda x: x * 2, 21, owner='a@example.com', cleanup=cleaned.set)
+
+    wait_for(lambda: queue.get(job_id)['status'] == 'completed')
+    assert queue.get(job_id)['result'] == 42
+    assert cleaned.wait(1)
+    wait_for(lambda: queue.pending() == 0)
+
+
+def test_cancelled_queued_upload_job_removes_spool_file(tmp_path):
+    queue = make_queue(tmp_path, max_workers=1)
+    release = threading.Event()
+    blocker = queue.submit('block', release.wait)
+    wait_for(lambda: queue.get(blocker)['status'] == 'running')
+
+    upload = SpooledUpload(FakeFile('notes.txt', b'some notes'), spool_dir=str(tmp_path))
+    started = threading.Event()
+
+    def generate(upload):
+        started.set()
+        with upload:
+            return []
+
+    job_id = queue.submit('upload', generate, upload, cleanup=upload.close)
+    assert os.path.exists(upload.path)
+    assert queue.cancel(job_id)
+
+    release.set()
+    wait_for(lambda: queue.pending() == 0)
+    assert not started.is_set()
+    assert queue.get(job_id)['status'] == 'cancelled'
+    assert not os.path.exists(upload.path)
+
+
+def test_cleanup_error_does_not_leak_pending_slot(tmp_path):
+    queue = make_queue(tmp_path)
+
+    def broken_cleanup():
+        raise OSError('gone')
+
+    job_id = queue.submit('test', lambda: 'ok', cleanup=broken_cleanup)
+    wait_for(lambda: queue.pending() == 0)
+    assert queue.get(job_id)['status'] == 'completed'
+
+
+def test_running_job_is_cancelled_through_its_token(tmp_path):
+    queue = make_queue(tmp_path)
+    started = threading.Event()
+    stopped = threading.Event()
+    cleaned = threading.Event()
+
+    def work():
+        started.set()
+        try:
+            while True:
+                cancellable_sleep(0.05)
+        except Cancelled:
+            stopped.set()
+            raise
+
+    job_id = queue.submit('test', work, cleanup=cleaned.set)
+    assert started.wait(5)
+    assert queue.cancel(job_id)
+
+    assert stopped.wait(1)
+    assert cleaned.wait(1)
+    wait_for(lambda: queue.pending() == 0)
+    assert queue.get(job_id)['status'] == 'cancelled'
+
+
+def test_job_token_reaches_chunk_workers(tmp_path):
+    queue = make_queue(tmp_path)
+    chunk_tokens = []
+    chunks_stopped = []
+    release = threading.Event()
+
+    def chunk(text):
+        chunk_tokens.append(current_token())
+        release.wait(5)
+        try:
+            check_cancelled()
+        except Cancelled:
+            chunks_stopped.append(text)
+            raise
+        return [text]
+
+    job_id = queue.submit('test', lambda: map_chunks(['a', 'b'], chunk, [(), ()]))
+    wait_for(lambda: len(chunk_tokens) == 2)
+    assert queue.cancel(job_id)
+    release.set()
+
+    wait_for(lambda: queue.pending() == 0)
+    assert all(token is chunk_tokens[0] and token.cancelled for token in chunk_tokens)
+    assert sorted(chunks_stopped) == ['a', 'b']
+    assert queue.get(job_id)['status'] == 'cancelled'
+
+
+def test_cancel_served_by_another_worker_is_noticed(tmp_path, monkeypatch):
+    monkeypatch.setattr(JobQueue, 'CANCEL_POLL_INTERVAL', 0.05)
+    queue = make_queue(tmp_path)
+    other_worker = make_queue(tmp_path)
+    started = threading.Event()
+
+    def work():
+        started.set()
+        while True:
+            cancellable_sleep(0.05)
+
+    job_id = queue.submit('test', work)
+    assert started.wait(5)
+    assert other_worker.cancel(job_id)
+    wait_for(lambda: queue.pending() == 0)
+    assert queue.get(job_id)['status'] == 'cancelled'
+
+
+def test_finished_job_cannot_be_cancelled(tmp_path):
+    queue = make_queue(tmp_path)
+    job_id = queue.submit('test', lambda: 'done')
+    wait_for(lambda: queue.get(job_id)['status'] == 'completed')
+    assert not queue.cancel(job_id)
+    assert queue.get(job_id)['result'] == 'done'
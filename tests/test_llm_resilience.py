@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+from services.llm_resilience import CircuitBreaker, LLMUnavailableError
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.stats() == {'state': 'open', 'consecutive_failures': 3, 'rejected': 0, 'opened': 1}
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    assert breaker.stats()['consecutive_failures'] == 1
+
+
+def test_rejects_while_open():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    open_breaker(breaker)
+    with pytest.raises(LLMUnavailableError) as excinfo:
+        breaker.before_call()
+    assert 29 < excinfo.value.retry_after <= 30
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    open_breaker(breaker)
+    time.sleep(0.1)
+
+    breaker.before_call()
+    assert breaker.state == 'half_open'
+    with pytest.raises(LLMUnavailableError):
+        breaker.before_call()
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_successful_trial_closes_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    open_breaker(breaker)
+    time.sleep(0.1)
+    breaker.before_call()
+    breaker.record_success()
+
+    assert breaker.stats() == {'state': 'closed', 'consecutive_failures': 0, 'rejected': 0, 'opened': 1}
+    breaker.before_call()
+    breaker.before_call()
+
+
+def test_failed_trial_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.05)
+    open_breaker(breaker)
+    time.sleep(0.1)
+    breaker.before_call()
+    # A single failure is enough once half-open, whatever the threshold
+    breaker.record_failure()
+
+    assert breaker.state == 'open'
+    assert breaker.stats()['opened'] == 2
+    with pytest.raises(LLMUnavailableError):
+        breaker.before_call()
+
+
+def test_released_trial_frees_the_slot_without_deciding():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    open_breaker(breaker)
+    time.sleep(0.1)
+    breaker.before_call()
+    breaker.release_trial()
+
+    assert breaker.state == 'half_open'
+    breaker.before_call()
+    assert breaker.stats()['rejected'] == 0
@@ -0,0 +1,75 @@
+import time
+
+from services.lru import LRUCache
+
+
+def test_evicts_least_recently_used_entry():
+    cache = LRUCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert len(cache) == 2
+
+
+def test_overwriting_a_key_does_not_grow_the_cache():
+    cache = LRUCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('a', 2)
+    cache.set('b', 3)
+    assert cache.get('a') == 2 and len(cache) == 2
+
+
+def test_entries_expire_after_their_ttl():
+    cache = LRUCache(max_entries=10, ttl=0.05)
+    cache.set('default', 1)
+    cache.set('longer', 2, ttl=60)
+    time.sleep(0.1)
+    assert cache.get('default') is None
+    assert cache.get('longer') == 2
+    assert len(cache) == 1
+
+
+def test_delete_and_clear():
+    cache = LRUCache(max_entries=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.delete('a')
+    cache.delete('missing')
+    assert cache.get('a') is None and len(cache) == 1
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_evicts_by_total_bytes():
+    cache = LRUCache(max_entries=100, max_bytes=10)
+    cache.set('a', b'1234')
+    cache.set('b', b'1234')
+    assert cache.total_bytes == 8
+    cache.set('c', b'1234')
+
+    assert cache.get('a') is None
+    assert cache.total_bytes == 8 and len(cache) == 2
+
+
+def test_value_larger_than_the_budget_is_not_stored():
+    cache = LRUCache(max_entries=100, max_bytes=10)
+    cache.set('a', b'1234')
+    cache.set('huge', b'x' * 11)
+    assert cache.get('huge') is None
+    assert cache.get('a') == b'1234'
+
+
+def test_byte_accounting_survives_overwrite_delete_and_clear():
+    cache = LRUCache(max_entries=100, max_bytes=100)
+    cache.set('a', b'12345')
+    cache.set('a', b'12')
+    assert cache.total_bytes == 2
+    cache.set('b', b'123')
+    cache.delete('a')
+    assert cache.total_bytes == 3
+    cache.clear()
+    assert cache.total_bytes == 0
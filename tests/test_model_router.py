@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from services.model_router import ModelRouter
+
+ROUTES = {
+    'generate': {'timeout': 30, 'slow_after': 2, 'routes': [[1000, ['small-a', 'small-b']], [None, ['big-a', 'big-b']]]},
+    'improve': {'timeout': 10, 'slow_after': 1, 'routes': [[None, ['fast', 'steady']]]},
+}
+
+
+def make_router(**kwargs):
+    return ModelRouter(ROUTES, breaker_failures=2, breaker_reset=60, min_samples=3, **kwargs)
+
+
+def test_routing_table_needs_a_generate_entry():
+    with pytest.raises(ValueError):
+        ModelRouter({'improve': ROUTES['improve']})
+
+
+def test_rows_are_picked_by_input_size():
+    router = make_router()
+    assert router.candidates('generate', 200) == ['small-a', 'small-b']
+    assert router.candidates('generate', 1000) == ['small-a', 'small-b']
+    assert router.candidates('generate', 1001) == ['big-a', 'big-b']
+    # Operations without their own entry use 'generate'
+    assert router.candidates('translate', 50) == ['small-a', 'small-b']
+    assert router.primary('improve') == 'fast'
+    assert router.timeout('improve') == 10.0
+    assert router.models() == ['small-a', 'small-b', 'big-a', 'big-b', 'fast', 'steady']
+
+
+def test_slow_model_is_tried_last():
+    router = make_router()
+    for _ in range(2):
+        router.latency.record('fast', 5.0)
+    # Two samples are not enough evidence to demote a model
+    assert router.candidates('improve', 10) == ['fast', 'steady']
+
+    router.latency.record('fast', 5.0)
+    assert router.candidates('improve', 10) == ['steady', 'fast']
+    # 'slow_after' is per operation: 5s is too slow to improve a card but not to generate with
+    for _ in range(3):
+        router.latency.record('small-a', 1.5)
+    assert router.candidates('generate', 10) == ['small-a', 'small-b']
+    assert router.stats()['demoted'] == 1
+
+
+def test_model_with_an_open_circuit_is_tried_last():
+    router = make_router()
+    router.breaker('fast').record_failure()
+    assert router.candidates('improve', 10) == ['fast', 'steady']
+    router.breaker('fast').record_failure()
+    assert router.candidates('improve', 10) == ['steady', 'fast']
+    # Each model has its own breaker
+    assert router.breaker('steady').state == 'closed'
+    assert router.stats()['models']['fast']['circuit']['state'] == 'open'
+
+
+def test_unparseable_replies_demote_a_model():
+    router = make_router(max_parse_failure_rate=0.5)
+    for ok in (True, False, False):
+        router.record_parse('fast', ok)
+    assert router.candidates('improve', 10) == ['steady', 'fast']
+    assert router.stats()['models']['fast']['parse_failure_rate'] == pytest.approx(0.667)
+
+    router.record_parse('fast', True)
+    assert router.candidates('improve', 10) == ['fast', 'steady']
+
+
+def test_demoted_model_is_tried_first_again_once_its_samples_age_out():
+    router = make_router(health_window=0.05)
+    for _ in range(3):
+        router.latency.record('fast', 5.0)
+    assert router.candidates('improve', 10) == ['steady', 'fast']
+    time.sleep(0.1)
+    assert router.candidates('improve', 10) == ['fast', 'steady']
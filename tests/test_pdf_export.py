@@ -0,0 +1,51 @@
+import io
+
+from PyPDF2 import PdfReader
+
+from services.pdf_export import PdfRenderer, render_pdf
+
+DECK = [{'question': f'What is concept {i}?', 'answer': f'Concept {i} is explained here. ' * 4} for i in range(60)]
+
+
+def page_count(data):
+    return len(PdfReader(io.BytesIO(data)).pages)
+
+
+def test_multi_page_deck_renders_to_a_valid_pdf():
+    data = render_pdf(DECK, {'style': 'Modern', 'font': 'Times', 'fontSize': 14})
+    assert data.startswith(b'%PDF-') and data.rstrip().endswith(b'%%EOF')
+
+    pages = PdfReader(io.BytesIO(data)).pages
+    assert len(pages) > 5
+    text = ''.join(page.extract_text() for page in pages)
+    assert 'What is concept 0?' in text and 'What is concept 59?' in text
+
+
+def test_unknown_options_fall_back_to_defaults():
+    assert page_count(render_pdf(DECK[:1], {'style': 'Neon', 'font': 'Comic Sans'})) == 1
+
+
+def test_font_and_color_state_is_set_only_when_it_changes():
+    renderer = PdfRenderer({'style': 'Colorful'})
+    calls = []
+    for name in ('set_font', 'set_text_color', 'set_fill_color', 'set_draw_color'):
+        method = getattr(renderer.pdf, name)
+        setattr(renderer.pdf, name, lambda *args, _name=name, _method=method, **kwargs: (
+            calls.append(_name), _method(*args, **kwargs)
+        ))
+    # Three cards fit on one page, so FPDF does not restore the state for a new page
+    data = renderer.render(DECK[:3])
+    assert page_count(data) == 1
+
+    # Fill and border colors are shared by the deck; per card only bold/regular and question/answer switch
+    assert calls.count('set_fill_color') == 1
+    assert calls.count('set_draw_color') == 1
+    assert calls.count('set_font') == 1 + 4 * 3
+    assert calls.count('set_text_color') == 1 + 2 * 3
+
+
+def test_output_without_the_chunk_buffer_is_the_same_document():
+    renderer = PdfRenderer({})
+    # As with an FPDF release that keeps its own buffer
+    renderer.pdf.buffer = ''
+    assert page_count(renderer.render(DECK)) == page_count(render_pdf(DECK, {}))
@@ -0,0 +1,127 @@
+import time
+import threading
+
+import pytest
+
+from services.cancellation import CancelToken, Cancelled, cancellation
+from services.rate_governor import QuotaExceeded, RateGovernor, RateLimitExceeded, llm_caller
+
+
+def make_governor(tmp_path, **kwargs):
+    kwargs.setdefault('requests_per_minute', 600)
+    kwargs.setdefault('tokens_per_minute', 60000)
+    return RateGovernor(str(tmp_path / 'rate.db'), **kwargs)
+
+
+def flow_finish(governor, owner, lane=1):
+    row = governor.connection().execute(
+        'SELECT finish FROM rate_flows WHERE owner = ? AND lane = ?', (owner, lane)
+    ).fetchone()
+    return row[0] if row else 0.0
+
+
+def test_acquire_grants_and_charges_owner(tmp_path):
+    governor = make_governor(tmp_path)
+    with llm_caller('a@example.com'):
+        reservation = governor.acquire(100, timeout=1)
+    assert reservation.owner == 'a@example.com'
+    assert governor.usage('a@example.com')['tokens_used'] == 100
+    assert governor.stats()['granted'] == 1
+    assert governor.stats()['waiting'] == 0
+
+    # Settling with the real usage corrects both the bucket and the user's account
+    reservation.settle(40)
+    assert governor.usage('a@example.com')['tokens_used'] == 40
+
+
+def test_acquire_times_out_when_buckets_are_empty(tmp_path):
+    governor = make_governor(tmp_path, requests_per_minute=6, burst_seconds=10)
+    governor.acquire(1, timeout=0)
+    with pytest.raises(RateLimitExceeded) as raised:
+        governor.acquire(1, timeout=0.1)
+    assert raised.value.retry_after >= 1.0
+    assert governor.stats()['rejected'] == 1
+    assert governor.stats()['waiting'] == 0
+
+
+def test_quota_is_enforced_per_user(tmp_path):
+    governor = make_governor(tmp_path, user_quota=150, user_quotas={'big@example.com': 10000})
+    with llm_caller('a@example.com'):
+        governor.acquire(100, timeout=1)
+        with pytest.raises(QuotaExceeded) as raised:
+            governor.acquire(100, timeout=1)
+    assert raised.value.retry_after > 0
+    assert governor.usage('a@example.com')['remaining'] == 50
+
+    with llm_caller('big@example.com'):
+        governor.acquire(100, timeout=1)
+        governor.acquire(100, timeout=1)
+    assert governor.stats()['quota_rejected'] == 1
+
+
+def test_interactive_lane_is_served_first(tmp_path):
+    governor = make_governor(tmp_path)
+    batch = governor._enqueue(time.time() + 10, 10, 'a@example.com', 'batch')
+    interactive = governor._enqueue(time.time() + 10, 10, 'b@example.com', 'interactive')
+    assert governor._try_acquire(batch, 10)[0] is False
+    assert governor._try_acquire(interactive, 10)[0] is True
+    assert governor._try_acquire(batch, 10)[0] is True
+
+
+def test_waiter_purged_by_another_raises_instead_of_crashing(tmp_path):
+    governor = make_governor(tmp_path)
+    now = time.time()
+    expired = governor._enqueue(now, 10, 'a@example.com', 'batch')
+    other = governor._enqueue(now + 10, 10, 'b@example.com', 'batch')
+    time.sleep(0.01)
+
+    # The other waiter's poll purges the expired row
+    governor._try_acquire(other, 10)
+    with pytest.raises(RateLimitExceeded):
+        governor._try_acquire(expired, 10)
+    # Dequeuing the already purged row afterwards is harmless
+    governor._dequeue(expired)
+
+
+def test_waiter_alone_in_purged_queue_raises(tmp_path):
+    governor = make_governor(tmp_path)
+    waiter = governor._enqueue(time.time() + 10, 10, 'a@example.com', 'batch')
+    governor._dequeue(waiter)
+    with pytest.raises(RateLimitExceeded):
+        governor._try_acquire(waiter, 10)
+
+
+def test_ungranted_calls_do_not_advance_their_flow(tmp_path):
+    governor = make_governor(tmp_path)
+    first = governor._enqueue(time.time() + 10, 100, 'a@example.com', 'batch')
+    second = governor._enqueue(time.time() + 10, 50, 'a@example.com', 'batch')
+    assert flow_finish(governor, 'a@example.com') == 150
+
+    # The first call gives up; the second moves up to where the first started
+    governor._dequeue(first)
+    assert flow_finish(governor, 'a@example.com') == 50
+    row = governor.connection().execute('SELECT start, finish FROM rate_queue WHERE id = ?', (second,)).fetchone()
+    assert row == (0.0, 50.0)
+
+    assert governor._try_acquire(second, 50)[0] is True
+    assert flow_finish(governor, 'a@example.com') == 50
+
+
+def test_expired_calls_purged_by_others_do_not_advance_their_flow(tmp_path):
+    governor = make_governor(tmp_path)
+    governor._enqueue(time.time(), 100, 'a@example.com', 'batch')
+    other = governor._enqueue(time.time() + 10, 10, 'b@example.com', 'batch')
+    time.sleep(0.01)
+    governor._try_acquire(other, 10)
+    assert flow_finish(governor, 'a@example.com') == 0
+
+
+def test_cancelled_waiter_leaves_the_queue(tmp_path):
+    governor = make_governor(tmp_path, requests_per_minute=6, burst_seconds=10)
+    governor.acquire(1, timeout=0)
+    token = CancelToken()
+    threading.Timer(0.2, token.cancel).start()
+    with llm_caller('a@example.com'), cancellation(token), pytest.raises(Cancelled):
+        governor.acquire(1, timeout=30)
+    assert governor.stats()['waiting'] == 0
+    assert flow_finish(governor, 'a@example.com') == 0
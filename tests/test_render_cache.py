@@ -0,0 +1,29 @@
+from services.render_cache import RenderCache
+
+CARDS = [{'question': 'Q', 'answer': 'A'}]
+
+
+def test_key_ignores_dict_ordering_and_covers_every_input():
+    key = RenderCache.make_key(CARDS, {'style': 'Modern', 'fontSize': 16}, 'pdf', 1)
+    assert key == RenderCache.make_key(CARDS, {'fontSize': 16, 'style': 'Modern'}, 'pdf', 1)
+    assert key != RenderCache.make_key(CARDS, {'style': 'Modern', 'fontSize': 16}, 'pdf', 2)
+    assert key != RenderCache.make_key(CARDS, {'style': 'Modern', 'fontSize': 16}, 'anki', 1)
+
+
+def test_renders_once_and_evicts_by_bytes():
+    cache = RenderCache(max_bytes=10)
+    renders = []
+
+    def render(data):
+        renders.append(data)
+        return data
+
+    assert cache.get_or_render('a', lambda: render(b'123456')) == b'123456'
+    assert cache.get_or_render('a', lambda: render(b'other')) == b'123456'
+    cache.get_or_render('b', lambda: render(b'123456'))
+    cache.get_or_render('a', lambda: render(b'123456'))
+
+    assert renders == [b'123456'] * 3
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 3
+    assert stats['bytes'] <= 10 and stats['entries'] == 1
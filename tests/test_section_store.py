@@ -0,0 +1,86 @@
+from services.chunking import generate_in_sections
+from services.section_store import SectionStore, fingerprint_section
+
+SECTIONS = [
+    ('Cells', 'Cells are the basic unit of life. ' * 10),
+    ('Energy', 'Mitochondria turn glucose into ATP. ' * 10),
+    ('Genes', 'DNA is transcribed into RNA and translated into protein. ' * 10),
+]
+
+
+class FakeGenerator:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, chunk, count, exclude=()):
+        self.calls.append((chunk, count, tuple(exclude)))
+        title = chunk.split()[0]
+        start = len(exclude)
+        return [{'question': f'{title} Q{n}', 'answer': 'A'} for n in range(start, start + count)]
+
+
+def upload(store, sections, num_cards, generate):
+    """Generate like the upload route: read the previous cards, then store the new ones."""
+    doc_key = SectionStore.make_key('user@example.com', 'notes.docx')
+    fingerprints = [fingerprint_section(title, text) for title, text in sections]
+    results = generate_in_sections(
+        [text for _, text in sections], fingerprints, num_cards, generate, max_tokens=1000,
+        previous=store.get(doc_key)
+    )
+    store.set(doc_key, dict(zip(fingerprints, results)))
+    return results
+
+
+def test_fingerprint_ignores_whitespace_only_edits():
+    assert fingerprint_section('Cells', 'Cells  are\nalive.') == fingerprint_section(' Cells ', 'Cells are alive.')
+    assert fingerprint_section('Cells', 'Cells are alive.') != fingerprint_section('Cells', 'Cells are dead.')
+
+
+def test_unchanged_reupload_reuses_every_section(tmp_path):
+    store = SectionStore(str(tmp_path / 'sections.db'))
+    first = upload(store, SECTIONS, 6, FakeGenerator())
+
+    generate = FakeGenerator()
+    assert upload(store, SECTIONS, 6, generate) == first
+    assert generate.calls == []
+
+
+def test_edited_section_is_the_only_one_regenerated(tmp_path):
+    store = SectionStore(str(tmp_path / 'sections.db'))
+    first = upload(store, SECTIONS, 6, FakeGenerator())
+
+    edited = list(SECTIONS)
+    edited[1] = ('Energy', 'Chloroplasts turn light into sugar. ' * 10)
+    generate = FakeGenerator()
+    results = upload(store, edited, 6, generate)
+
+    assert [chunk.split()[0] for chunk, _, _ in generate.calls] == ['Chloroplasts']
+    assert results[0] == first[0] and results[2] == first[2]
+    assert [card['question'] for card in results[1]] == ['Chloroplasts Q0', 'Chloroplasts Q1']
+
+
+def test_grown_allocation_asks_only_for_missing_cards(tmp_path):
+    store = SectionStore(str(tmp_path / 'sections.db'))
+    first = upload(store, SECTIONS, 5, FakeGenerator())
+
+    generate = FakeGenerator()
+    results = upload(store, SECTIONS, 20, generate)
+
+    assert sum(len(cards) for cards in results) == 20
+    for cards, old in zip(results, first):
+        # The previous cards are kept, and the top-up was told not to repeat them
+        assert cards[:len(old)] == old
+        assert len({card['question'] for card in cards}) == len(cards)
+    assert len(generate.calls) == 3
+    assert all(exclude for _, _, exclude in generate.calls)
+    assert sorted(len(exclude) for _, _, exclude in generate.calls) == sorted(len(old) for old in first)
+
+
+def test_shrunk_allocation_trims_without_calls(tmp_path):
+    store = SectionStore(str(tmp_path / 'sections.db'))
+    first = upload(store, SECTIONS, 9, FakeGenerator())
+
+    generate = FakeGenerator()
+    results = upload(store, SECTIONS, 3, generate)
+    assert generate.calls == []
+    assert results == [old[:1] for old in first]
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services.single_flight import SingleFlight
+
+
+def run_threads(count, target):
+    results = [None] * count
+    errors = [None] * count
+
+    def run(index):
+        try:
+            results[index] = target()
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+
+def test_make_key_is_canonical():
+    key = SingleFlight.make_key('generate', 'text', 5, model='m', version=2)
+    assert key == SingleFlight.make_key('generate', 'text', 5, version=2, model='m')
+    assert key != SingleFlight.make_key('generate', 'text', 6, model='m', version=2)
+    assert key.startswith('generate:')
+
+
+def test_concurrent_identical_calls_run_once():
+    flight = SingleFlight()
+    calls = []
+
+    def generate():
+        calls.append(1)
+        time.sleep(0.2)
+        return [{'question': 'Q', 'answer': 'A'}]
+
+    results, errors = run_threads(5, lambda: flight.do('generate:k', generate))
+
+    assert len(calls) == 1
+    assert errors == [None] * 5
+    assert all(result == [{'question': 'Q', 'answer': 'A'}] for result in results)
+    assert flight.stats() == {'generate': {'calls': 1, 'saved': 4}}
+
+
+def test_each_caller_gets_its_own_copy():
+    flight = SingleFlight()
+    results, _ = run_threads(2, lambda: flight.do('generate:k', lambda: time.sleep(0.1) or {'cards': []}))
+    results[0]['cards'].append('mutated')
+    assert results[1] == {'cards': []}
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    flight = SingleFlight()
+
+    def fail():
+        time.sleep(0.1)
+        raise ValueError('provider said no')
+
+    _, errors = run_threads(3, lambda: flight.do('generate:k', fail))
+    assert all(isinstance(error, ValueError) for error in errors)
+
+    # The failure ended the flight, so the next call runs afresh
+    assert flight.do('generate:k', lambda: 'ok') == 'ok'
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight()
+    assert flight.do('generate:a', lambda: 'a') == 'a'
+    assert flight.do('generate:b', lambda: 'b') == 'b'
+    assert flight.stats()['generate'] == {'calls': 2, 'saved': 0}
+
+
+def test_async_callers_coalesce_and_share_errors():
+    flight = SingleFlight()
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return ['card']
+
+    async def fail():
+        await asyncio.sleep(0.1)
+        raise ValueError('bad reply')
+
+    async def main():
+        results = await asyncio.gather(*(flight.do_async('generate:k', generate) for _ in range(4)))
+        errors = await asyncio.gather(*(flight.do_async('generate:e', fail) for _ in range(2)),
+                                      return_exceptions=True)
+        return results, errors
+
+    results, errors = asyncio.run(main())
+    assert len(calls) == 1
+    assert results == [['card']] * 4
+    assert all(isinstance(error, ValueError) for error in errors)
+
+
+def test_thread_waits_on_an_async_flight():
+    flight = SingleFlight()
+    started = threading.Event()
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        started.set()
+        await asyncio.sleep(0.2)
+        return 'shared'
+
+    results = {}
+
+    def thread_caller():
+        started.wait(5)
+        results['thread'] = flight.do('generate:k', lambda: calls.append(1) or 'own')
+
+    thread = threading.Thread(target=thread_caller)
+    thread.start()
+    results['loop'] = asyncio.run(flight.do_async('generate:k', generate))
+    thread.join(5)
+    assert results == {'loop': 'shared', 'thread': 'shared'}
+    assert len(calls) == 1
+
+
+def test_leader_error_is_raised_to_leader():
+    flight = SingleFlight()
+    with pytest.raises(KeyError):
+        flight.do('generate:k', lambda: {}['missing'])
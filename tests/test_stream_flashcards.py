@@ -0,0 +1,87 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from services.ai_service import AIService
+from services.model_router import ModelRouter
+from services.rate_governor import RateGovernor
+
+ROUTE = {'timeout': 5, 'slow_after': 5, 'routes': [[None, ['model-a']]]}
+
+
+class FakeStream:
+    """Plays back a reply a few characters at a time, like a provider stream."""
+
+    def __init__(self, text, step=7):
+        self.deltas = [text[i:i + step] for i in range(0, len(text), step)]
+        self.sent = 0
+        self.closed = False
+
+    def __iter__(self):
+        for delta in self.deltas:
+            self.sent += 1
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCompletions:
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.streams = []
+
+    def create(self, model, stream=False, **kwargs):
+        assert stream
+        self.streams.append(FakeStream(self.replies.pop(0)))
+        return self.streams[-1]
+
+
+def cards_json(*questions):
+    return json.dumps([{'question': question, 'answer': f'Answer to {question}'} for question in questions])
+
+
+@pytest.fixture
+def make_service(monkeypatch):
+    monkeypatch.setenv('GROQ_API_KEY', 'test')
+
+    def make(replies, governor=None):
+        service = AIService(router=ModelRouter({'generate': ROUTE}), governor=governor)
+        service.client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(replies)))
+        return service
+    return make
+
+
+def test_cards_are_yielded_before_the_reply_finishes(make_service):
+    service = make_service([cards_json('Q1', 'Q2', 'Q3')])
+    cards = service.stream_flashcards('A short text about three things.', 3)
+
+    assert next(cards)['question'] == 'Q1'
+    stream = service.client.chat.completions.streams[0]
+    assert stream.sent < len(stream.deltas)
+    assert [card['question'] for card in cards] == ['Q2', 'Q3']
+    assert stream.closed
+
+
+def test_duplicates_are_dropped_and_the_stream_closed_once_enough_cards_arrived(make_service):
+    service = make_service([cards_json('Q1', 'q1 ', 'Q2', 'Q3', 'Q4')])
+    cards = list(service.stream_flashcards('A short text.', 2))
+
+    assert [card['question'] for card in cards] == ['Q1', 'Q2']
+    stream = service.client.chat.completions.streams[0]
+    assert stream.closed and stream.sent < len(stream.deltas)
+
+
+def test_stream_settles_its_reservation_with_what_was_generated(make_service, tmp_path):
+    # A slow refill into a large bucket, so the level only moves with what the call is charged
+    governor = RateGovernor(
+        str(tmp_path / 'rate.db'), requests_per_minute=600, tokens_per_minute=600, burst_seconds=600
+    )
+    capacity = governor.stats()['tokens_available']
+    service = make_service([cards_json('Q1', 'Q2')], governor)
+
+    assert len(list(service.stream_flashcards('A short text.', 2))) == 2
+    # Prompt plus the streamed reply stays charged; the rest of the completion budget comes back
+    used = capacity - governor.stats()['tokens_available']
+    assert 0 < used < 1000
@@ -0,0 +1,87 @@
+import json
+
+from services.structured_output import (
+    JSONObjectScanner, ParseStats, ParsedCards, clean_card, parse_card, parse_cards, parse_indexed_cards
+)
+
+CARDS = [{'question': 'What is H2O?', 'answer': 'Water'}, {'question': 'Say "hi" {now}', 'answer': 'a\\b'}]
+
+
+def test_scanner_yields_objects_as_they_complete():
+    text = json.dumps(CARDS)
+    scanner = JSONObjectScanner()
+    found = []
+    # Feed one character at a time, as a stream would
+    for char in text:
+        found.extend(scanner.feed(char))
+    assert found == CARDS
+
+
+def test_scanner_ignores_braces_and_quotes_inside_strings():
+    scanner = JSONObjectScanner()
+    assert scanner.feed('{"question": "a } b \\" {", "answer": "c"}') == [
+        {'question': 'a } b " {', 'answer': 'c'}
+    ]
+
+
+def test_scanner_waits_for_escaped_character_split_across_feeds():
+    scanner = JSONObjectScanner()
+    assert scanner.feed('{"question": "tab\\') == []
+    assert scanner.feed('t", "answer": "x"}') == [{'question': 'tab\t', 'answer': 'x'}]
+
+
+def test_scanner_recovers_cards_from_a_truncated_array():
+    text = json.dumps(CARDS + [{'question': 'Cut', 'answer': 'off'}])[:-15]
+    assert JSONObjectScanner().feed(text) == CARDS
+
+
+def test_clean_card_enforces_the_schema():
+    assert clean_card({'question': ' Q ', 'answer': ' A ', 'extra': 1}) == {'question': 'Q', 'answer': 'A'}
+    assert clean_card({'question': 'Q', 'answer': ''}) is None
+    assert clean_card({'question': 'Q', 'answer': 3}) is None
+    assert clean_card(['Q', 'A']) is None
+    assert clean_card({'question': 'Q', 'answer': 'A', 'index': True}, indexed=True) is None
+    assert clean_card({'question': 'Q', 'answer': 'A', 'index': 2}, indexed=True)['index'] == 2
+
+
+def test_parse_cards_accepts_fenced_and_wrapped_replies():
+    fenced = f"Here you go:\n```json\n{json.dumps(CARDS)}\n```"
+    result = parse_cards(fenced)
+    assert result == CARDS and result.status == 'ok'
+
+    wrapped = parse_cards(json.dumps({'flashcards': CARDS}))
+    assert wrapped == CARDS and wrapped.status == 'ok'
+
+
+def test_parse_cards_salvages_invalid_and_truncated_replies():
+    partly_invalid = parse_cards(json.dumps(CARDS + [{'question': 'no answer'}]))
+    assert partly_invalid == CARDS and partly_invalid.status == 'salvaged'
+
+    # Cut inside the last card: the complete ones are kept
+    truncated = parse_cards(json.dumps(CARDS)[:-2])
+    assert truncated == CARDS[:1] and truncated.status == 'salvaged'
+
+    failed = parse_cards('I cannot help with that.')
+    assert failed == [] and failed.status == 'failed'
+
+
+def test_parse_card_returns_at_most_one_card():
+    assert parse_card(json.dumps(CARDS[0])) == [CARDS[0]]
+    salvaged = parse_card('Sure! ' + json.dumps(CARDS))
+    assert len(salvaged) == 1
+
+
+def test_parse_indexed_cards_requires_indices():
+    reply = json.dumps([{'index': 1, **CARDS[0]}, CARDS[1]])
+    result = parse_indexed_cards(reply)
+    assert result == [{'index': 1, **CARDS[0]}] and result.status == 'salvaged'
+
+
+def test_parse_stats_rates():
+    stats = ParseStats()
+    stats.record('generate', ParsedCards(CARDS, 'ok'))
+    stats.record('generate', ParsedCards([], 'failed'))
+    stats.count('generate', 'reprompts')
+    counts = stats.stats()['generate']
+    assert counts['replies'] == 2 and counts['cards'] == 2 and counts['reprompts'] == 1
+    assert counts['failure_rate'] == 0.5 and counts['salvage_rate'] == 0.0
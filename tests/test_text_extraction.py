@@ -0,0 +1,92 @@
+import io
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from config import Config
+from services import text_extraction
+from services.pdf_export import render_pdf
+from services.text_extraction import SpooledUpload, extract_text, iter_text
+
+
+class FileStorage:
+    def __init__(self, filename, data):
+        self.filename = filename
+        self.stream = io.BytesIO(data)
+
+
+def test_spooled_upload_hashes_and_removes_its_file(tmp_path):
+    with SpooledUpload(FileStorage('notes.txt', b'hello world'), spool_dir=str(tmp_path)) as upload:
+        assert upload.size == 11
+        assert upload.sha256 == 'b94d27b9934d3e08a52e52d7da7dabfac484efe37a5380ee9088f7ace2efcde9'
+        assert open(upload.path, 'rb').read() == b'hello world'
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_extraction_stops_at_max_chars(tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_text('\n'.join(f'line {i}' for i in range(1000)))
+
+    text, stats = extract_text(str(path), 'notes.txt', max_chars=100)
+    assert len(text) == 100
+    assert stats['truncated'] and stats['extracted_chars'] == 100
+
+
+def test_memory_report_covers_this_extraction_only(tmp_path):
+    # A large allocation earlier in the worker's life raises its lifetime peak RSS, not this extraction's cost
+    ballast = bytearray(64 * 1024 * 1024)
+    ballast[::4096] = b'x' * len(ballast[::4096])
+    del ballast
+
+    path = tmp_path / 'notes.txt'
+    path.write_text('A short note.')
+    _, stats = extract_text(str(path), 'notes.txt', max_chars=1000)
+    assert 'peak_rss_kb' not in stats
+    assert stats['rss_growth_kb'] is None or stats['rss_growth_kb'] < 16 * 1024
+
+
+@pytest.fixture
+def long_pdf(tmp_path):
+    path = tmp_path / 'deck.pdf'
+    deck = [{'question': f'What is concept {i}?', 'answer': f'Concept {i} explained. ' * 5} for i in range(80)]
+    path.write_bytes(render_pdf(deck, {}))
+    return str(path)
+
+
+def serial_pages(path, monkeypatch):
+    monkeypatch.setattr(Config, 'PDF_PROCESS_WORKERS', 1)
+    pages = list(iter_text(path, 'deck.pdf'))
+    assert len(pages) > 10
+    return pages
+
+
+def test_parallel_pdf_extraction_matches_serial(long_pdf, monkeypatch):
+    serial = serial_pages(long_pdf, monkeypatch)
+    monkeypatch.setattr(Config, 'PDF_PROCESS_WORKERS', 2)
+    monkeypatch.setattr(Config, 'PDF_PARALLEL_MIN_PAGES', 2)
+    try:
+        assert list(iter_text(long_pdf, 'deck.pdf')) == serial
+        assert text_extraction._pdf_pool is not None
+    finally:
+        text_extraction._reset_pdf_pool()
+
+
+def test_broken_process_pool_falls_back_in_process(long_pdf, monkeypatch):
+    serial = serial_pages(long_pdf, monkeypatch)
+    monkeypatch.setattr(Config, 'PDF_PROCESS_WORKERS', 2)
+    monkeypatch.setattr(Config, 'PDF_PARALLEL_MIN_PAGES', 2)
+
+    class DyingPool:
+        """Finishes the first page range, then loses its workers."""
+
+        def map(self, fn, *ranges):
+            yield fn(*(values[0] for values in ranges))
+            raise BrokenProcessPool('a worker died')
+
+    resets = []
+    monkeypatch.setattr(text_extraction, '_get_pdf_pool', DyingPool)
+    monkeypatch.setattr(text_extraction, '_reset_pdf_pool', lambda: resets.append(True))
+
+    # The pages after the first range are extracted in-process, none twice or missing
+    assert list(iter_text(long_pdf, 'deck.pdf')) == serial
+    assert resets == [True]
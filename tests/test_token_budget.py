@@ -0,0 +1,104 @@
+import pytest
+
+from config import Config
+from services.llm_resilience import CallStats
+from services.model_router import ModelFallback, ModelRouter
+from services.token_budget import (
+    ContextOverflowError, TokenUsage, completion_budget, estimate_tokens, fit_completion, generation_chunk_tokens,
+    rewrite_budget, usable_context
+)
+
+LIMITS = {
+    'tiny': {'context': 1000, 'max_output': 300}, 'medium': {'context': 4000, 'max_output': 1000},
+    'large': {'context': 100000, 'max_output': 8000}
+}
+
+
+@pytest.fixture(autouse=True)
+def model_limits(monkeypatch):
+    monkeypatch.setattr(Config, 'LLM_MODEL_LIMITS', LIMITS)
+    monkeypatch.setattr(Config, 'TOKEN_ESTIMATE_MARGIN', 0.1)
+
+
+def test_estimate_tokens_by_kind_of_text():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('the cell') == 2
+    # Long words split every few characters, digits in threes, punctuation in pairs
+    assert estimate_tokens('internationalization') == 4
+    assert estimate_tokens('123456') == 2
+    assert estimate_tokens('?!') == 1
+    assert estimate_tokens('\n\n') == 2
+    # Non-Latin scripts cost about a token per character
+    assert estimate_tokens('細胞の構造') == 5
+
+
+def test_estimate_tokens_is_close_for_english_prose():
+    text = 'Mitochondria are membrane-bound organelles that generate most of the chemical energy of the cell. ' * 20
+    words = len(text.split())
+    assert words <= estimate_tokens(text) <= words * 2
+
+
+def test_completion_and_rewrite_budgets():
+    overhead, per_card = Config.COMPLETION_OVERHEAD_TOKENS, Config.TOKENS_PER_CARD
+    assert completion_budget(10) == overhead + 10 * per_card
+    # Asking for no particular number still leaves room for one card
+    assert completion_budget(0) == completion_budget(1)
+    assert rewrite_budget(100, 3) == 350
+    assert rewrite_budget(100, 0) == rewrite_budget(100)
+
+
+def test_fit_completion_clamps_to_what_is_left():
+    assert usable_context('tiny') == 900
+    # Capped by the model's output limit, then by what the prompt leaves of the context
+    assert fit_completion('tiny', 100, 2000) == 300
+    assert fit_completion('tiny', 620, 2000) == 280
+    assert fit_completion('tiny', 100, 50) == 50
+    # Too little room for a useful reply
+    assert fit_completion('tiny', 800, 2000) is None
+    # Unknown models are planned against the default context
+    assert fit_completion('unknown', 0, 10 ** 6) == int(Config.LLM_DEFAULT_CONTEXT * 0.9)
+
+
+def test_generation_chunks_fit_the_smallest_model():
+    # A chunk, its prompt and a reply of its share of the cards fit the medium model's context
+    chunk_tokens = generation_chunk_tokens(50000, 40, ['medium', 'large'], prompt_tokens=200)
+    cards_per_call = (1000 - Config.COMPLETION_OVERHEAD_TOKENS) // Config.TOKENS_PER_CARD
+    assert chunk_tokens + 200 + completion_budget(cards_per_call) <= usable_context('medium')
+    # The tiny model leaves less than the floor, so chunks do not shrink below it
+    assert generation_chunk_tokens(50000, 40, ['tiny', 'large']) == Config.MIN_CHUNK_TOKENS
+
+    chunk_tokens = generation_chunk_tokens(50000, 40, ['large'], prompt_tokens=200)
+    assert chunk_tokens <= Config.CHUNK_TOKEN_BUDGET
+    # Enough chunks that each one's cards fit in a reply, with a quarter more cards asked for
+    cards_per_call = (8000 - Config.COMPLETION_OVERHEAD_TOKENS) // Config.TOKENS_PER_CARD
+    assert -(-50000 // chunk_tokens) * cards_per_call >= 50
+
+
+def test_small_input_is_one_chunk():
+    assert generation_chunk_tokens(800, 5, ['large']) == Config.CHUNK_TOKEN_BUDGET
+
+
+def make_fallback(input_tokens, max_tokens, models=('tiny', 'large')):
+    router = ModelRouter({'generate': {'timeout': 5, 'slow_after': 5, 'routes': [[None, list(models)]]}})
+    return ModelFallback(router, 'generate', input_tokens, max_tokens, CallStats(), TokenUsage())
+
+
+def test_fallback_skips_models_the_prompt_does_not_fit():
+    fallback = make_fallback(850, 2000)
+    assert [(model, budget) for model, budget, _ in fallback] == [('large', 2000)]
+    assert fallback.token_usage.stats()['context_skips'] == 1
+
+
+def test_fallback_clamps_the_completion_budget():
+    fallback = make_fallback(500, 2000)
+    assert [(model, budget) for model, budget, _ in fallback] == [('tiny', 300), ('large', 2000)]
+    assert fallback.token_usage.stats()['clamped'] == 1
+
+
+def test_prompt_that_fits_no_model_overflows():
+    fallback = make_fallback(200000, 2000)
+    assert list(fallback) == []
+    with pytest.raises(ContextOverflowError):
+        fallback.outcome()
+    # Overflows are ValueErrors, so existing 400 handlers still catch them
+    assert issubclass(ContextOverflowError, ValueError)
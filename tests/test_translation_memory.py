@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import pytest
+
+from config import Config
+from services.ai_service import AIService
+from services.model_router import ModelRouter
+from services.translation_memory import TranslationMemory
+
+ROUTE = {'timeout': 5, 'slow_after': 5, 'routes': [[None, ['model-a']]]}
+ROUTES = {'generate': ROUTE, 'translate': ROUTE}
+CARD = {'question': 'What is a cell?', 'answer': 'The basic unit of life.'}
+TRANSLATED = {
+    'question': "Qu'est-ce qu'une cellule ?", 'answer': 'Unité de base du vivant.',
+    'original_question': CARD['question'], 'original_answer': CARD['answer'],
+}
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, model, **kwargs):
+        self.calls += 1
+        text = '{"question": "%s", "answer": "%s"}' % (TRANSLATED['question'], TRANSLATED['answer'])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))], usage=None)
+
+
+@pytest.fixture
+def memory(tmp_path):
+    return TranslationMemory(str(tmp_path / 'translations.db'))
+
+
+def test_lookup_hits_and_misses(memory):
+    assert memory.store_many({'Hello world': 'Bonjour le monde', 'empty': '  '}, 'French', 'model-a') == 1
+
+    # Whitespace in the source and case in the language do not matter; the model does
+    assert memory.lookup('Hello   world', ' french ', 'model-a') == 'Bonjour le monde'
+    assert memory.lookup('Hello world', 'French', 'model-b') is None
+    assert memory.lookup_many(['Hello world', 'Goodbye'], 'French', 'model-a') == {'Hello world': 'Bonjour le monde'}
+
+    stats = memory.stats()
+    assert (stats['hits'], stats['misses'], stats['writes'], stats['entries']) == (2, 2, 1, 1)
+
+
+def test_import_deck_skips_malformed_cards(memory):
+    deck = [TRANSLATED, {'question': 'Q', 'answer': 'A'}, {**TRANSLATED, 'original_answer': 42}, 'not a card']
+    assert memory.import_deck(deck, 'French', 'model-a') == 2
+    assert memory.lookup_many([CARD['question'], CARD['answer']], 'French', 'model-a') == {
+        CARD['question']: TRANSLATED['question'], CARD['answer']: TRANSLATED['answer']
+    }
+
+
+def test_second_translation_costs_no_llm_call(memory, monkeypatch):
+    monkeypatch.setenv('GROQ_API_KEY', 'test')
+    service = AIService(translation_memory=memory, router=ModelRouter(ROUTES))
+    completions = FakeCompletions()
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    assert service.translate_flashcard(dict(CARD), 'French') == TRANSLATED
+    assert service.translate_flashcard(dict(CARD), 'french') == TRANSLATED
+    assert completions.calls == 1
+
+    # Another worker sharing the database finds it too
+    other = TranslationMemory(memory.path)
+    assert other.lookup(CARD['question'], 'French', 'model-a') == TRANSLATED['question']
+
+
+def test_import_is_limited_to_configured_accounts(client, auth_headers, monkeypatch):
+    body = {'flashcards': [TRANSLATED], 'target_language': 'German'}
+    response = client.post('/api/translate/memory/import', json=body, headers=auth_headers('user@example.com'))
+    assert response.status_code == 403
+
+    monkeypatch.setattr(Config, 'TRANSLATION_MEMORY_IMPORTERS', ['ops@example.com'])
+    headers = auth_headers('ops@example.com')
+    response = client.post(
+        '/api/translate/memory/import', json={**body, 'flashcards': [{'question': 'Q', 'answer': 'A'}]},
+        headers=headers
+    )
+    assert response.status_code == 400
+    response = client.post('/api/translate/memory/import', json=body, headers=headers)
+    assert response.status_code == 200
+    assert response.get_json() == {'imported': 2}